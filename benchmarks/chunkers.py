@@ -0,0 +1,84 @@
+"""
+Compare chunkers on a real document: embedding tokens spent and wall time.
+
+Each row covers the full chunk-and-embed path up to (but not including) the
+Qdrant upsert:
+  semantic_legacy - langchain SemanticChunker, then every chunk embedded again
+  semantic        - rag.chunking semantic chunker, sentence vectors reused
+  recursive       - rag.chunking recursive chunker, each chunk embedded once
+
+Usage:
+    python -m benchmarks.chunkers path/to/document.pdf [--chunkers recursive semantic]
+"""
+import argparse
+import statistics
+import time
+
+from langchain_experimental.text_splitter import SemanticChunker
+
+from rag.chunking import CHUNKERS, chunk_text, count_tokens
+from rag.loader import extract_text
+from rag.qdrant import _get_embedding
+
+
+class CountingEmbeddings:
+    """Wraps an embeddings model and counts the tokens sent to it."""
+
+    def __init__(self, embedding):
+        self.embedding = embedding
+        self.tokens = 0
+        self.seconds = 0.0
+
+    def embed_documents(self, texts):
+        self.tokens += sum(count_tokens(text) for text in texts)
+        start = time.perf_counter()
+        try:
+            return self.embedding.embed_documents(texts)
+        finally:
+            self.seconds += time.perf_counter() - start
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def run_legacy(text: str, embedding: CountingEmbeddings):
+    chunks = [doc.page_content for doc in SemanticChunker(embedding).create_documents([text])]
+    embedding.embed_documents(chunks)
+    return chunks
+
+
+def run_chunker(text: str, chunker: str, embedding: CountingEmbeddings):
+    chunks = chunk_text(text, chunker=chunker, embedding=embedding)
+    missing = [doc["content"] for doc in chunks if doc.get("embedding") is None]
+    if missing:
+        embedding.embed_documents(missing)
+    return [doc["content"] for doc in chunks]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path")
+    parser.add_argument("--chunkers", nargs="+", default=["semantic_legacy", *CHUNKERS],
+                        choices=["semantic_legacy", *CHUNKERS])
+    args = parser.parse_args()
+
+    with open(args.path, "rb") as f:
+        text = extract_text(f, args.path)
+    print(f"document: {args.path} ({len(text)} chars, {count_tokens(text)} tokens)")
+    print(f"{'chunker':<16} {'chunks':>7} {'tok/chunk':>10} {'embed tok':>10} {'embed s':>8} {'total s':>8}")
+
+    for name in args.chunkers:
+        embedding = CountingEmbeddings(_get_embedding())
+        start = time.perf_counter()
+        if name == "semantic_legacy":
+            chunks = run_legacy(text, embedding)
+        else:
+            chunks = run_chunker(text, name, embedding)
+        total = time.perf_counter() - start
+        mean_tokens = statistics.mean(count_tokens(chunk) for chunk in chunks) if chunks else 0
+        print(f"{name:<16} {len(chunks):>7} {mean_tokens:>10.0f} {embedding.tokens:>10} "
+              f"{embedding.seconds:>8.2f} {total:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
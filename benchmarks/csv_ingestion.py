@@ -0,0 +1,67 @@
+"""
+Benchmark CSV ingestion: the pyarrow record-batch path against the pandas
+C-parser path.
+
+Runs rag.loader.iter_csv_segments over the same CSV with `config.csv_engine`
+set to each engine and reports rows/sec and MB/sec. The pyarrow path keeps
+cells as written in the file while pandas re-renders inferred types (e.g.
+"3" becomes "3.0" in an integer column with gaps), so instead of demanding
+identical output the benchmark reports the share of rows rendered the same.
+
+Usage:
+    python -m benchmarks.csv_ingestion --rows 2000000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.dataframe_to_text import write_synthetic_csv
+from rag import loader
+
+
+def run(engine: str, path: str) -> tuple:
+    loader.config.csv_engine = engine
+    start = time.perf_counter()
+    segments = list(loader.iter_csv_segments(path, os.path.basename(path)))
+    return segments, time.perf_counter() - start
+
+
+def row_lines(segments) -> list:
+    return [line for segment in segments for line in segment.split("\n") if line.startswith("Row ")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--csv", default=None, help="Use this CSV instead of a synthetic one")
+    args = parser.parse_args()
+
+    if loader.pa is None:
+        raise SystemExit("pyarrow is not installed - only the pandas path is available")
+
+    path = args.csv
+    if path is None:
+        path = os.path.join(tempfile.mkdtemp(), "synthetic.csv")
+        write_synthetic_csv(path, args.rows)
+    size_mb = os.path.getsize(path) / 2**20
+    print(f"csv: {path} ({size_mb:.1f} MB), chunk size {loader.config.csv_chunk_size}")
+
+    pandas_out, pandas_time = run("pandas", path)
+    arrow_out, arrow_time = run("pyarrow", path)
+    pandas_rows, arrow_rows = row_lines(pandas_out), row_lines(arrow_out)
+    rows = len(pandas_rows)
+
+    print(f"{'engine':<8} {'seconds':>8} {'rows/sec':>12} {'MB/sec':>8}")
+    print(f"{'pandas':<8} {pandas_time:>8.2f} {rows / pandas_time:>12,.0f} {size_mb / pandas_time:>8.1f}")
+    print(f"{'pyarrow':<8} {arrow_time:>8.2f} {rows / arrow_time:>12,.0f} {size_mb / arrow_time:>8.1f}")
+    same = sum(a == b for a, b in zip(pandas_rows, arrow_rows))
+    print(f"speedup: {pandas_time / arrow_time:.1f}x, rows: {rows} vs {len(arrow_rows)}, "
+          f"identical rows: {same / max(rows, 1):.1%}")
+
+    if args.csv is None:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Benchmark PDF text extraction throughput against worker-process count.
+
+Extracts the same PDF with rag.loader.iter_pdf_segments using 1 (in-process)
+up to --max-workers worker processes, checks every run yields the same pages
+as the sequential one and reports pages/sec. Without a PDF path a synthetic
+text-heavy catalog is generated.
+
+Usage:
+    python -m benchmarks.pdf_extraction [catalog.pdf] --pages 3000 --max-workers 8
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import fitz
+
+from rag import loader
+
+LOREM = (
+    "Product {n}: stainless steel water bottle, 750 ml, double-walled vacuum insulation. "
+    "Keeps drinks cold for 24 hours and hot for 12 hours. Available in six colours. "
+)
+
+
+def write_synthetic_pdf(path: str, pages: int):
+    doc = fitz.open()
+    for page_num in range(pages):
+        page = doc.new_page()
+        text = "".join(LOREM.format(n=page_num * 40 + i) for i in range(40))
+        page.insert_textbox(fitz.Rect(36, 36, 576, 806), text, fontsize=7)
+    doc.save(path)
+    doc.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", nargs="?", default=None)
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    path = args.path
+    if path is None:
+        path = os.path.join(tempfile.mkdtemp(), "synthetic.pdf")
+        write_synthetic_pdf(path, args.pages)
+    with fitz.open(path) as doc:
+        total_pages = len(doc)
+    print(f"pdf: {path} ({total_pages} pages, {os.path.getsize(path) / 2**20:.1f} MB), {os.cpu_count()} cores")
+    print(f"{'workers':>7} {'seconds':>8} {'pages/sec':>10} {'identical':>10}")
+
+    loader.config.pdf_parallel_min_pages = 1
+    reference = None
+    workers = 1
+    while workers <= args.max_workers:
+        loader.config.pdf_workers = workers
+        start = time.perf_counter()
+        segments = list(loader.iter_pdf_segments(path, os.path.basename(path)))
+        elapsed = time.perf_counter() - start
+        reference = reference or segments
+        print(f"{workers:>7} {elapsed:>8.2f} {total_pages / elapsed:>10.0f} {str(segments == reference):>10}")
+        workers *= 2
+
+    if args.path is None:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Benchmark Qdrant collection profiles on a synthetic corpus.
+
+For every profile in rag.collection_profiles.COLLECTION_PROFILES this creates a
+scratch collection, loads the same random corpus, and reports recall@k against
+brute-force exact search, search latency (p50/p95) for each hnsw_ef value, and
+the Qdrant server RSS growth while loading (when --qdrant-pid is given).
+
+Usage:
+    python -m benchmarks.qdrant_profiles --points 50000 --queries 200 --qdrant-pid $(pgrep qdrant)
+"""
+import argparse
+import statistics
+import time
+
+import numpy as np
+import psutil
+from qdrant_client import QdrantClient
+from qdrant_client.http import models as rest
+
+from core.config import get_settings
+from rag.collection_profiles import COLLECTION_PROFILES, collection_profile_config, build_search_params
+
+settings = get_settings()
+
+
+def synthetic_corpus(n_points: int, n_queries: int, dim: int, seed: int = 42):
+    """Clustered unit vectors, roughly shaped like sentence-embedding space."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(n_points // 200, 8), dim)).astype(np.float32)
+    labels = rng.integers(0, len(centers), size=n_points + n_queries)
+    vectors = centers[labels] + 0.35 * rng.normal(size=(n_points + n_queries, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors[:n_points], vectors[n_points:]
+
+
+def load_collection(client: QdrantClient, name: str, profile: str, corpus: np.ndarray, batch_size: int):
+    if client.collection_exists(name):
+        client.delete_collection(name)
+    client.create_collection(collection_name=name, **collection_profile_config(profile, vector_size=corpus.shape[1]))
+
+    for start in range(0, len(corpus), batch_size):
+        batch = corpus[start:start + batch_size]
+        client.upsert(
+            collection_name=name,
+            points=rest.Batch(ids=list(range(start, start + len(batch))), vectors=batch.tolist()),
+            wait=False,
+        )
+
+    # Wait for the optimizer to finish building the index
+    while True:
+        info = client.get_collection(name)
+        if info.status == rest.CollectionStatus.GREEN and info.points_count == len(corpus):
+            return info
+        time.sleep(1)
+
+
+def run_queries(client: QdrantClient, name: str, queries: np.ndarray, k: int, params):
+    latencies, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        response = client.query_points(collection_name=name, query=query.tolist(), limit=k, search_params=params)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append([point.id for point in response.points])
+    return results, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=settings.QDRANT_HOST)
+    parser.add_argument("--port", type=int, default=settings.QDRANT_PORT)
+    parser.add_argument("--points", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--dim", type=int, default=settings.QDRANT_VECTOR_SIZE)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--ef", type=int, nargs="+", default=[32, 64, 128, 256])
+    parser.add_argument("--oversampling", type=float, default=2.0)
+    parser.add_argument("--batch-size", type=int, default=512)
+    parser.add_argument("--profiles", nargs="+", default=list(COLLECTION_PROFILES), choices=COLLECTION_PROFILES)
+    parser.add_argument("--qdrant-pid", type=int, default=None, help="Qdrant server PID for RSS measurement")
+    parser.add_argument("--keep", action="store_true", help="Keep the benchmark collections afterwards")
+    args = parser.parse_args()
+
+    client = QdrantClient(host=args.host, port=args.port, timeout=300, check_compatibility=False)
+    corpus, queries = synthetic_corpus(args.points, args.queries, args.dim)
+    server = psutil.Process(args.qdrant_pid) if args.qdrant_pid else None
+    # Exact top-k by brute force (vectors are unit length, so dot product == cosine)
+    truth = np.argsort(-(queries @ corpus.T), axis=1)[:, :args.k].tolist()
+
+    print(f"corpus={args.points} queries={args.queries} dim={args.dim} k={args.k}")
+    print(f"{'profile':<12} {'hnsw_ef':>7} {'recall@k':>9} {'p50 ms':>8} {'p95 ms':>8} {'RSS MB':>9}")
+
+    for profile in args.profiles:
+        name = f"bench_profile_{profile}"
+        rss_before = server.memory_info().rss if server else None
+        load_collection(client, name, profile, corpus, args.batch_size)
+        rss_mb = (server.memory_info().rss - rss_before) / 2**20 if server else float("nan")
+
+        quantized = profile in ("scalar_int8", "binary")
+        for ef in args.ef:
+            params = build_search_params(hnsw_ef=ef, oversampling=args.oversampling if quantized else None)
+            found, latencies = run_queries(client, name, queries, args.k, params)
+            recall = statistics.mean(len(set(f) & set(t)) / args.k for f, t in zip(found, truth))
+            p95 = statistics.quantiles(latencies, n=20)[-1]
+            print(f"{profile:<12} {ef:>7} {recall:>9.3f} {statistics.median(latencies):>8.2f} {p95:>8.2f} {rss_mb:>9.1f}")
+
+        if not args.keep:
+            client.delete_collection(name)
+
+
+if __name__ == "__main__":
+    main()
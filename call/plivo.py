@@ -12,6 +12,7 @@ from call.service import upload_url_to_s3
 from fastapi import BackgroundTasks
 from pymongo import MongoClient
 from core.config import redis_client
+from services.prompt_assembler import assemble_prompt
 load_dotenv()
 
  
@@ -82,7 +83,8 @@ def outbound_call(numbers: str,organisation_id: str | None = None, user_id: str
             print(f"Agent Number: {full_phone_number}")
         uploaded_resources = cfg.get("uploaded_resources", [])
         file_texts = [resource.get("file_data", "") for resource in uploaded_resources if resource.get("file_data")]
-        extracted_file_text = "\n\n".join(file_texts) if file_texts else None
+        # Shared boilerplate once, FAQs trimmed to the token budget
+        extracted_file_text = assemble_prompt(file_texts)[0] if file_texts else None
         
     # Store queue config in Redis (for ALL calls in this queue)
     queue_config = {
@@ -0,0 +1,223 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Deque, Dict, Optional
+
+import psutil
+
+from core.config import get_settings
+
+settings = get_settings()
+
+# Peak memory of extracting a file, as a multiple of its size on disk. Parsed
+# spreadsheets and DOCX trees are far larger than their zipped files; PDFs are
+# extracted page by page.
+MEMORY_MULTIPLIERS = {
+    "pdf": 3.0,
+    "docx": 8.0,
+    "xlsx": 10.0,
+    "xls": 10.0,
+    "csv": 4.0,
+    "json": 6.0,
+    "txt": 3.0,
+}
+DEFAULT_MEMORY_MULTIPLIER = 5.0
+BASE_COST_MB = 32.0  # interpreter, parser and client overhead per extraction
+
+
+class AdmissionRejected(Exception):
+    """Raised when work cannot be admitted; surfaced as 429 with Retry-After."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Ticket:
+    """A granted admission; release it exactly once when the work is done."""
+
+    def __init__(self, controller: "AdmissionController", cost_mb: float):
+        self.controller = controller
+        self.cost_mb = cost_mb
+        self.admitted_at = time.monotonic()
+        self.released = False
+
+    def release(self):
+        self.controller.release(self)
+
+
+class _Waiter:
+    def __init__(self, cost_mb: float, loop: asyncio.AbstractEventLoop):
+        self.cost_mb = cost_mb
+        self.loop = loop
+        self.future = loop.create_future()
+        self.ticket: Optional[Ticket] = None
+
+
+def upload_size(file) -> int:
+    """Size in bytes of an UploadFile (or file object) without reading it"""
+    size = getattr(file, "size", None)
+    if size is not None:
+        return size
+    stream = getattr(file, "file", file)
+    try:
+        position = stream.tell()
+        stream.seek(0, os.SEEK_END)
+        size = stream.tell()
+        stream.seek(position)
+        return size
+    except (AttributeError, OSError):
+        return 0
+
+
+def estimate_cost_mb(size_bytes: int, filename: str) -> float:
+    """Estimated peak memory (MB) of extracting and ingesting a file"""
+    ext = (filename or "").split(".")[-1].lower()
+    multiplier = MEMORY_MULTIPLIERS.get(ext, DEFAULT_MEMORY_MULTIPLIER)
+    return BASE_COST_MB + multiplier * size_bytes / (1024 * 1024)
+
+
+class AdmissionController:
+    """
+    Caps concurrent extractions by count and by their summed memory estimate.
+
+    Work that does not fit waits in a FIFO queue (up to `max_queue` entries,
+    for at most `queue_timeout` seconds); beyond that it is rejected with a
+    Retry-After hint derived from recent job durations. `acquire` runs on the
+    event loop, `release` may be called from any thread (background tasks,
+    pipeline threads). A job larger than the whole budget is admitted alone.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int,
+        memory_budget_mb: float,
+        max_queue: int,
+        queue_timeout: float,
+        memory_threshold: float,
+    ):
+        self.max_concurrent = max_concurrent
+        self.memory_budget_mb = memory_budget_mb
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.memory_threshold = memory_threshold
+        self._lock = threading.Lock()
+        self._waiters: Deque[_Waiter] = deque()
+        self._active = 0
+        self._reserved_mb = 0.0
+        self._admitted_total = 0
+        self._rejected_total = 0
+        self._mean_duration = 30.0  # seconds, exponentially weighted
+
+    def _fits(self, cost_mb: float) -> bool:
+        if self._active == 0:
+            return True
+        if self._active >= self.max_concurrent:
+            return False
+        if self._reserved_mb + cost_mb > self.memory_budget_mb:
+            return False
+        # The estimate is only an estimate: also respect what the host reports
+        return psutil.virtual_memory().percent < self.memory_threshold
+
+    def _admit(self, cost_mb: float) -> Ticket:
+        self._active += 1
+        self._reserved_mb += cost_mb
+        self._admitted_total += 1
+        return Ticket(self, cost_mb)
+
+    def _retry_after(self) -> int:
+        slots = max(self.max_concurrent, 1)
+        return max(1, round(self._mean_duration * (len(self._waiters) + 1) / slots))
+
+    def _reject(self, reason: str) -> AdmissionRejected:
+        self._rejected_total += 1
+        retry_after = self._retry_after()
+        logging.warning(f"Admission rejected ({reason}); retry after {retry_after}s")
+        return AdmissionRejected(f"Server is busy: {reason}. Retry after {retry_after} seconds.", retry_after)
+
+    async def acquire(self, cost_mb: float) -> Ticket:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if not self._waiters and self._fits(cost_mb):
+                return self._admit(cost_mb)
+            if len(self._waiters) >= self.max_queue:
+                raise self._reject(f"upload queue is full ({len(self._waiters)} waiting)")
+            waiter = _Waiter(cost_mb, loop)
+            self._waiters.append(waiter)
+
+        try:
+            await asyncio.wait_for(waiter.future, self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            with self._lock:
+                queued = waiter in self._waiters
+                if queued:
+                    self._waiters.remove(waiter)
+            if queued:
+                if isinstance(e, asyncio.CancelledError):
+                    raise
+                with self._lock:
+                    raise self._reject(f"queued for more than {self.queue_timeout:g}s")
+            # Granted concurrently with the timeout/cancellation
+            if isinstance(e, asyncio.CancelledError):
+                waiter.ticket.release()
+                raise
+        return waiter.ticket
+
+    def release(self, ticket: Ticket):
+        with self._lock:
+            if ticket.released:
+                return
+            ticket.released = True
+            self._active -= 1
+            self._reserved_mb -= ticket.cost_mb
+            duration = time.monotonic() - ticket.admitted_at
+            self._mean_duration = 0.8 * self._mean_duration + 0.2 * duration
+
+            while self._waiters and self._fits(self._waiters[0].cost_mb):
+                waiter = self._waiters.popleft()
+                waiter.ticket = self._admit(waiter.cost_mb)
+                waiter.loop.call_soon_threadsafe(_wake, waiter.future)
+
+    @asynccontextmanager
+    async def admitted(self, cost_mb: float):
+        """`async with` form of acquire/release for work that finishes within the request"""
+        ticket = await self.acquire(cost_mb)
+        try:
+            yield ticket
+        finally:
+            ticket.release()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "active": self._active,
+                "queued": len(self._waiters),
+                "reserved_memory_mb": round(self._reserved_mb, 1),
+                "memory_budget_mb": self.memory_budget_mb,
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue,
+                "admitted_total": self._admitted_total,
+                "rejected_total": self._rejected_total,
+                "mean_job_seconds": round(self._mean_duration, 1),
+                "retry_after_hint": self._retry_after(),
+                "system_memory_percent": psutil.virtual_memory().percent,
+            }
+
+
+def _wake(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+# Shared by the RAG upload and org-config endpoints: they compete for the same memory
+upload_admission = AdmissionController(
+    max_concurrent=settings.ADMISSION_MAX_CONCURRENT,
+    memory_budget_mb=settings.ADMISSION_MEMORY_BUDGET_MB,
+    max_queue=settings.ADMISSION_MAX_QUEUE,
+    queue_timeout=settings.ADMISSION_QUEUE_TIMEOUT,
+    memory_threshold=settings.ADMISSION_MEMORY_THRESHOLD,
+)
@@ -0,0 +1,45 @@
+import asyncio
+import logging
+import threading
+from typing import Any, Awaitable, Optional
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_lock = threading.Lock()
+
+
+def get_background_loop() -> asyncio.AbstractEventLoop:
+    """
+    Return the process-wide event loop used to run async code on behalf of
+    sync callers. The loop lives on a daemon thread and is started lazily, so
+    async clients created on it (Qdrant, OpenAI) are reused across calls.
+    """
+    global _loop
+    with _lock:
+        if _loop is None or _loop.is_closed():
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(
+                target=loop.run_forever,
+                name="background-event-loop",
+                daemon=True,
+            )
+            thread.start()
+            _loop = loop
+            logging.info("Background event loop started")
+    return _loop
+
+
+def run_sync(coro: Awaitable[Any], timeout: Optional[float] = None) -> Any:
+    """
+    Run a coroutine on the background loop and block until it finishes.
+    Must not be called from the background loop itself.
+    """
+    loop = get_background_loop()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        raise RuntimeError("run_sync() cannot be called from the background loop")
+
+    future = asyncio.run_coroutine_threadsafe(coro, loop)
+    return future.result(timeout)
@@ -22,6 +22,47 @@ class Settings(BaseSettings):
     QDRANT_VECTOR_SIZE: int = 1536
     QDRANT_HOST: str = "localhost"
     QDRANT_PORT: int = 6333
+    QDRANT_COLLECTION_PROFILE: str = "in_memory"  # in_memory | scalar_int8 | binary | on_disk
+    QDRANT_HNSW_M: int = 16
+    QDRANT_HNSW_EF_CONSTRUCT: int = 100
+    QDRANT_SEARCH_HNSW_EF: Optional[int] = None          # None = server default (ef_construct)
+    QDRANT_SEARCH_OVERSAMPLING: Optional[float] = None   # quantized profiles only
+    RAG_BLOOM_STORAGE_MODE: str = "multi_label"  # multi_label (one point per chunk) | per_level
+    RAG_CHUNKER: str = "semantic"  # semantic | recursive
+    RAG_CHUNK_TOKENS: int = 512          # recursive chunker: max tokens per chunk
+    RAG_CHUNK_OVERLAP_TOKENS: int = 64   # recursive chunker: tokens shared by neighbouring chunks
+    RAG_SEMANTIC_BREAKPOINT_PERCENTILE: float = 95.0
+    RAG_EMBED_BATCH_SIZE: int = 64          # chunks per embeddings request
+    RAG_UPSERT_BATCH_SIZE: int = 100        # points per Qdrant upsert
+    RAG_PIPELINE_SEGMENT_CHARS: int = 200_000  # extracted text buffered before chunking
+    RAG_PIPELINE_QUEUE_SIZE: int = 4        # batches buffered between pipeline stages
+    RAG_PIPELINE_EMBED_WORKERS: int = 4
+    RAG_UPLOAD_SPOOL_DIR: Optional[str] = None  # uploads kept here until ingested; persistent dir enables resume after restart
+    RAG_RESUME_ON_STARTUP: bool = True
+    ADMISSION_MAX_CONCURRENT: int = 4         # extractions running at once (RAG + org-config uploads)
+    ADMISSION_MEMORY_BUDGET_MB: int = 2048    # summed memory estimate of running extractions
+    ADMISSION_MAX_QUEUE: int = 16             # uploads waiting for a slot before new ones get 429
+    ADMISSION_QUEUE_TIMEOUT: float = 30.0     # seconds an upload may wait for a slot
+    ADMISSION_MEMORY_THRESHOLD: float = 85.0  # host memory % above which only one extraction runs
+    OCR_MODEL: str = "gpt-4o"
+    OCR_MAX_CONCURRENCY: int = 16        # pages in flight across all uploads (halved on 429s, regrown on success)
+    OCR_RPM_LIMIT: int = 500             # match the OpenAI account tier for OCR_MODEL
+    OCR_TPM_LIMIT: int = 300_000
+    OCR_MAX_OUTPUT_TOKENS: int = 8000    # per page; reserved against OCR_TPM_LIMIT until the response arrives
+    OCR_PAGE_RETRIES: int = 5
+    OCR_PAGE_TIMEOUT: float = 300.0
+    ORG_CONTENT_CACHE_TTL: int = 30 * 24 * 3600  # seconds extracted text / prompt stages are kept per file hash
+    ORG_PARSE_CACHE_TTL: float = 600.0   # seconds a parsed upload is kept in-process (validate -> upload -> extract)
+    ORG_PARSE_CACHE_SIZE: int = 8
+    ORG_PROMPT_MAX_TOKENS: int = 12000  # instructions budget of a call; FAQ entries are dropped beyond it
+    ORG_CONFIG_JOB_WORKERS: int = 4     # threads running org-config upload / prompt regeneration jobs
+    ORG_CONFIG_JOB_TTL: int = 86400     # seconds a config job's status stays pollable
+    OPENAI_EMBEDDING_MODEL: str = "text-embedding-ada-002"
+    RAG_EMBED_TIMEOUT: float = 5.0     # seconds allowed for the query embedding call
+    RAG_SEARCH_TIMEOUT: float = 3.0    # seconds allowed for a single Qdrant search
+    RAG_MATCH_UNSTAMPED: bool = False  # org-scoped searches also match points without organisation_id; enable only while migrating pre-tenancy data
+    GEMINI_MAX_CONCURRENCY: int = 8    # /ask_neurocaller model calls streaming at once per worker
+    GEMINI_SPECULATIVE_RAG: bool = False  # search the user's query alongside the first model call, used if it calls rag_search for it
     PROMPT_TEMPLATE: Optional[str] = None
     REDIS_HOST: str = "localhost"
     REDIS_PORT: int = 6379
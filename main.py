@@ -1,8 +1,13 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from router import rag_router,realtime_router,config_org
 from call import plivo,call_stream
 from fastapi.middleware.cors import CORSMiddleware
+from core.config import get_settings
+from rag.pipeline import resume_interrupted_ingestions, run_spool_sweeper
+from core.admission import AdmissionRejected
 import logging
+import threading
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -20,3 +25,19 @@ app.include_router(rag_router.router, prefix="/api", tags=["Knowledge Injection"
 app.include_router(plivo.router, tags=["Calling"])
 app.include_router(call_stream.router, tags=["streaming Call"])
 app.include_router(config_org.router, tags=["ORG DATA"])
+
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected(request: Request, exc: AdmissionRejected):
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc), "retry_after": exc.retry_after},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+@app.on_event("startup")
+def resume_ingestions():
+    # Pick up ingestions interrupted by a restart; runs in the background so startup is not delayed
+    if get_settings().RAG_RESUME_ON_STARTUP:
+        threading.Thread(target=resume_interrupted_ingestions, daemon=True).start()
+    # Spooled uploads of failed runs are kept for resuming until their checkpoint expires
+    threading.Thread(target=run_spool_sweeper, daemon=True).start()
@@ -0,0 +1,110 @@
+"""
+Stamp `organisation_id` onto points ingested without one.
+
+Org-scoped searches only see unstamped points while RAG_MATCH_UNSTAMPED is on.
+It is off by default; a deployment with data ingested before tenancy turns it
+on while migrating. Legacy points carry no tenant, so the owner of each
+document has to be given: stamp documents one organisation at a time, then
+turn RAG_MATCH_UNSTAMPED off once `--list` reports nothing left that is private.
+Points that already have a tenant are never changed.
+
+Usage:
+    python -m rag.backfill_tenant --list
+    python -m rag.backfill_tenant --organisation-id ORG --document-id ID [--document-id ID ...] [--dry-run]
+"""
+import argparse
+import json
+import logging
+import time
+from typing import Any, Dict, List
+
+from qdrant_client import QdrantClient
+from qdrant_client.http import models as rest
+
+from core.config import redis_client
+from rag.qdrant import COLLECTION_NAME, DOCUMENT_CATALOG_KEY, TENANT_FIELD, _get_client, ensure_payload_indexes
+
+UNSTAMPED = rest.IsEmptyCondition(is_empty=rest.PayloadField(key=TENANT_FIELD))
+
+
+def unstamped_documents(client: QdrantClient, page_size: int = 1000) -> Dict[str, Dict[str, Any]]:
+    """document_id -> {document_name, points} for documents with unstamped points"""
+    documents: Dict[str, Dict[str, Any]] = {}
+    offset = None
+    while True:
+        records, offset = client.scroll(
+            collection_name=COLLECTION_NAME,
+            scroll_filter=rest.Filter(must=[UNSTAMPED]),
+            limit=page_size,
+            offset=offset,
+            with_payload=["document_id", "document_name"],
+            with_vectors=False,
+        )
+        for record in records:
+            payload = record.payload or {}
+            document_id = payload.get("document_id")
+            if not document_id:
+                logging.warning(f"Skipping unstamped point {record.id} without document_id")
+                continue
+            entry = documents.setdefault(document_id, {"document_name": payload.get("document_name"), "points": 0})
+            entry["points"] += 1
+        if offset is None:
+            return documents
+
+
+def stamp_document(client: QdrantClient, document_id: str, organisation_id: str, dry_run: bool = False) -> int:
+    """Give a document's unstamped points a tenant; returns how many points that is"""
+    points_filter = rest.Filter(must=[
+        rest.FieldCondition(key="document_id", match=rest.MatchValue(value=document_id)),
+        UNSTAMPED,
+    ])
+    count = client.count(collection_name=COLLECTION_NAME, count_filter=points_filter, exact=True).count
+    if dry_run or not count:
+        return count
+    client.set_payload(
+        collection_name=COLLECTION_NAME,
+        payload={TENANT_FIELD: organisation_id},
+        points=points_filter,
+        wait=True,
+    )
+    entry = redis_client.hget(DOCUMENT_CATALOG_KEY, document_id)
+    if entry:
+        entry = json.loads(entry)
+        entry["organisation_id"] = entry.get("organisation_id") or organisation_id
+        redis_client.hset(DOCUMENT_CATALOG_KEY, document_id, json.dumps(entry))
+    return count
+
+
+def backfill(organisation_id: str, document_ids: List[str], dry_run: bool = False) -> Dict[str, Any]:
+    start_time = time.time()
+    client = _get_client()
+    ensure_payload_indexes(client)
+    totals = {"organisation_id": organisation_id, "documents": 0, "points": 0, "dry_run": dry_run}
+    for document_id in document_ids:
+        count = stamp_document(client, document_id, organisation_id, dry_run=dry_run)
+        logging.info(f"Document {document_id}: {count} unstamped points -> {organisation_id}")
+        totals["documents"] += 1
+        totals["points"] += count
+    totals["elapsed_seconds"] = round(time.time() - start_time, 2)
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--list", action="store_true", help="List documents that still have unstamped points")
+    parser.add_argument("--organisation-id", default=None, help="Tenant to stamp onto the documents")
+    parser.add_argument("--document-id", action="append", default=[], help="Document to stamp (repeatable)")
+    parser.add_argument("--dry-run", action="store_true", help="Report what would change without writing")
+    args = parser.parse_args()
+
+    if args.list:
+        for document_id, entry in sorted(unstamped_documents(_get_client()).items()):
+            print(f"{document_id}\t{entry['points']}\t{entry['document_name']}")
+        return
+    if not args.organisation_id or not args.document_id:
+        parser.error("--organisation-id and at least one --document-id are required (or use --list)")
+    print(backfill(args.organisation_id, args.document_id, dry_run=args.dry_run))
+
+
+if __name__ == "__main__":
+    main()
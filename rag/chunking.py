@@ -0,0 +1,129 @@
+import logging
+import re
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from core.config import get_settings
+
+settings = get_settings()
+
+# Chunkers selectable per upload:
+#   semantic  - split where consecutive sentence embeddings diverge; the sentence
+#               embeddings are reused for the chunk vectors (no second embedding pass)
+#   recursive - token-aware recursive split on paragraphs/lines/sentences with overlap;
+#               no embedding calls at all
+CHUNKERS = ("semantic", "recursive")
+
+# Structural markers emitted by rag/loader.py; chunks never cross them
+MARKER_PATTERN = re.compile(r"^\[(Page \d+|Sheet: [^\]\n]+)\]$", re.MULTILINE)
+SENTENCE_PATTERN = re.compile(r"(?<=[.?!])\s+")
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception as e:  # not installed, or the BPE file cannot be downloaded
+    logging.warning(f"tiktoken unavailable ({e}) - estimating chunk tokens as len(text) / 4")
+    _encoding = None
+
+
+def count_tokens(text: str) -> int:
+    if _encoding is None:
+        return max(1, len(text) // 4)
+    return len(_encoding.encode(text, disallowed_special=()))
+
+
+def split_by_markers(text: str) -> List[Tuple[Dict[str, Any], str]]:
+    """
+    Split loader output into (location, body) segments at `[Page N]` and
+    `[Sheet: name]` markers. The location dict holds `page` or `sheet`.
+    """
+    segments = []
+    location: Dict[str, Any] = {}
+    position = 0
+    for match in MARKER_PATTERN.finditer(text):
+        body = text[position:match.start()]
+        if body.strip():
+            segments.append((location, body))
+        marker = match.group(1)
+        if marker.startswith("Page "):
+            location = {"page": int(marker[5:])}
+        else:
+            location = {"sheet": marker[len("Sheet: "):]}
+        position = match.end()
+    body = text[position:]
+    if body.strip():
+        segments.append((location, body))
+    return segments
+
+
+def _recursive_chunks(text: str) -> List[Dict[str, Any]]:
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=settings.RAG_CHUNK_TOKENS,
+        chunk_overlap=settings.RAG_CHUNK_OVERLAP_TOKENS,
+        length_function=count_tokens,
+        separators=["\n\n", "\n", ". ", " ", ""],
+    )
+    chunks = []
+    for location, body in split_by_markers(text):
+        for content in splitter.split_text(body):
+            chunks.append({"content": content, "location": location})
+    return chunks
+
+
+def _semantic_chunks(text: str, embedding) -> List[Dict[str, Any]]:
+    """
+    Embed each sentence once, break where the distance between neighbouring
+    sentence windows is above the configured percentile, and use the mean of
+    a chunk's sentence vectors as the chunk vector.
+    """
+    segments = []
+    sentences: List[str] = []
+    for location, body in split_by_markers(text):
+        segment_sentences = [s for s in SENTENCE_PATTERN.split(body.strip()) if s.strip()]
+        segments.append((location, len(sentences), len(sentences) + len(segment_sentences)))
+        sentences.extend(segment_sentences)
+    if not sentences:
+        return []
+
+    vectors = np.asarray(embedding.embed_documents(sentences), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+
+    chunks = []
+    for location, start, end in segments:
+        segment = vectors[start:end]
+        # Distance between each sentence and the next, smoothed over a 3-sentence window
+        windows = np.stack([segment[max(i - 1, 0):i + 2].mean(axis=0) for i in range(len(segment))])
+        windows /= np.linalg.norm(windows, axis=1, keepdims=True) + 1e-12
+        distances = 1.0 - np.sum(windows[:-1] * windows[1:], axis=1)
+
+        breakpoints = []
+        if len(distances):
+            threshold = np.percentile(distances, settings.RAG_SEMANTIC_BREAKPOINT_PERCENTILE)
+            breakpoints = [i + 1 for i, distance in enumerate(distances) if distance > threshold]
+
+        for group_start, group_end in zip([0] + breakpoints, breakpoints + [len(segment)]):
+            vector = segment[group_start:group_end].mean(axis=0)
+            vector /= np.linalg.norm(vector) + 1e-12
+            chunks.append({
+                "content": " ".join(sentences[start + group_start:start + group_end]),
+                "location": location,
+                "embedding": vector.tolist(),
+            })
+    return chunks
+
+
+def chunk_text(text: str, chunker: Optional[str] = None, embedding=None) -> List[Dict[str, Any]]:
+    """
+    Split text with the chosen chunker (defaults to `Settings.RAG_CHUNKER`).
+
+    Returns dicts with `content`, `location` ({"page": N} / {"sheet": name} / {})
+    and, for the semantic chunker, a ready-to-store `embedding`.
+    """
+    chunker = chunker or settings.RAG_CHUNKER
+    if chunker not in CHUNKERS:
+        raise ValueError(f"Unknown chunker '{chunker}'. Expected one of {CHUNKERS}")
+    if chunker == "semantic":
+        if embedding is None:
+            raise ValueError("The semantic chunker needs an embedding model")
+        return _semantic_chunks(text, embedding)
+    return _recursive_chunks(text)
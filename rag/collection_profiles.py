@@ -0,0 +1,78 @@
+from typing import Optional, Dict, Any
+from qdrant_client.http import models as rest
+from core.config import get_settings
+
+settings = get_settings()
+
+# Storage profiles for the RAG collection:
+#   in_memory   - float32 vectors and HNSW graph in RAM (original behaviour)
+#   scalar_int8 - int8 quantized vectors in RAM, float32 originals on disk for rescoring
+#   binary      - 1-bit quantized vectors in RAM, float32 originals on disk for rescoring
+#   on_disk     - vectors, HNSW graph and payload memory-mapped from disk
+COLLECTION_PROFILES = ("in_memory", "scalar_int8", "binary", "on_disk")
+
+
+def collection_profile_config(profile: Optional[str] = None, vector_size: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Return `create_collection` keyword arguments for a storage profile.
+    Defaults to `Settings.QDRANT_COLLECTION_PROFILE`.
+    """
+    profile = profile or settings.QDRANT_COLLECTION_PROFILE
+    vector_size = vector_size or settings.QDRANT_VECTOR_SIZE
+    if profile not in COLLECTION_PROFILES:
+        raise ValueError(f"Unknown Qdrant collection profile '{profile}'. Expected one of {COLLECTION_PROFILES}")
+
+    hnsw_on_disk = profile == "on_disk"
+    config = {
+        "vectors_config": rest.VectorParams(
+            size=vector_size,
+            distance=rest.Distance.COSINE,
+            on_disk=profile != "in_memory",
+        ),
+        "hnsw_config": rest.HnswConfigDiff(
+            m=settings.QDRANT_HNSW_M,
+            ef_construct=settings.QDRANT_HNSW_EF_CONSTRUCT,
+            on_disk=hnsw_on_disk,
+        ),
+        "on_disk_payload": profile != "in_memory",
+    }
+
+    if profile == "scalar_int8":
+        config["quantization_config"] = rest.ScalarQuantization(
+            scalar=rest.ScalarQuantizationConfig(
+                type=rest.ScalarType.INT8,
+                quantile=0.99,
+                always_ram=True,
+            )
+        )
+    elif profile == "binary":
+        config["quantization_config"] = rest.BinaryQuantization(
+            binary=rest.BinaryQuantizationConfig(always_ram=True)
+        )
+
+    return config
+
+
+def build_search_params(
+    hnsw_ef: Optional[int] = None,
+    oversampling: Optional[float] = None,
+    rescore: Optional[bool] = None,
+    exact: bool = False,
+) -> Optional[rest.SearchParams]:
+    """
+    Build per-request search parameters. `hnsw_ef` and `oversampling` fall back
+    to the configured defaults; returns None when nothing needs overriding.
+    """
+    hnsw_ef = hnsw_ef or settings.QDRANT_SEARCH_HNSW_EF
+    oversampling = oversampling or settings.QDRANT_SEARCH_OVERSAMPLING
+
+    quantization = None
+    if oversampling or rescore is not None:
+        quantization = rest.QuantizationSearchParams(
+            rescore=True if rescore is None else rescore,
+            oversampling=oversampling,
+        )
+
+    if not hnsw_ef and quantization is None and not exact:
+        return None
+    return rest.SearchParams(hnsw_ef=hnsw_ef, quantization=quantization, exact=exact)
@@ -1,17 +1,33 @@
 import logging
 import time
 import asyncio
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator
 from pathlib import Path
-from io import BytesIO
 import fitz  # PyMuPDF for better PDF handling
 from docx import Document
 from PyPDF2 import PdfReader
+import numpy as np
 import pandas as pd
 import json
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import multiprocessing
+import queue
+from collections import deque
+import openpyxl
 import psutil
+import codecs
 import gc
+import io
+import mmap
+import os
+from contextlib import contextmanager
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pa_csv
+except ImportError:  # optional: CSVs are then read with the pandas C parser
+    pa = None
  
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -25,13 +41,92 @@ class FileProcessingConfig:
         self.pdf_use_pymupdf = True  # Use PyMuPDF for better text extraction
         self.excel_chunk_size = 1000 # Rows per chunk for Excel files
         self.csv_chunk_size = 5000   # Rows per chunk for CSV files
+        self.csv_engine = "pyarrow"  # "pyarrow" (record batches) or "pandas"; pandas if pyarrow is missing
+        self.csv_sniff_bytes = 1024 * 1024  # Sample used to detect a CSV's encoding
+        self.excel_sheet_workers = min(4, os.cpu_count() or 1)  # Processes parsing sheets in parallel
+        self.excel_sheet_queue_size = 64  # Row chunks a sheet may parse ahead of the reader
+        self.excel_sheet_poll_seconds = 1.0  # How often a waiting reader checks that the sheet's worker is alive
+        self.excel_parallel_min_mb = 5    # Smaller workbooks are not worth starting worker processes
+        self.pdf_workers = min(4, os.cpu_count() or 1)  # Processes extracting PDF page ranges
+        self.pdf_parallel_min_pages = 64  # Smaller PDFs are extracted in-process
+        self.pdf_pages_per_task = 32      # Pages per worker task
+        self.extraction_workers = 4       # Threads shared by extract_text_async callers
        
 config = FileProcessingConfig()
+
+SUPPORTED_EXTENSIONS = {"pdf", "docx", "txt", "json", "csv", "xlsx", "xls"}
+
+def _source_path(file):
+    """Filesystem path behind a path or a named file object, else None"""
+    if isinstance(file, (str, Path)):
+        return str(file)
+    name = getattr(file, 'name', None)
+    if isinstance(name, str) and os.path.isfile(name):
+        return name
+    return None
+ 
+@contextmanager
+def _mapped(file):
+    """
+    Read-only buffer over a binary file object's whole content. Files backed by
+    a descriptor (spooled uploads, temp files) are memory-mapped, so their
+    content is paged in on demand instead of being copied into a bytes object.
+    """
+    try:
+        fileno = file.fileno()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        fileno = None
+   
+    if fileno is None or os.fstat(fileno).st_size == 0:
+        file.seek(0)
+        yield memoryview(file.read())
+        return
+   
+    with mmap.mmap(fileno, 0, access=mmap.ACCESS_READ) as mapped:
+        view = memoryview(mapped)
+        try:
+            yield view
+        finally:
+            view.release()
+ 
+def _decode_text(content) -> str:
+    """Decode bytes-like content, trying common encodings"""
+    for encoding in ['utf-8', 'latin-1', 'cp1252', 'iso-8859-1']:
+        try:
+            result = str(content, encoding)
+            logging.info(f"Successfully decoded text file with {encoding}")
+            return result
+        except UnicodeDecodeError:
+            continue
+    # If all encodings fail, use utf-8 with error handling
+    logging.warning("Used UTF-8 with error replacement for text file")
+    return str(content, 'utf-8', errors='replace')
+ 
+@contextmanager
+def _open_binary(file):
+    """Binary file object for a path or a file object (left open for the caller)"""
+    if hasattr(file, 'read'):
+        yield file
+    else:
+        with open(file, 'rb') as f:
+            yield f
+ 
+def _read_text(file) -> str:
+    if isinstance(file, io.TextIOBase):
+        return file.read()
+    with _open_binary(file) as f, _mapped(f) as content:
+        return _decode_text(content)
+ 
+def _process_pool(workers: int) -> ProcessPoolExecutor:
+    # spawn, not fork: the server process has threads (event loops, executors)
+    # whose locks must not be copied into the workers
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
  
 def check_system_resources() -> Dict[str, float]:
     """Check current system resource usage"""
     memory = psutil.virtual_memory()
-    cpu = psutil.cpu_percent(interval=0.1)
+    # interval=None: utilisation since the previous call, without sleeping
+    cpu = psutil.cpu_percent(interval=None)
    
     return {
         "memory_percent": memory.percent,
@@ -64,17 +159,14 @@ def validate_file_size(file_path_or_bytes, filename: str) -> bool:
         logging.error(f"Error validating file size for {filename}: {e}")
         return False
  
-def extract_text(file, filename: str) -> str:
+def iter_text_segments(file, filename: str) -> Iterator[str]:
     """
-    Enhanced text extraction with large file support and memory management
+    Yield a file's text in segments (PDF pages, CSV/Excel row chunks, DOCX
+    paragraphs) so callers can process large files without holding the whole
+    text in memory. Joining the segments with blank lines gives `extract_text`.
     """
     logging.info(f"Starting text extraction for file: {filename}")
    
-    # Check system resources before processing
-    resources = check_system_resources()
-    if resources["memory_percent"] > config.memory_threshold:
-        logging.warning(f"High memory usage ({resources['memory_percent']:.1f}%) - proceeding with caution")
-   
     # Validate file size
     if not validate_file_size(file, filename):
         raise ValueError(f"File {filename} is too large to process")
@@ -85,185 +177,406 @@ def extract_text(file, filename: str) -> str:
  
     try:
         if ext == "pdf":
-            result = extract_pdf_text(file, filename)
+            yield from iter_pdf_segments(file, filename)
         elif ext == "docx":
-            result = extract_docx_text(file, filename)
+            yield from iter_docx_segments(file, filename)
         elif ext == "txt":
-            result = extract_txt_text(file, filename)
+            yield extract_txt_text(file, filename)
         elif ext == "json":
-            result = extract_json_text(file, filename)
+            yield extract_json_text(file, filename)
         elif ext == "csv":
-            result = extract_csv_text(file, filename)
+            yield from iter_csv_segments(file, filename)
         elif ext in {"xlsx", "xls"}:
-            result = extract_excel_text(file, filename)
+            yield from iter_excel_segments(file, filename)
         else:
             raise ValueError(f"Unsupported file type: {ext}")
  
         end_time = time.time()
         logging.info(f"Text extraction completed for file: {filename} in {end_time - start_time:.2f} seconds")
-       
-        # Memory cleanup
-        gc.collect()
-       
-        return result
  
     except Exception as e:
         logging.error(f"Error during text extraction for file: {filename} - {e}")
         raise
  
+def estimate_segment_count(file, filename: str):
+    """
+    Upper bound on the segments `iter_text_segments` yields, when it is cheap
+    to know (PDF page count); None otherwise. Used for progress ETAs.
+    """
+    try:
+        if filename.split(".")[-1].lower() == "pdf" and not hasattr(file, 'read'):
+            with fitz.open(file) as doc:
+                return len(doc)
+    except Exception as e:
+        logging.warning(f"Could not count pages of {filename}: {e}")
+    return None
+ 
+def extract_text(file, filename: str) -> str:
+    """
+    Enhanced text extraction with large file support and memory management
+    """
+    return "\n\n".join(iter_text_segments(file, filename))
+ 
 def extract_pdf_text(file, filename: str) -> str:
     """Enhanced PDF text extraction with memory management"""
+    result = "\n\n".join(iter_pdf_segments(file, filename))
+    logging.info(f"Extracted {len(result)} characters from PDF")
+    return result
+ 
+def iter_pdf_segments(file, filename: str) -> Iterator[str]:
+    """Yield one `[Page N]` segment per non-empty PDF page"""
     logging.info(f"Processing PDF: {filename}")
    
     try:
         if config.pdf_use_pymupdf:
             # Use PyMuPDF for better text extraction and large file handling
-            if hasattr(file, 'read'):
-                pdf_bytes = file.read()
-                doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-            else:
-                doc = fitz.open(file)
+            path = _source_path(file)
+            if path is None:
+                with _mapped(file) as pdf_buffer:
+                    yield from _iter_pymupdf_pages(fitz.open(stream=pdf_buffer, filetype="pdf"))
+                return
            
-            text_parts = []
+            doc = fitz.open(path)
             total_pages = len(doc)
-            logging.info(f"Processing {total_pages} pages from PDF")
            
-            for page_num in range(total_pages):
-                try:
-                    page = doc.load_page(page_num)
-                    page_text = page.get_text()
-                   
-                    if page_text.strip():
-                        text_parts.append(f"[Page {page_num + 1}]\n{page_text}")
-                   
-                    # Memory management - clean up page
-                    page = None
-                   
-                    # Check memory usage periodically
-                    if page_num % 50 == 0 and page_num > 0:
-                        resources = check_system_resources()
-                        if resources["memory_percent"] > config.memory_threshold:
-                            logging.warning(f"High memory usage at page {page_num}: {resources['memory_percent']:.1f}%")
-                            gc.collect()
-                   
-                except Exception as e:
-                    logging.warning(f"Error processing page {page_num + 1}: {e}")
-                    continue
+            workers = min(config.pdf_workers, -(-total_pages // config.pdf_pages_per_task))
+            if workers > 1 and total_pages >= config.pdf_parallel_min_pages:
+                doc.close()
+                yield from _iter_pdf_pages_parallel(path, total_pages, workers)
+                return
            
-            doc.close()
-            result = "\n\n".join(text_parts)
+            yield from _iter_pymupdf_pages(doc)
            
         else:
             # Fallback to PyPDF2
             reader = PdfReader(file)
-            text_parts = []
            
             for page_num, page in enumerate(reader.pages):
                 try:
                     page_text = page.extract_text()
                     if page_text:
-                        text_parts.append(f"[Page {page_num + 1}]\n{page_text}")
+                        yield f"[Page {page_num + 1}]\n{page_text}"
                 except Exception as e:
                     logging.warning(f"Error processing page {page_num + 1}: {e}")
                     continue
-           
-            result = "\n\n".join(text_parts)
-       
-        logging.info(f"Extracted {len(result)} characters from PDF")
-        return result
        
     except Exception as e:
         logging.error(f"Error processing PDF {filename}: {e}")
         raise
  
+def _iter_pymupdf_pages(doc) -> Iterator[str]:
+    """Yield `[Page N]` segments from an open PyMuPDF document, then close it"""
+    total_pages = len(doc)
+    logging.info(f"Processing {total_pages} pages from PDF")
+    try:
+        for page_num in range(total_pages):
+            try:
+                page = doc.load_page(page_num)
+                page_text = page.get_text()
+   
+                if page_text.strip():
+                    yield f"[Page {page_num + 1}]\n{page_text}"
+   
+                # Memory management - clean up page
+                page = None
+   
+                # Check memory usage periodically
+                if page_num % 50 == 0 and page_num > 0:
+                    resources = check_system_resources()
+                    if resources["memory_percent"] > config.memory_threshold:
+                        logging.warning(f"High memory usage at page {page_num}: {resources['memory_percent']:.1f}%")
+                        gc.collect()
+   
+            except Exception as e:
+                logging.warning(f"Error processing page {page_num + 1}: {e}")
+                continue
+   
+    finally:
+        doc.close()
+ 
+def _extract_pdf_page_range(path: str, start: int, end: int) -> List[str]:
+    """Process-pool worker: `[Page N]` segments for pages [start, end) of a PDF"""
+    segments = []
+    with fitz.open(path) as doc:
+        for page_num in range(start, end):
+            try:
+                page_text = doc.load_page(page_num).get_text()
+                if page_text.strip():
+                    segments.append(f"[Page {page_num + 1}]\n{page_text}")
+            except Exception as e:
+                logging.warning(f"Error processing page {page_num + 1}: {e}")
+    return segments
+ 
+def _iter_pdf_pages_parallel(path: str, total_pages: int, workers: int) -> Iterator[str]:
+    """
+    Extract page ranges in worker processes, each opening the file itself, and
+    yield pages in order. At most two tasks per worker are in flight, so
+    finished-but-unread pages stay bounded.
+    """
+    logging.info(f"Extracting {total_pages} PDF pages with {workers} worker processes")
+    page_ranges = iter(range(0, total_pages, config.pdf_pages_per_task))
+    with _process_pool(workers) as executor:
+        in_flight = deque()
+        try:
+            for start in page_ranges:
+                in_flight.append(executor.submit(
+                    _extract_pdf_page_range, path, start, min(start + config.pdf_pages_per_task, total_pages)
+                ))
+                if len(in_flight) >= workers * 2:
+                    yield from in_flight.popleft().result()
+            while in_flight:
+                yield from in_flight.popleft().result()
+        finally:
+            for future in in_flight:
+                future.cancel()
+ 
 def extract_excel_text(file, filename: str) -> str:
     """Enhanced Excel processing with chunked reading for large files"""
+    result = "\n\n".join(iter_excel_segments(file, filename))
+    logging.info(f"Extracted {len(result)} characters from Excel file")
+    return result
+ 
+def iter_excel_segments(file, filename: str) -> Iterator[str]:
+    """Yield a `[Sheet: name]` header segment per sheet, then its rows in chunks"""
     logging.info(f"Processing Excel file: {filename}")
    
     try:
-        text_parts = []
-       
-        # Get all sheet names first
-        if hasattr(file, 'read'):
-            file_bytes = BytesIO(file.read())
-            xlsx_file = pd.ExcelFile(file_bytes)
-        else:
-            xlsx_file = pd.ExcelFile(file)
-       
-        sheet_names = xlsx_file.sheet_names
-        logging.info(f"Found {len(sheet_names)} sheets: {sheet_names}")
+        if filename.split(".")[-1].lower() == "xls":
+            # Legacy .xls has no streaming reader; xlrd loads each sheet whole
+            yield from _iter_xls_segments(file)
+            return
        
-        for sheet_name in sheet_names:
-            logging.info(f"Processing sheet: {sheet_name}")
+        # Loading parses the shared strings table, so each reader loads the workbook once
+        workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+        try:
+            sheet_names = workbook.sheetnames
+            logging.info(f"Found {len(sheet_names)} sheets: {sheet_names}")
            
-            try:
-                # Try to read the entire sheet first to get row count
-                sheet_df = pd.read_excel(xlsx_file, sheet_name=sheet_name, nrows=0)
-               
-                # Read in chunks for large sheets
-                chunk_num = 0
-                sheet_text_parts = [f"[Sheet: {sheet_name}]"]
-               
-                # Add headers
-                if not sheet_df.columns.empty:
-                    headers = " | ".join(str(col) for col in sheet_df.columns)
-                    sheet_text_parts.append(f"Headers: {headers}")
-               
-                # Process data in chunks
-                for chunk_df in pd.read_excel(
-                    xlsx_file,
-                    sheet_name=sheet_name,
-                    chunksize=config.excel_chunk_size
-                ):
-                    chunk_num += 1
-                    logging.info(f"Processing chunk {chunk_num} of sheet {sheet_name} ({len(chunk_df)} rows)")
-                   
-                    # Convert chunk to text
-                    chunk_text = dataframe_to_text(chunk_df, f"{sheet_name}_chunk_{chunk_num}")
-                    sheet_text_parts.append(chunk_text)
-                   
-                    # Memory check
-                    if chunk_num % 5 == 0:
-                        resources = check_system_resources()
-                        if resources["memory_percent"] > config.memory_threshold:
-                            logging.warning(f"High memory usage processing Excel: {resources['memory_percent']:.1f}%")
-                            gc.collect()
-               
-                text_parts.append("\n".join(sheet_text_parts))
-               
-            except Exception as e:
-                logging.error(f"Error processing sheet {sheet_name}: {e}")
-                continue
-       
-        result = "\n\n".join(text_parts)
-        logging.info(f"Extracted {len(result)} characters from Excel file")
-        return result
+            workers = min(config.excel_sheet_workers, len(sheet_names))
+            parallel = (workers > 1 and not hasattr(file, 'read')
+                        and Path(file).stat().st_size >= config.excel_parallel_min_mb * 1024 * 1024)
+            if not parallel:
+                yield from _iter_xlsx_sheets(workbook, sheet_names, config.excel_chunk_size)
+        finally:
+            workbook.close()
+        if parallel:
+            yield from _iter_sheets_parallel(file, sheet_names, workers)
        
     except Exception as e:
         logging.error(f"Error processing Excel file {filename}: {e}")
         raise
  
+def _iter_xlsx_sheets(workbook, sheet_names: List[str], chunk_size: int) -> Iterator[str]:
+    """Segments of several sheets of one open workbook; a failing sheet is logged and skipped"""
+    for sheet_name in sheet_names:
+        try:
+            yield from _iter_xlsx_sheet(workbook, sheet_name, chunk_size)
+        except Exception as e:
+            logging.error(f"Error processing sheet {sheet_name}: {e}")
+            continue
+
+def _dedupe_columns(columns: list) -> list:
+    """
+    Rename repeated column names the way pandas' Excel header parsing does
+    (Name, Name.1, ...), skipping suffixes already used by another column.
+    """
+    columns = list(columns)
+    counts: Dict[Any, int] = {}
+    for i, col in enumerate(columns):
+        original = col
+        count = counts.get(col, 0)
+        while count > 0:
+            counts[original] = count + 1
+            col = f"{original}.{count}"
+            count = count + 1 if col in columns else counts.get(col, 0)
+        columns[i] = col
+        counts[col] = count + 1
+    return columns
+
+def _iter_xlsx_sheet(workbook, sheet_name: str, chunk_size: int) -> Iterator[str]:
+    """Stream one sheet with openpyxl's read-only reader, `chunk_size` rows at a time"""
+    logging.info(f"Processing sheet: {sheet_name}")
+    sheet = workbook[sheet_name]
+    rows = sheet.iter_rows(values_only=True)
+    # Like pandas, the header is the first row that is not blank
+    header = next((row for row in rows if any(val is not None for val in row)), None) or ()
+    # Same naming as pandas for blank header cells, widened to the sheet's used range
+    width = max(len(header), sheet.max_column or 0)
+    columns = _dedupe_columns([
+        f"Unnamed: {i}" if i >= len(header) or header[i] is None else header[i] for i in range(width)
+    ])
+   
+    sheet_header = f"[Sheet: {sheet_name}]"
+    if columns:
+        sheet_header += "\nHeaders: " + " | ".join(str(col) for col in columns)
+    yield sheet_header
+   
+    batch = []
+    row_offset = 0
+    chunk_num = 0
+    for row in rows:
+        if all(val is None for val in row):
+            continue
+        batch.append(row[:width] + (None,) * (width - len(row)))
+        if len(batch) == chunk_size:
+            chunk_num += 1
+            yield _excel_batch_text(batch, columns, row_offset, f"{sheet_name}_chunk_{chunk_num}")
+            row_offset += len(batch)
+            batch = []
+    if batch:
+        chunk_num += 1
+        yield _excel_batch_text(batch, columns, row_offset, f"{sheet_name}_chunk_{chunk_num}")
+    logging.info(f"Processed {chunk_num} chunks of sheet {sheet_name}")
+ 
+def _excel_batch_text(batch: list, columns: list, row_offset: int, section_name: str) -> str:
+    chunk_df = pd.DataFrame(batch, columns=columns, index=range(row_offset, row_offset + len(batch)))
+    return dataframe_to_text(chunk_df, section_name)
+ 
+def _excel_sheets_worker(path: str, sheet_names: List[str], chunk_size: int, queues: list) -> None:
+    """
+    Process-pool worker: load the workbook once and stream each of its sheets
+    into that sheet's bounded queue, ending every queue with None.
+    """
+    try:
+        workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    except Exception as e:
+        logging.error(f"Error opening workbook {path}: {e}")
+        workbook = None
+    try:
+        for sheet_name, segments in zip(sheet_names, queues):
+            if workbook is not None:
+                try:
+                    for segment in _iter_xlsx_sheet(workbook, sheet_name, chunk_size):
+                        segments.put(segment)
+                except (EOFError, BrokenPipeError, ConnectionError):
+                    raise
+                except Exception as e:
+                    logging.error(f"Error processing sheet {sheet_name}: {e}")
+            segments.put(None)
+    except (EOFError, BrokenPipeError, ConnectionError):
+        pass  # the caller stopped reading and its manager shut the queues down
+    finally:
+        if workbook is not None:
+            workbook.close()
+ 
+def _iter_sheets_parallel(path: str, sheet_names: List[str], workers: int) -> Iterator[str]:
+    """
+    Parse sheets in separate processes and yield their segments in sheet order.
+    Each sheet has a bounded queue of row chunks, so memory stays flat however
+    large the sheets are. Sheets are dealt round-robin to one task per worker,
+    which loads the workbook once. A worker's earlier sheets come earlier in
+    order, so the caller drains them first: the sheet being read is never
+    stuck behind another.
+    """
+    logging.info(f"Processing {len(sheet_names)} sheets with {workers} worker processes")
+    # Manager exits first, so workers blocked on a full queue fail fast if the caller stops early
+    # The manager's server process is started with spawn too, for the same reason as the pool
+    with _process_pool(workers) as executor, multiprocessing.get_context("spawn").Manager() as manager:
+        queues = [manager.Queue(maxsize=config.excel_sheet_queue_size) for _ in sheet_names]
+        futures = [
+            executor.submit(
+                _excel_sheets_worker, path, sheet_names[worker::workers],
+                config.excel_chunk_size, queues[worker::workers],
+            )
+            for worker in range(workers)
+        ]
+        try:
+            for index, segments in enumerate(queues):
+                while (segment := _next_segment(segments, futures[index % workers], sheet_names[index])) is not None:
+                    yield segment
+        finally:
+            for future in futures:
+                future.cancel()
+ 
+def _next_segment(segments, future, sheet_name: str):
+    """
+    Next segment of a sheet, or None at its end. A worker that dies (OOM kill,
+    broken pool) never sends the None, so waiting checks that it is alive.
+    """
+    while True:
+        try:
+            return segments.get(timeout=config.excel_sheet_poll_seconds)
+        except queue.Empty:
+            if not future.done():
+                continue
+        # The worker finished: anything it queued before exiting is already there
+        try:
+            return segments.get_nowait()
+        except queue.Empty:
+            raise RuntimeError(f"Worker parsing sheet {sheet_name} exited without finishing it") from future.exception()
+ 
+def _iter_xls_segments(file) -> Iterator[str]:
+    xls_file = pd.ExcelFile(file)
+    for sheet_name in xls_file.sheet_names:
+        logging.info(f"Processing sheet: {sheet_name}")
+        try:
+            sheet_df = pd.read_excel(xls_file, sheet_name=sheet_name)
+            sheet_header = f"[Sheet: {sheet_name}]"
+            if not sheet_df.columns.empty:
+                sheet_header += "\nHeaders: " + " | ".join(str(col) for col in sheet_df.columns)
+            yield sheet_header
+           
+            for chunk_num, start in enumerate(range(0, len(sheet_df), config.excel_chunk_size), start=1):
+                chunk_df = sheet_df.iloc[start:start + config.excel_chunk_size]
+                yield dataframe_to_text(chunk_df, f"{sheet_name}_chunk_{chunk_num}")
+        except Exception as e:
+            logging.error(f"Error processing sheet {sheet_name}: {e}")
+            continue
+ 
 def extract_csv_text(file, filename: str) -> str:
     """Enhanced CSV processing with chunked reading"""
+    result = "\n\n".join(iter_csv_segments(file, filename))
+    logging.info(f"Extracted {len(result)} characters from CSV")
+    return result
+ 
+def _detect_csv_encoding(file) -> str:
+    """Guess a CSV's encoding from its first `csv_sniff_bytes` bytes"""
+    with _open_binary(file) as f:
+        position = f.tell()
+        sample = f.read(config.csv_sniff_bytes)
+        f.seek(position)
+   
+    if sample.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return "utf-16"
+    try:
+        sample.decode("utf-8")
+        return "utf-8"
+    except UnicodeDecodeError as e:
+        # The sample may end part-way through a multi-byte character
+        if e.reason == "unexpected end of data" and e.start >= len(sample) - 3:
+            return "utf-8"
+    try:
+        sample.decode("cp1252")
+        return "cp1252"
+    except UnicodeDecodeError:
+        return "latin-1"
+ 
+def iter_csv_segments(file, filename: str) -> Iterator[str]:
+    """Yield the CSV header segment, then its rows in chunks"""
     logging.info(f"Processing CSV file: {filename}")
    
     try:
-        text_parts = [f"[CSV File: {filename}]"]
-        chunk_num = 0
+        yield f"[CSV File: {filename}]"
+        # Text streams are already decoded; only seekable binary input can be sniffed and re-read
+        binary = not isinstance(file, io.TextIOBase)
+        seekable = _source_path(file) is not None or (hasattr(file, 'seekable') and file.seekable())
+        encoding = None
+        if binary and seekable:
+            encoding = _detect_csv_encoding(file)
+            logging.info(f"Detected CSV encoding: {encoding}")
        
-        # Process CSV in chunks to handle large files
-        for chunk_df in pd.read_csv(file, chunksize=config.csv_chunk_size):
+        if config.csv_engine == "pyarrow" and pa is not None and encoding is not None:
+            chunks = _iter_csv_chunks_arrow(file, encoding)
+        else:
+            chunks = _iter_csv_chunks_pandas(file, encoding)
+       
+        chunk_num = 0
+        for headers, chunk_text in chunks:
             chunk_num += 1
-            logging.info(f"Processing CSV chunk {chunk_num} ({len(chunk_df)} rows)")
-           
             # Add headers for first chunk
             if chunk_num == 1:
-                headers = " | ".join(str(col) for col in chunk_df.columns)
-                text_parts.append(f"Headers: {headers}")
-           
-            # Convert chunk to text
-            chunk_text = dataframe_to_text(chunk_df, f"chunk_{chunk_num}")
-            text_parts.append(chunk_text)
+                yield f"Headers: {headers}"
+            yield chunk_text
            
             # Memory management
             if chunk_num % 10 == 0:
@@ -272,26 +585,91 @@ def extract_csv_text(file, filename: str) -> str:
                     logging.warning(f"High memory usage processing CSV: {resources['memory_percent']:.1f}%")
                     gc.collect()
        
-        result = "\n\n".join(text_parts)
-        logging.info(f"Processed {chunk_num} chunks, extracted {len(result)} characters from CSV")
-        return result
+        logging.info(f"Processed {chunk_num} CSV chunks")
        
     except Exception as e:
         logging.error(f"Error processing CSV file {filename}: {e}")
         raise
  
+def _iter_csv_chunks_pandas(file, encoding) -> Iterator[tuple]:
+    """(headers, chunk text) per `csv_chunk_size` rows, parsed with the pandas C parser"""
+    for chunk_num, chunk_df in enumerate(pd.read_csv(file, chunksize=config.csv_chunk_size, encoding=encoding), start=1):
+        logging.info(f"Processing CSV chunk {chunk_num} ({len(chunk_df)} rows)")
+        headers = " | ".join(str(col) for col in chunk_df.columns)
+        yield headers, dataframe_to_text(chunk_df, f"chunk_{chunk_num}")
+ 
+def _iter_csv_chunks_arrow(file, encoding: str) -> Iterator[tuple]:
+    """
+    (headers, chunk text) per `csv_chunk_size` rows, read as pyarrow record
+    batches and formatted with Arrow compute kernels instead of per-row Python.
+    Every column is read as a string, so cells keep the text they have in the
+    file (no type inference, no "1" -> "1.0" for integer columns with gaps);
+    the pandas default missing-value markers become "N/A" as before.
+    """
+    source = _source_path(file) or file
+    start = None if isinstance(source, str) else source.tell()
+    read_options = pa_csv.ReadOptions(encoding=encoding)
+   
+    # The first block gives the column names needed to read every column as text
+    with pa_csv.open_csv(source, read_options=read_options) as reader:
+        names = reader.schema.names
+    if start is not None:
+        source.seek(start)
+   
+    convert_options = pa_csv.ConvertOptions(
+        column_types={name: pa.string() for name in names},
+        strings_can_be_null=True,
+    )
+    headers = " | ".join(names)
+    rows_done = 0
+    with pa_csv.open_csv(source, read_options=read_options, convert_options=convert_options) as reader:
+        for chunk_num, table in enumerate(_rebatch(reader, config.csv_chunk_size), start=1):
+            logging.info(f"Processing CSV chunk {chunk_num} ({table.num_rows} rows)")
+            yield headers, _arrow_table_to_text(table, rows_done, f"chunk_{chunk_num}")
+            rows_done += table.num_rows
+ 
+def _rebatch(reader, rows: int) -> Iterator["pa.Table"]:
+    """Regroup a record batch reader's variable-size batches into tables of `rows` rows"""
+    pending, pending_rows = [], 0
+    for batch in reader:
+        pending.append(batch)
+        pending_rows += batch.num_rows
+        while pending_rows >= rows:
+            table = pa.Table.from_batches(pending, schema=reader.schema)
+            yield table.slice(0, rows)
+            rest = table.slice(rows)
+            pending, pending_rows = rest.to_batches(), rest.num_rows
+    if pending_rows:
+        yield pa.Table.from_batches(pending, schema=reader.schema)
+ 
+def _arrow_table_to_text(table: "pa.Table", first_row: int, section_name: str) -> str:
+    """Same layout as dataframe_to_text: a section marker, then `Row i: a | b | ...`"""
+    columns = [pc.fill_null(column, "N/A") for column in table.columns]
+    if columns:
+        values = pc.binary_join_element_wise(*columns, " | ")
+    else:
+        values = pa.array([""] * table.num_rows, pa.string())
+    index = pc.cast(pa.array(np.arange(first_row, first_row + table.num_rows)), pa.string())
+    lines = pc.binary_join_element_wise("Row ", index, ": ", values, "")
+    return "\n".join([f"[{section_name}]", *lines.to_pylist()])
+ 
 def extract_docx_text(file, filename: str) -> str:
     """Enhanced DOCX processing"""
+    result = "\n\n".join(iter_docx_segments(file, filename))
+    logging.info(f"Extracted {len(result)} characters from DOCX")
+    return result
+ 
+def iter_docx_segments(file, filename: str) -> Iterator[str]:
+    """Yield DOCX paragraphs, then one `[Table N]` segment per table"""
     logging.info(f"Processing DOCX file: {filename}")
    
     try:
         doc = Document(file)
-        text_parts = []
        
         # Extract paragraphs
         for i, paragraph in enumerate(doc.paragraphs):
             if paragraph.text.strip():
-                text_parts.append(paragraph.text)
+                yield paragraph.text
            
             # Memory check for very large documents
             if i % 1000 == 0 and i > 0:
@@ -309,11 +687,7 @@ def extract_docx_text(file, filename: str) -> str:
                     row_text = " | ".join(cell.text.strip() for cell in row.cells)
                     if row_text.strip():
                         table_text += f"\n{row_text}"
-                text_parts.append(table_text)
-       
-        result = "\n\n".join(text_parts)
-        logging.info(f"Extracted {len(result)} characters from DOCX")
-        return result
+                yield table_text
        
     except Exception as e:
         logging.error(f"Error processing DOCX file {filename}: {e}")
@@ -322,28 +696,8 @@ def extract_docx_text(file, filename: str) -> str:
 def extract_txt_text(file, filename: str) -> str:
     """Enhanced text file processing"""
     try:
-        # Handle both file objects and file paths
-        if hasattr(file, 'read'):
-            content = file.read()
-            if isinstance(content, bytes):
-                # Try different encodings
-                for encoding in ['utf-8', 'latin-1', 'cp1252', 'iso-8859-1']:
-                    try:
-                        result = content.decode(encoding)
-                        logging.info(f"Successfully decoded text file with {encoding}")
-                        break
-                    except UnicodeDecodeError:
-                        continue
-                else:
-                    # If all encodings fail, use utf-8 with error handling
-                    result = content.decode('utf-8', errors='replace')
-                    logging.warning("Used UTF-8 with error replacement for text file")
-            else:
-                result = content
-        else:
-            # File path
-            with open(file, 'r', encoding='utf-8') as f:
-                result = f.read()
+        # Handle both file objects and file paths; decoded straight from the mapped file
+        result = _read_text(file)
        
         logging.info(f"Extracted {len(result)} characters from text file")
         return result
@@ -355,14 +709,7 @@ def extract_txt_text(file, filename: str) -> str:
 def extract_json_text(file, filename: str) -> str:
     """Enhanced JSON processing"""
     try:
-        if hasattr(file, 'read'):
-            content = file.read()
-            if isinstance(content, bytes):
-                content = content.decode('utf-8')
-            data = json.loads(content)
-        else:
-            with open(file, 'r') as f:
-                data = json.load(f)
+        data = json.loads(_read_text(file))
        
         result = json.dumps(data, indent=2, ensure_ascii=False)
         logging.info(f"Extracted {len(result)} characters from JSON file")
@@ -379,28 +726,42 @@ def dataframe_to_text(df: pd.DataFrame, section_name: str = None) -> str:
     if section_name:
         text_parts.append(f"[{section_name}]")
    
-    # Add data rows
-    for index, row in df.iterrows():
-        try:
-            row_text = " | ".join(str(val) if pd.notna(val) else "N/A" for val in row.values)
-            text_parts.append(f"Row {index}: {row_text}")
-        except Exception as e:
-            logging.warning(f"Error processing row {index}: {e}")
-            continue
+    if len(df):
+        # df.values has the same common dtype iterrows() rows have, so values
+        # render exactly as before; convert a whole column at a time instead of per cell
+        values = df.values
+        columns = []
+        for j in range(values.shape[1]):
+            column = values[:, j]
+            if column.dtype.kind in "iub":
+                columns.append(column.astype(str).tolist())
+                continue
+            if column.dtype.kind == "f":
+                strings = column.astype(str)
+            else:
+                strings = np.array([str(val) for val in column], dtype=object)
+            missing = pd.isna(column)
+            if missing.any():
+                strings = np.where(missing, "N/A", strings)
+            columns.append(strings.tolist())
+       
+        # Add data rows
+        rows = map(" | ".join, zip(*columns)) if columns else [""] * len(df)
+        text_parts.extend(f"Row {index}: {row_text}" for index, row_text in zip(df.index, rows))
    
     return "\n".join(text_parts)
  
+# Shared, bounded pool for async callers instead of a new executor per call
+_extraction_executor = ThreadPoolExecutor(max_workers=config.extraction_workers, thread_name_prefix="extract")
+ 
 async def extract_text_async(file, filename: str) -> str:
     """
     Async wrapper for text extraction - useful for processing multiple files
     """
-    loop = asyncio.get_event_loop()
+    loop = asyncio.get_running_loop()
    
-    # Run the synchronous extraction in a thread pool
-    with ThreadPoolExecutor(max_workers=1) as executor:
-        result = await loop.run_in_executor(executor, extract_text, file, filename)
-   
-    return result
+    # Run the synchronous extraction in the shared thread pool
+    return await loop.run_in_executor(_extraction_executor, extract_text, file, filename)
  
 def get_processing_stats() -> Dict[str, Any]:
     """Get current processing statistics"""
@@ -412,7 +773,8 @@ def get_processing_stats() -> Dict[str, Any]:
             "max_file_size_mb": config.max_file_size_mb,
             "memory_threshold": config.memory_threshold,
             "excel_chunk_size": config.excel_chunk_size,
-            "csv_chunk_size": config.csv_chunk_size
+            "csv_chunk_size": config.csv_chunk_size,
+            "csv_engine": config.csv_engine if pa is not None else "pandas"
         },
         "recommendations": get_performance_recommendations(resources)
     }
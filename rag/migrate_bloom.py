@@ -0,0 +1,134 @@
+"""
+Convert per-level Bloom points into single multi-label points.
+
+Legacy ingestion wrote one point per BloomLevel per chunk, each with the same
+vector and content and a different `bloom_level` payload. This migration
+collapses each group into one point carrying a `bloom_levels` array, then
+deletes the legacy points. It runs one document at a time so memory stays
+bounded by the largest document.
+
+Usage:
+    python -m rag.migrate_bloom [--dry-run] [--document-id ID] [--batch-size 256]
+"""
+import argparse
+import logging
+import time
+from typing import Dict, Any, List, Optional, Set
+from qdrant_client import QdrantClient
+from qdrant_client.http import models as rest
+from qdrant_client.http.models import PointStruct
+from rag.qdrant import COLLECTION_NAME, BloomLevel, _get_client, _point_id, ensure_payload_indexes
+
+LEGACY_FILTER = rest.IsEmptyCondition(is_empty=rest.PayloadField(key="bloom_level"))
+
+
+def _legacy_document_ids(client: QdrantClient, page_size: int) -> Set[str]:
+    """Collect the document IDs that still have per-level points."""
+    document_ids = set()
+    offset = None
+    while True:
+        records, offset = client.scroll(
+            collection_name=COLLECTION_NAME,
+            scroll_filter=rest.Filter(must_not=[LEGACY_FILTER]),
+            limit=page_size,
+            offset=offset,
+            with_payload=["document_id"],
+            with_vectors=False,
+        )
+        for record in records:
+            document_id = (record.payload or {}).get("document_id")
+            if document_id:
+                document_ids.add(document_id)
+            else:
+                logging.warning(f"Skipping legacy point {record.id} without document_id")
+        if offset is None:
+            return document_ids
+
+
+def _document_filter(document_id: str) -> rest.Filter:
+    return rest.Filter(
+        must=[rest.FieldCondition(key="document_id", match=rest.MatchValue(value=document_id))],
+        must_not=[LEGACY_FILTER],
+    )
+
+
+def migrate_document(client: QdrantClient, document_id: str, batch_size: int = 256, dry_run: bool = False) -> Dict[str, Any]:
+    """Collapse one document's per-level points into multi-label points."""
+    groups: Dict[str, Dict[str, Any]] = {}
+    legacy_count = 0
+    offset = None
+    while True:
+        records, offset = client.scroll(
+            collection_name=COLLECTION_NAME,
+            scroll_filter=_document_filter(document_id),
+            limit=batch_size,
+            offset=offset,
+            with_payload=True,
+            with_vectors=True,
+        )
+        for record in records:
+            legacy_count += 1
+            payload = dict(record.payload or {})
+            level = payload.pop("bloom_level", None)
+            # Same seed as ingestion, so re-ingesting the document overwrites these points
+            seed = f"{payload.get('content', '')}{payload.get('source', '')}{document_id}{payload.get('chunk_index', 0)}"
+            group = groups.setdefault(seed, {"payload": payload, "vector": record.vector, "levels": set()})
+            if level:
+                group["levels"].add(level)
+        if offset is None:
+            break
+
+    points: List[PointStruct] = []
+    for seed, group in groups.items():
+        payload = group["payload"]
+        payload["bloom_levels"] = [level.value for level in BloomLevel if level.value in group["levels"]]
+        points.append(PointStruct(id=_point_id(seed), vector=group["vector"], payload=payload))
+
+    result = {"document_id": document_id, "legacy_points": legacy_count, "migrated_points": len(points)}
+    if dry_run or not points:
+        return result
+
+    for i in range(0, len(points), batch_size):
+        client.upsert(collection_name=COLLECTION_NAME, points=points[i:i + batch_size], wait=True)
+    client.delete(
+        collection_name=COLLECTION_NAME,
+        points_selector=rest.FilterSelector(filter=_document_filter(document_id)),
+        wait=True,
+    )
+    return result
+
+
+def migrate_collection(batch_size: int = 256, dry_run: bool = False, document_id: Optional[str] = None) -> Dict[str, Any]:
+    """Migrate every document (or a single one) to multi-label Bloom storage."""
+    start_time = time.time()
+    client = _get_client()
+    ensure_payload_indexes(client)
+
+    document_ids = [document_id] if document_id else sorted(_legacy_document_ids(client, batch_size))
+    logging.info(f"Migrating {len(document_ids)} documents to multi-label Bloom storage (dry_run={dry_run})")
+
+    totals = {"documents": 0, "legacy_points": 0, "migrated_points": 0, "dry_run": dry_run}
+    for doc_id in document_ids:
+        result = migrate_document(client, doc_id, batch_size=batch_size, dry_run=dry_run)
+        logging.info(f"Document {doc_id}: {result['legacy_points']} legacy points -> {result['migrated_points']} points")
+        totals["documents"] += 1
+        totals["legacy_points"] += result["legacy_points"]
+        totals["migrated_points"] += result["migrated_points"]
+
+    totals["elapsed_seconds"] = round(time.time() - start_time, 2)
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="Report what would change without writing")
+    parser.add_argument("--document-id", default=None, help="Only migrate this document")
+    parser.add_argument("--batch-size", type=int, default=256)
+    args = parser.parse_args()
+
+    totals = migrate_collection(batch_size=args.batch_size, dry_run=args.dry_run, document_id=args.document_id)
+    print(totals)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,605 @@
+"""
+Streaming ingestion: extract -> chunk -> embed -> upsert.
+
+The stages run in their own threads and are connected by bounded queues, so
+extraction of later pages overlaps with embedding and upserting of earlier
+ones, and peak memory is bounded by the queue sizes rather than the document
+size. Live progress and per-stage throughput are published to the Redis
+`document_{id}` status.
+
+Progress is checkpointed in `document_checkpoint_{id}`: the extracted segment
+and chunk index up to which everything has been upserted. An interrupted run
+(crash, restart, failed batch) resumes from there; point IDs are deterministic,
+so re-upserting the few chunks after the checkpoint is harmless. The spooled
+upload lives as long as its checkpoint; `sweep_spool_files` removes the ones
+whose checkpoint is gone (success, expiry).
+"""
+import logging
+import os
+import queue
+import tempfile
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+from typing import Iterable, Iterator, Dict, Any, List, Optional
+from core.admission import AdmissionRejected, estimate_cost_mb, upload_admission
+from core.background_loop import run_sync
+from core.config import get_settings, set_redis_json, get_redis_json, redis_client
+from rag.loader import iter_text_segments, estimate_segment_count
+from rag.qdrant import (
+    COLLECTION_NAME,
+    BLOOM_STORAGE_MODE,
+    BloomLevel,
+    _build_bloom_points,
+    _document_filter,
+    _embed_chunks,
+    _get_client,
+    _get_embedding,
+    build_chunks,
+    ensure_collection,
+    register_document,
+)
+
+settings = get_settings()
+
+_DONE = object()  # end-of-stream marker passed between stages
+PROGRESS_INTERVAL = 1.0  # seconds between Redis status updates
+CHECKPOINT_TTL = 7 * 86400
+LEASE_TTL = 300  # seconds; refreshed by a heartbeat while a run is alive
+SPOOL_PREFIX = "rag_spool_"
+SPOOL_ORPHAN_GRACE = 3600  # seconds a spooled file may exist before its first checkpoint
+SPOOL_SWEEP_INTERVAL = 3600
+
+
+class IngestionInProgress(Exception):
+    """Another worker holds the lease for this document"""
+
+
+def _checkpoint_key(document_id: str) -> str:
+    return f"document_checkpoint_{document_id}"
+
+
+def _lease_key(document_id: str) -> str:
+    return f"document_lease_{document_id}"
+
+
+def get_checkpoint(document_id: str) -> Optional[Dict[str, Any]]:
+    return get_redis_json(_checkpoint_key(document_id))
+
+
+def is_ingestion_running(document_id: str) -> bool:
+    return bool(redis_client.exists(_lease_key(document_id)))
+
+
+def spool_dir() -> str:
+    return settings.RAG_UPLOAD_SPOOL_DIR or tempfile.gettempdir()
+
+
+def _remove_spool_file(file_path: Optional[str]):
+    if not file_path:
+        return
+    try:
+        os.remove(file_path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logging.warning(f"Could not remove spooled upload {file_path}: {e}")
+
+
+def discard_checkpoint(document_id: str):
+    """Drop a document's checkpoint together with its spooled upload"""
+    checkpoint = get_checkpoint(document_id)
+    redis_client.delete(_checkpoint_key(document_id))
+    if checkpoint:
+        _remove_spool_file(checkpoint.get("file_path"))
+
+
+def sweep_spool_files() -> int:
+    """
+    Remove spooled uploads no checkpoint refers to any more (expired or
+    discarded). Files younger than SPOOL_ORPHAN_GRACE are left alone, as their
+    run may not have written its first checkpoint yet. Returns the count removed.
+    """
+    directory = spool_dir()
+    referenced = set()
+    for key in redis_client.scan_iter(match=_checkpoint_key("*")):
+        checkpoint = get_checkpoint(key[len(_checkpoint_key("")):])
+        if checkpoint and checkpoint.get("file_path"):
+            referenced.add(os.path.abspath(checkpoint["file_path"]))
+    # The shared temp dir holds other files; a configured spool dir is ours alone
+    only_prefixed = not settings.RAG_UPLOAD_SPOOL_DIR
+    removed = 0
+    try:
+        entries = list(os.scandir(directory))
+    except FileNotFoundError:
+        return 0
+    for entry in entries:
+        if only_prefixed and not entry.name.startswith(SPOOL_PREFIX):
+            continue
+        try:
+            if not entry.is_file() or time.time() - entry.stat().st_mtime < SPOOL_ORPHAN_GRACE:
+                continue
+        except OSError:
+            continue
+        if os.path.abspath(entry.path) in referenced:
+            continue
+        _remove_spool_file(entry.path)
+        removed += 1
+    if removed:
+        logging.info(f"Removed {removed} orphaned spooled uploads from {directory}")
+    return removed
+
+
+def run_spool_sweeper():
+    """Sweep orphaned spooled uploads forever; run on a daemon thread"""
+    while True:
+        try:
+            sweep_spool_files()
+        except Exception as e:
+            logging.error(f"Spool sweep failed: {e}")
+        time.sleep(SPOOL_SWEEP_INTERVAL)
+
+
+class StageStats:
+    """Items processed and busy time for one pipeline stage"""
+
+    def __init__(self):
+        self.items = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, items: int, seconds: float):
+        with self._lock:
+            self.items += items
+            self.seconds += seconds
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "items": self.items,
+            "busy_seconds": round(self.seconds, 2),
+            "items_per_second": round(self.items / self.seconds, 1) if self.seconds else None,
+        }
+
+
+class IngestionPipeline:
+    """One streaming ingestion run for a single document"""
+
+    def __init__(
+        self,
+        source: str,
+        document_name: str,
+        document_id: Optional[str] = None,
+        organisation_id: Optional[str] = None,
+        chunker: Optional[str] = None,
+        file_path: Optional[str] = None,
+        checkpoint: Optional[Dict[str, Any]] = None,
+    ):
+        checkpoint = checkpoint or {}
+        self.source = source
+        self.document_name = document_name
+        self.document_id = document_id or str(uuid.uuid4())
+        self.organisation_id = organisation_id
+        self.chunker = chunker
+        self.file_path = file_path
+        self.upload_timestamp = checkpoint.get("upload_timestamp") or datetime.now().isoformat()
+        self.redis_key = f"document_{self.document_id}"
+        # Chunk boundaries depend on the buffer size, so a resumed run must use the original one
+        self.segment_chars = checkpoint.get("segment_chars") or settings.RAG_PIPELINE_SEGMENT_CHARS
+        self.resume_segment = checkpoint.get("resume_segment", 0)
+        self.skip_segments = self.resume_segment  # fixed for this run; resume_segment advances
+        self.resume_chunk_index = checkpoint.get("resume_chunk_index", 0)
+        self.total_segments = checkpoint.get("total_segments")
+
+        # Created when the run starts, so that an unavailable Qdrant or embedding
+        # client is reported as a failed run like any other error
+        self.client = None
+        self.embedding = None
+        self.embed_workers = settings.RAG_PIPELINE_EMBED_WORKERS
+        self.chunk_batches = queue.Queue(maxsize=settings.RAG_PIPELINE_QUEUE_SIZE)
+        self.point_batches = queue.Queue(maxsize=settings.RAG_PIPELINE_QUEUE_SIZE)
+        self.stats = {stage: StageStats() for stage in ("extract", "chunk", "embed", "upsert")}
+        self.failed = threading.Event()
+        self.errors: List[str] = []
+        self.segments_extracted = self.resume_segment
+        self.total_chunks = self.resume_chunk_index
+        self.chunks_embedded = self.resume_chunk_index
+        self.points_upserted = checkpoint.get("points_upserted", 0)
+        # (segments consumed, chunks produced) after each chunking flush, in order
+        self.boundaries = deque()
+        self.committed: Dict[int, int] = {}  # first chunk index -> chunk count of upserted batches
+        self.watermark = self.resume_chunk_index  # every chunk below this index is upserted
+        self.lease_token = str(uuid.uuid4())
+        self.start_time = None
+
+    # Queue helpers that give up once another stage has failed, so no thread blocks forever
+
+    def _put(self, q: queue.Queue, item):
+        while not self.failed.is_set():
+            try:
+                q.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def _get(self, q: queue.Queue):
+        while not self.failed.is_set():
+            try:
+                return q.get(timeout=0.5)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _fail(self, stage: str, error: Exception):
+        logging.error(f"Ingestion {stage} stage failed for document {self.document_id}: {error}")
+        self.errors.append(f"{stage}: {error}")
+        self.failed.set()
+
+    def _timed_segments(self, segments: Iterable[str]) -> Iterator[str]:
+        iterator = iter(segments)
+        while True:
+            start = time.perf_counter()
+            try:
+                segment = next(iterator)
+            except StopIteration:
+                return
+            self.stats["extract"].add(1, time.perf_counter() - start)
+            yield segment
+
+    # Stages
+
+    def _chunk_stage(self, segments: Iterable[str]):
+        """Buffer extracted segments, chunk them and emit embedding-sized batches"""
+        buffer: List[str] = []
+        buffered_chars = 0
+        try:
+            for index, segment in enumerate(self._timed_segments(segments)):
+                if self.failed.is_set():
+                    return
+                if index < self.skip_segments:
+                    continue  # already chunked and stored by an earlier run
+                self.segments_extracted = index + 1
+                buffer.append(segment)
+                buffered_chars += len(segment)
+                if buffered_chars >= self.segment_chars:
+                    self._flush_chunks(buffer)
+                    buffer, buffered_chars = [], 0
+            if buffer:
+                self._flush_chunks(buffer)
+        except Exception as e:
+            self._fail("chunk", e)
+        finally:
+            for _ in range(self.embed_workers):
+                self._put(self.chunk_batches, _DONE)
+
+    def _flush_chunks(self, buffer: List[str]):
+        start = time.perf_counter()
+        chunks = build_chunks("\n\n".join(buffer), self.source, chunker=self.chunker, embedding=self.embedding)
+        first_index = self.total_chunks
+        for doc in chunks:
+            doc["metadata"]["chunk_index"] += first_index
+            # The final count is only known at the end; it is set on all points then
+            doc["metadata"].pop("total_chunks", None)
+        self.total_chunks += len(chunks)
+        self.boundaries.append((self.segments_extracted, self.total_chunks))
+        self.stats["chunk"].add(len(chunks), time.perf_counter() - start)
+
+        for i in range(0, len(chunks), settings.RAG_EMBED_BATCH_SIZE):
+            self._put(self.chunk_batches, (first_index + i, chunks[i:i + settings.RAG_EMBED_BATCH_SIZE]))
+
+    def _embed_stage(self):
+        """Embed chunk batches and turn them into Qdrant points"""
+        try:
+            while True:
+                item = self._get(self.chunk_batches)
+                if item is _DONE:
+                    return
+                first_index, batch = item
+                start = time.perf_counter()
+                vectors = _embed_chunks(self.embedding, batch)
+                points = []
+                for doc, vec in zip(batch, vectors):
+                    chunk_index = doc["metadata"]["chunk_index"]
+                    payload = doc["metadata"].copy()
+                    payload["content"] = doc["content"]
+                    payload["document_id"] = self.document_id
+                    payload["document_name"] = self.document_name
+                    payload["upload_timestamp"] = self.upload_timestamp
+                    if self.organisation_id:
+                        payload["organisation_id"] = self.organisation_id
+                    points.extend(_build_bloom_points(
+                        vec, payload, doc["content"] + self.source + self.document_id + str(chunk_index)
+                    ))
+                self.stats["embed"].add(len(batch), time.perf_counter() - start)
+                self._put(self.point_batches, (first_index, len(batch), points))
+        except Exception as e:
+            self._fail("embed", e)
+        finally:
+            self._put(self.point_batches, _DONE)
+
+    def _upsert_stage(self):
+        """Upsert point batches and advance the checkpoint; runs on the calling thread"""
+        finished_workers = 0
+        last_progress = 0.0
+        while finished_workers < self.embed_workers:
+            item = self._get(self.point_batches)
+            if item is _DONE:
+                # _get also returns _DONE on failure; wait for the real markers only while healthy
+                finished_workers = self.embed_workers if self.failed.is_set() else finished_workers + 1
+                continue
+            first_index, chunk_count, points = item
+            for i in range(0, len(points), settings.RAG_UPSERT_BATCH_SIZE):
+                batch = points[i:i + settings.RAG_UPSERT_BATCH_SIZE]
+                start = time.perf_counter()
+                try:
+                    self.client.upsert(collection_name=COLLECTION_NAME, points=batch, wait=True)
+                except Exception as e:
+                    self._fail("upsert", e)
+                    return
+                self.stats["upsert"].add(len(batch), time.perf_counter() - start)
+                self.points_upserted += len(batch)
+            self.chunks_embedded += chunk_count
+            self._commit(first_index, chunk_count)
+            if time.time() - last_progress >= PROGRESS_INTERVAL:
+                self._publish("processing", f"Stored {self.points_upserted} points so far")
+                last_progress = time.time()
+
+    # Checkpointing and status
+
+    def _commit(self, first_index: int, chunk_count: int):
+        """Record an upserted batch; checkpoint the last flush boundary fully below the watermark"""
+        self.committed[first_index] = chunk_count
+        while self.watermark in self.committed:
+            self.watermark += self.committed.pop(self.watermark)
+
+        advanced = False
+        while self.boundaries and self.boundaries[0][1] <= self.watermark:
+            self.resume_segment, self.resume_chunk_index = self.boundaries.popleft()
+            advanced = True
+        if advanced:
+            self._save_checkpoint("processing")
+
+    def _save_checkpoint(self, status: str):
+        set_redis_json(_checkpoint_key(self.document_id), {
+            "status": status,
+            "document_id": self.document_id,
+            "document_name": self.document_name,
+            "source": self.source,
+            "organisation_id": self.organisation_id,
+            "chunker": self.chunker,
+            "file_path": self.file_path,
+            "upload_timestamp": self.upload_timestamp,
+            "segment_chars": self.segment_chars,
+            "total_segments": self.total_segments,
+            "resume_segment": self.resume_segment,
+            "resume_chunk_index": self.resume_chunk_index,
+            "points_upserted": self.points_upserted,
+            "updated_at": datetime.now().isoformat(),
+        }, expire=CHECKPOINT_TTL)
+
+    def _eta_seconds(self) -> Optional[float]:
+        if not self.total_segments or self.segments_extracted <= self.skip_segments:
+            return None
+        elapsed = time.time() - self.start_time
+        rate = (self.segments_extracted - self.skip_segments) / elapsed
+        return round(max(self.total_segments - self.segments_extracted, 0) / rate, 1)
+
+    def _publish(self, status: str, message: str, **extra) -> Dict[str, Any]:
+        payload = {
+            "status": status,
+            "document_id": self.document_id,
+            "document_name": self.document_name,
+            "organisation_id": self.organisation_id,
+            "total_chunks": self.total_chunks,
+            "pages_extracted": self.segments_extracted,
+            "total_pages": self.total_segments,
+            "chunks_embedded": self.chunks_embedded,
+            "points_upserted": self.points_upserted,
+            "eta_seconds": self._eta_seconds() if status == "processing" else 0,
+            "resumed_from_segment": self.skip_segments or None,
+            "upload_timestamp": self.upload_timestamp,
+            "stages": {stage: stats.to_dict() for stage, stats in self.stats.items()},
+            "total_time": round(time.time() - self.start_time, 2),
+            "message": message,
+            **extra,
+        }
+        set_redis_json(self.redis_key, payload)
+        return payload
+
+    def _acquire_lease(self):
+        if not redis_client.set(_lease_key(self.document_id), self.lease_token, nx=True, ex=LEASE_TTL):
+            raise IngestionInProgress(f"Document {self.document_id} is already being ingested")
+
+    def _release_lease(self):
+        if redis_client.get(_lease_key(self.document_id)) == self.lease_token:
+            redis_client.delete(_lease_key(self.document_id))
+
+    def _heartbeat(self, stopped: threading.Event):
+        """Keep the lease alive for as long as the run is, however slow a stage is"""
+        while not stopped.wait(LEASE_TTL / 3):
+            try:
+                if redis_client.get(_lease_key(self.document_id)) != self.lease_token:
+                    logging.warning(f"Lost the ingestion lease of document {self.document_id}")
+                    return
+                redis_client.expire(_lease_key(self.document_id), LEASE_TTL)
+            except Exception as e:
+                logging.warning(f"Could not refresh the ingestion lease of document {self.document_id}: {e}")
+
+    def run(self, segments: Iterable[str]) -> Dict[str, Any]:
+        self._acquire_lease()
+        stopped = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(stopped,), daemon=True)
+        heartbeat.start()
+        try:
+            return self._run(segments)
+        finally:
+            stopped.set()
+            heartbeat.join()
+            self._release_lease()
+
+    def _run(self, segments: Iterable[str]) -> Dict[str, Any]:
+        self.start_time = time.time()
+        self.client = _get_client()
+        self.embedding = _get_embedding()
+        ensure_collection(self.client)
+        resumed = self.skip_segments > 0
+        logging.info(
+            f"Streaming ingestion of '{self.document_name}' ({self.document_id}) "
+            f"with {self.embed_workers} embed workers ({BLOOM_STORAGE_MODE} Bloom storage)"
+            + (f", resuming at segment {self.resume_segment} / chunk {self.resume_chunk_index}" if resumed else "")
+        )
+        self._save_checkpoint("processing")
+        self._publish("processing", "Ingestion resumed from checkpoint" if resumed else "Ingestion started")
+
+        threads = [threading.Thread(target=self._chunk_stage, args=(segments,), daemon=True)]
+        threads += [threading.Thread(target=self._embed_stage, daemon=True) for _ in range(self.embed_workers)]
+        for thread in threads:
+            thread.start()
+        self._upsert_stage()
+        for thread in threads:
+            thread.join()
+
+        if self.failed.is_set():
+            self._save_checkpoint("error")
+            status = "partial_success" if self.points_upserted else "error"
+            return self._publish(status, f"Ingestion failed: {'; '.join(self.errors)}. Resume to continue from the last checkpoint.")
+        if not self.total_chunks:
+            self._save_checkpoint("error")
+            return self._publish("error", "Failed to process document chunks")
+
+        self.client.set_payload(
+            collection_name=COLLECTION_NAME,
+            payload={"total_chunks": self.total_chunks},
+            points=_document_filter(self.document_id),
+            wait=True,
+        )
+        register_document(
+            self.document_id, self.document_name, self.upload_timestamp,
+            self.total_chunks, self.organisation_id, self.source,
+        )
+        discard_checkpoint(self.document_id)
+        logging.info(f"Streaming ingestion of '{self.document_name}' finished in {time.time() - self.start_time:.2f} seconds")
+        return self._publish(
+            "success",
+            f"Document stored for all Bloom levels with {self.total_chunks} chunks (streaming pipeline)",
+            bloom_levels_processed=len(BloomLevel),
+        )
+
+
+def ingest_document_stream(
+    segments: Iterable[str],
+    source: str,
+    document_name: str,
+    document_id: Optional[str] = None,
+    organisation_id: Optional[str] = None,
+    chunker: Optional[str] = None,
+    file_path: Optional[str] = None,
+    checkpoint: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Ingest a document from an iterable of text segments (see
+    rag.loader.iter_text_segments) without materializing the whole text,
+    chunk list or point list. Returns the final status payload.
+    """
+    pipeline = IngestionPipeline(source, document_name, document_id, organisation_id, chunker, file_path, checkpoint)
+    try:
+        return pipeline.run(segments)
+    except IngestionInProgress as e:
+        logging.warning(str(e))
+        return get_redis_json(pipeline.redis_key) or {"status": "processing", "document_id": pipeline.document_id}
+    except Exception as e:
+        error = getattr(e, "detail", None) or e  # HTTPException (e.g. Qdrant unavailable) has an empty str()
+        logging.error(f"Streaming ingestion failed for document {pipeline.document_id}: {error}")
+        pipeline.start_time = pipeline.start_time or time.time()
+        pipeline._save_checkpoint("error")
+        return pipeline._publish("error", f"Error storing document: {error}")
+
+
+def ingest_file(
+    file_path: str,
+    source: str,
+    document_name: str,
+    document_id: Optional[str] = None,
+    organisation_id: Optional[str] = None,
+    chunker: Optional[str] = None,
+    checkpoint: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Ingest a spooled upload. The file is kept with the checkpoint, so that a
+    failed or interrupted run can be resumed; success discards both.
+    """
+    checkpoint = dict(checkpoint or {})
+    if checkpoint.get("total_segments") is None:
+        checkpoint["total_segments"] = estimate_segment_count(file_path, source)
+    result = ingest_document_stream(
+        iter_text_segments(file_path, source),
+        source=source,
+        document_name=document_name,
+        document_id=document_id,
+        organisation_id=organisation_id,
+        chunker=chunker,
+        file_path=file_path,
+        checkpoint=checkpoint,
+    )
+    if result.get("status") == "success":
+        _remove_spool_file(file_path)  # already gone unless the run never got to checkpoint
+    return result
+
+
+def resume_ingestion(document_id: str) -> Dict[str, Any]:
+    """Resume an interrupted or failed ingestion from its checkpoint"""
+    checkpoint = get_checkpoint(document_id)
+    if not checkpoint:
+        raise ValueError(f"No ingestion checkpoint for document '{document_id}'")
+    file_path = checkpoint.get("file_path")
+    if not file_path or not os.path.exists(file_path):
+        raise ValueError(f"Spooled upload for document '{document_id}' is no longer available")
+    return ingest_file(
+        file_path,
+        source=checkpoint["source"],
+        document_name=checkpoint["document_name"],
+        document_id=document_id,
+        organisation_id=checkpoint.get("organisation_id"),
+        chunker=checkpoint.get("chunker"),
+        checkpoint=checkpoint,
+    )
+
+
+def _acquire_admission(file_path: str):
+    """Block until the upload admission controller admits re-extracting `file_path`"""
+    cost_mb = estimate_cost_mb(os.path.getsize(file_path), file_path)
+    while True:
+        try:
+            return run_sync(upload_admission.acquire(cost_mb))
+        except AdmissionRejected as e:
+            logging.info(f"Resume of {file_path} not admitted yet; retrying in {e.retry_after}s")
+            time.sleep(e.retry_after)
+
+
+def resume_interrupted_ingestions() -> List[str]:
+    """
+    Resume every checkpointed ingestion whose worker is gone (no live lease),
+    e.g. after a restart. Each one waits for upload admission like a new
+    upload would. Returns the resumed document IDs.
+    """
+    resumed = []
+    for key in redis_client.scan_iter(match=_checkpoint_key("*")):
+        document_id = key[len(_checkpoint_key("")):]
+        checkpoint = get_checkpoint(document_id)
+        if not checkpoint or checkpoint.get("status") != "processing" or is_ingestion_running(document_id):
+            continue
+        file_path = checkpoint.get("file_path")
+        if not file_path or not os.path.exists(file_path):
+            logging.error(f"Could not resume ingestion of document {document_id}: spooled upload is gone")
+            continue
+        ticket = _acquire_admission(file_path)
+        try:
+            logging.info(f"Resuming interrupted ingestion of document {document_id}")
+            resume_ingestion(document_id)
+            resumed.append(document_id)
+        except Exception as e:
+            logging.error(f"Could not resume ingestion of document {document_id}: {e}")
+        finally:
+            ticket.release()
+    return resumed
@@ -1,8 +1,9 @@
+import json
 import time
 import uuid
 import logging
 from qdrant_client import QdrantClient
-from qdrant_client.http.models import Distance, HnswConfigDiff, VectorParams, PointStruct
+from qdrant_client.http.models import PointStruct
 from langchain_openai import OpenAIEmbeddings
 from fastapi import HTTPException
 from pydantic import BaseModel
@@ -11,18 +12,16 @@ from core.config import get_settings
 from qdrant_client.http import models as rest
 from enum import Enum
 import os
-from core.config import set_redis_json
+from core.config import set_redis_json, redis_client
+from rag.collection_profiles import collection_profile_config, build_search_params
 from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import re
 from typing import List, Dict
 from dotenv import load_dotenv
 load_dotenv()
-from langchain_experimental.text_splitter import SemanticChunker
-from langchain_openai.embeddings import OpenAIEmbeddings
+from rag.chunking import chunk_text
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-# Instantiate the SemanticChunker with an OpenAI embedding model
-text_splitter = SemanticChunker(OpenAIEmbeddings())
 
 settings = get_settings()
 
@@ -30,6 +29,7 @@ COLLECTION_NAME = settings.QDRANT_COLLECTION_NAME
 VECTOR_SIZE = settings.QDRANT_VECTOR_SIZE
 QDRANT_HOST = settings.QDRANT_HOST
 QDRANT_PORT = settings.QDRANT_PORT
+BLOOM_STORAGE_MODE = settings.RAG_BLOOM_STORAGE_MODE
 logging.basicConfig(level=logging.INFO)
 
 class CollectionInfoResponse(BaseModel):
@@ -60,6 +60,26 @@ def _get_embedding():
 
 
 
+def _point_id(*parts) -> str:
+    """Deterministic point ID, stable across processes (unlike hash())"""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, "|".join(str(part) for part in parts)))
+
+def _build_bloom_points(vector: List[float], payload: Dict[str, Any], id_seed: str) -> List[PointStruct]:
+    """
+    Points for one chunk according to RAG_BLOOM_STORAGE_MODE.
+      multi_label: one point tagged with every level in a `bloom_levels` array
+      per_level:   one point per level with a `bloom_level` value (legacy layout)
+    If levels ever need different vectors, named vectors on the single point are the next step.
+    """
+    if BLOOM_STORAGE_MODE == "per_level":
+        return [
+            PointStruct(id=_point_id(id_seed, level.value), vector=vector, payload={**payload, "bloom_level": level.value})
+            for level in BloomLevel
+        ]
+    return [
+        PointStruct(id=_point_id(id_seed), vector=vector, payload={**payload, "bloom_levels": [level.value for level in BloomLevel]})
+    ]
+
 def _get_client():
     """Get Qdrant client - minimal working version"""
     logging.info(f"Initializing Qdrant client - Host: {QDRANT_HOST}, Port: {QDRANT_PORT}")
@@ -92,6 +112,79 @@ def ensure_qdrant_ready():
         logging.error(f"Qdrant not ready: {e}")
         raise HTTPException(status_code=503, detail=f"Qdrant service unavailable: {str(e)}")
 
+# Keyword payload indexes; organisation_id is the tenant key of the shared collection
+PAYLOAD_INDEX_FIELDS = ("organisation_id", "document_id", "bloom_level", "bloom_levels")
+TENANT_FIELD = "organisation_id"
+# Integer index used to order paginated chunk retrieval
+INTEGER_INDEX_FIELDS = ("chunk_index",)
+
+def ensure_payload_indexes(client: QdrantClient):
+    """Create missing payload indexes used by filtered search, deletes and chunk paging"""
+    try:
+        existing = client.get_collection(COLLECTION_NAME).payload_schema or {}
+    except Exception as e:
+        logging.warning(f"Could not read payload schema for '{COLLECTION_NAME}': {e}")
+        existing = {}
+
+    for field in PAYLOAD_INDEX_FIELDS + INTEGER_INDEX_FIELDS:
+        if field in existing:
+            continue
+        if field == TENANT_FIELD:
+            schema = rest.KeywordIndexParams(type=rest.KeywordIndexType.KEYWORD, is_tenant=True)
+        elif field in INTEGER_INDEX_FIELDS:
+            schema = rest.PayloadSchemaType.INTEGER
+        else:
+            schema = rest.PayloadSchemaType.KEYWORD
+        try:
+            client.create_payload_index(
+                collection_name=COLLECTION_NAME,
+                field_name=field,
+                field_schema=schema,
+                wait=True,
+            )
+            logging.info(f"Created payload index on '{field}'")
+        except Exception as e:
+            logging.warning(f"Could not create payload index on '{field}': {e}")
+
+def build_search_filter(
+    organisation_id: Optional[str] = None,
+    bloom_level: Optional[Union[str, BloomLevel, List[Union[str, BloomLevel]]]] = None,
+    metadata_filter: Optional[Dict[str, Any]] = None,
+) -> Optional[rest.Filter]:
+    """
+    Build a Qdrant filter scoping a search to a tenant and/or Bloom level(s).
+    Extra `metadata_filter` entries are matched exactly (lists match any value).
+    With RAG_MATCH_UNSTAMPED (off by default, for deployments still migrating
+    data ingested before points were stamped), a tenant also sees points that
+    have no tenant.
+    Returns None when nothing is filtered.
+    """
+    must = []
+    if organisation_id:
+        tenant = rest.FieldCondition(key=TENANT_FIELD, match=rest.MatchValue(value=organisation_id))
+        if settings.RAG_MATCH_UNSTAMPED:
+            must.append(rest.Filter(should=[
+                tenant,
+                rest.IsEmptyCondition(is_empty=rest.PayloadField(key=TENANT_FIELD)),
+            ]))
+        else:
+            must.append(tenant)
+
+    if bloom_level:
+        levels = bloom_level if isinstance(bloom_level, (list, tuple, set)) else [bloom_level]
+        levels = [level.value if isinstance(level, BloomLevel) else level for level in levels]
+        # Multi-label points carry `bloom_levels`, legacy per-level points carry `bloom_level`
+        must.append(rest.Filter(should=[
+            rest.FieldCondition(key="bloom_levels", match=rest.MatchAny(any=levels)),
+            rest.FieldCondition(key="bloom_level", match=rest.MatchAny(any=levels)),
+        ]))
+
+    for key, value in (metadata_filter or {}).items():
+        match = rest.MatchAny(any=list(value)) if isinstance(value, (list, tuple, set)) else rest.MatchValue(value=value)
+        must.append(rest.FieldCondition(key=key, match=match))
+
+    return rest.Filter(must=must) if must else None
+
 def ensure_collection(client: QdrantClient, indexing_threshold: int = 10):
     """Create collection if it doesn't exist - handles buggy collection_exists API"""
     start_time = time.time()
@@ -112,17 +205,15 @@ def ensure_collection(client: QdrantClient, indexing_threshold: int = 10):
                 raise
         
         if not exists:
-            logging.info(f"Creating collection '{COLLECTION_NAME}'...")
+            logging.info(f"Creating collection '{COLLECTION_NAME}' with profile '{settings.QDRANT_COLLECTION_PROFILE}'...")
             
             try:
                 # Create the collection
                 client.create_collection(
                     collection_name=COLLECTION_NAME,
-                    vectors_config=VectorParams(size=VECTOR_SIZE, distance=Distance.COSINE),
-                    hnsw_config=HnswConfigDiff(m=16, ef_construct=100),
-                    on_disk_payload=False,
                     replication_factor=1,
                     shard_number=1,
+                    **collection_profile_config(),
                 )
                 logging.info(f"Collection '{COLLECTION_NAME}' created successfully.")
                 
@@ -146,6 +237,8 @@ def ensure_collection(client: QdrantClient, indexing_threshold: int = 10):
                 
         else:
             logging.info(f"Collection '{COLLECTION_NAME}' already exists.")
+
+        ensure_payload_indexes(client)
         
         # Skip the verification step since collection_exists() is buggy
         # Just assume success if we got here without exceptions
@@ -162,8 +255,11 @@ def ensure_collection(client: QdrantClient, indexing_threshold: int = 10):
     logging.info(f"ensure_collection completed in {elapsed_time:.2f} seconds.")
 
 
-def build_chunks(text: str, source: str, doc_type: str = "default"):
-    """Split text into chunks using SemanticChunker, with section metadata."""
+def build_chunks(text: str, source: str, doc_type: str = "default", chunker: str = None, embedding=None):
+    """
+    Split text into chunks with the chosen chunker (see rag.chunking), with section
+    and page/sheet metadata. Semantic chunks carry their vector in `embedding`.
+    """
     
     def detect_section(chunk_text):
         """Simple section detection based on content patterns."""
@@ -188,15 +284,11 @@ def build_chunks(text: str, source: str, doc_type: str = "default"):
         # Default section name
         return "content"
     
-    # Split text into semantically meaningful chunks
-    # create_documents returns LangChain Document objects
-    langchain_docs = text_splitter.create_documents([text])
+    raw_chunks = chunk_text(text, chunker=chunker, embedding=embedding or _get_embedding())
     
-    # Convert LangChain Documents to your desired format
     docs = []
-    for idx, langchain_doc in enumerate(langchain_docs):
-        # Access content using page_content attribute
-        content = langchain_doc.page_content
+    for idx, raw_chunk in enumerate(raw_chunks):
+        content = raw_chunk["content"]
         section = detect_section(content)
         
         doc = {
@@ -207,17 +299,29 @@ def build_chunks(text: str, source: str, doc_type: str = "default"):
                 "section": section,
                 "chunk_index": idx,
                 "chunk_size": len(content),
-                "total_chunks": len(langchain_docs),
+                "total_chunks": len(raw_chunks),
+                **raw_chunk["location"],
                 # Add more metadata as needed
             }
         }
+        if "embedding" in raw_chunk:
+            doc["embedding"] = raw_chunk["embedding"]
         docs.append(doc)
     
     return docs
 
 
 
-def store_documents(text: str, source: str, document_name: str = None, document_id: str = None):
+def _embed_chunks(embedding, chunks: List[Dict[str, Any]]) -> List[List[float]]:
+    """Vectors for chunks, embedding only those the chunker did not already embed"""
+    missing = [i for i, doc in enumerate(chunks) if doc.get("embedding") is None]
+    vectors = [doc.get("embedding") for doc in chunks]
+    if missing:
+        for i, vec in zip(missing, embedding.embed_documents([chunks[i]["content"] for i in missing])):
+            vectors[i] = vec
+    return vectors
+
+def store_documents(text: str, source: str, document_name: str = None, document_id: str = None, organisation_id: str = None, chunker: str = None):
     """
     Split the text into chunks, embed them, and upsert into Qdrant with Bloom taxonomy support.
     """
@@ -228,7 +332,7 @@ def store_documents(text: str, source: str, document_name: str = None, document_
     ensure_collection(client)
 
     embedding = _get_embedding()
-    chunks = build_chunks(text, source)
+    chunks = build_chunks(text, source, chunker=chunker, embedding=embedding)
     
     if not document_id:
         document_id = str(uuid.uuid4())
@@ -238,33 +342,26 @@ def store_documents(text: str, source: str, document_name: str = None, document_
     upload_timestamp = datetime.utcnow().isoformat()
     chunk_count = len(chunks)
     
+    # Embed every chunk once; the vector is shared by all Bloom levels
+    vectors = _embed_chunks(embedding, chunks)
+
     # Create points for all Bloom levels
     all_points = []
     
-    for doc in chunks:
+    for doc, vec in zip(chunks, vectors):
         base_content = doc["content"]
-        base_metadata = doc["metadata"].copy()
+        chunk_index = doc["metadata"].get("chunk_index", 0)
         
-        # Create a point for each Bloom level
-        for level in BloomLevel:  # Assuming BloomLevel enum exists
-            # Create unique ID for each bloom level version
-            pt_id = abs(hash(base_content + source + document_id + level.value + str(doc["metadata"].get("chunk_index", 0))))
-            
-            # Get embedding (same for all bloom levels of the same content)
-            vec = embedding.embed_documents([base_content])[0]
-            
-            # Create payload with bloom level
-            payload = base_metadata.copy()
-            payload["content"] = base_content
-            payload["document_id"] = document_id
-            payload["document_name"] = document_name
-            payload["upload_timestamp"] = upload_timestamp
-            payload["chunk_count"] = chunk_count
-            payload["bloom_level"] = level.value  # This is the key addition!
-            
-            all_points.append(
-                PointStruct(id=pt_id, vector=vec, payload=payload)
-            )
+        payload = doc["metadata"].copy()
+        payload["content"] = base_content
+        payload["document_id"] = document_id
+        payload["document_name"] = document_name
+        payload["upload_timestamp"] = upload_timestamp
+        payload["chunk_count"] = chunk_count
+        if organisation_id:
+            payload["organisation_id"] = organisation_id
+        
+        all_points.extend(_build_bloom_points(vec, payload, base_content + source + document_id + str(chunk_index)))
 
     # Store all points
     client.upsert(
@@ -273,41 +370,94 @@ def store_documents(text: str, source: str, document_name: str = None, document_
         wait=True,
     )
     
+    register_document(document_id, document_name, upload_timestamp, chunk_count, organisation_id, source)
     logging.info(f"Successfully stored {len(all_points)} document chunks across all Bloom levels.")
     elapsed_time = time.time() - start_time
     logging.info(f"store_documents completed in {elapsed_time:.2f} seconds.")
 
-def get_similar_docs(queries: list[str], k: int = 3, metadata_filter: dict = None) -> str:
-    """Perform similarity search for multiple queries and return best-matched context."""
+RRF_K = 60  # standard reciprocal-rank-fusion damping constant
+
+
+def _reciprocal_rank_fusion(result_lists: list, k: int) -> list:
+    """Fuse several ranked hit lists with reciprocal-rank fusion, keeping the top k."""
+    fused_scores = {}
+    hits_by_id = {}
+    for hits in result_lists:
+        for rank, hit in enumerate(hits):
+            fused_scores[hit.id] = fused_scores.get(hit.id, 0.0) + 1.0 / (RRF_K + rank + 1)
+            hits_by_id.setdefault(hit.id, hit)
+    ranked_ids = sorted(fused_scores, key=fused_scores.get, reverse=True)[:k]
+    return [hits_by_id[point_id] for point_id in ranked_ids]
+
+
+def get_similar_docs(
+    queries: list[str],
+    k: int = 3,
+    metadata_filter: dict = None,
+    fusion: str = "best_average",
+    organisation_id: str = None,
+    bloom_level: Union[str, List[str]] = None,
+    hnsw_ef: int = None,
+    oversampling: float = None,
+) -> str:
+    """
+    Perform similarity search for multiple queries and return best-matched context.
+
+    All queries are embedded in a single request and searched with one
+    `query_batch_points` call. `fusion` selects how the per-query results are
+    combined: "best_average" keeps the query with the highest average score,
+    "rrf" merges all result lists with reciprocal-rank fusion. Searches are
+    scoped to `organisation_id` / `bloom_level` when given; `hnsw_ef` and
+    `oversampling` tune recall versus latency for the collection profile.
+    """
     start_time = time.time()
     client = _get_client()
     embedding = _get_embedding()
 
+    queries = [query for query in queries if query]
+    if not queries:
+        return ""
+    query_filter = build_search_filter(organisation_id, bloom_level, metadata_filter)
+    search_params = build_search_params(hnsw_ef, oversampling)
+
+    try:
+        logging.info(f"Performing batched similarity search for {len(queries)} queries...")
+        query_vectors = embedding.embed_documents(queries)
+        responses = client.query_batch_points(
+            collection_name=COLLECTION_NAME,
+            requests=[
+                rest.QueryRequest(
+                    query=query_vector,
+                    filter=query_filter,
+                    params=search_params,
+                    limit=k,
+                    with_payload=True,
+                    score_threshold=0.0,
+                )
+                for query_vector in query_vectors
+            ],
+        )
+    except Exception as e:
+        logging.warning(f"Batched search error for queries {queries}: {e}")
+        return ""
+
     all_results = []
-    for query in queries:
-        try:
-            logging.info(f"Performing similarity search for query: '{query}'...")
-            query_vector = embedding.embed_query(query)
-            results = client.search(
-                collection_name=COLLECTION_NAME,
-                query_vector=query_vector,
-                limit=k,
-                with_payload=True,
-                score_threshold=0.0
-            )
-            logging.info(f"Search found {len(results)} results for query: '{query}'")
-            if results:
-                all_results.append((query, results))
-        except Exception as e:
-            logging.warning(f"Search error for query '{query}': {e}")
+    for query, response in zip(queries, responses):
+        logging.info(f"Search found {len(response.points)} results for query: '{query}'")
+        if response.points:
+            all_results.append((query, response.points))
 
     if not all_results:
         logging.info("No results found for any query.")
         return ""
 
-    # Return results from the query with highest average score
-    best_query, best_hits = max(all_results, key=lambda item: sum(hit.score for hit in item[1]) / len(item[1]))
-    logging.info(f"Best matching query: '{best_query}'")
+    if fusion == "rrf":
+        best_hits = _reciprocal_rank_fusion([hits for _, hits in all_results], k)
+        logging.info(f"Fused results from {len(all_results)} queries with RRF")
+    else:
+        # Return results from the query with highest average score
+        best_query, best_hits = max(all_results, key=lambda item: sum(hit.score for hit in item[1]) / len(item[1]))
+        logging.info(f"Best matching query: '{best_query}'")
 
     texts = []
     for hit in best_hits:
@@ -367,6 +517,8 @@ def get_collection_info():
                     "shard_number": info.config.params.shard_number,
                     "replication_factor": info.config.params.replication_factor,
                     "on_disk_payload": info.config.params.on_disk_payload,
+                    "on_disk_vectors": getattr(info.config.params.vectors, "on_disk", None),
+                    "quantization": type(info.config.quantization_config).__name__ if info.config.quantization_config else None,
                     "hnsw_config": {
                         "m": info.config.hnsw_config.m,
                         "ef_construct": info.config.hnsw_config.ef_construct,
@@ -496,35 +648,134 @@ def store_documents_with_custom_chunking(
     
     return store_document_chunks(chunks, metadata_list, source)
 
+def _document_filter(document_id: str) -> rest.Filter:
+    return rest.Filter(
+        must=[
+            rest.FieldCondition(
+                key="document_id",
+                match=rest.MatchValue(value=document_id)
+            )
+        ]
+    )
+
+# Redis hash of document_id -> JSON summary, maintained at ingest time so that
+# listing documents never has to scroll the collection
+DOCUMENT_CATALOG_KEY = "rag_document_catalog"
+# Set once the catalog has been built from the collection; until then documents
+# ingested before the catalog existed are missing from it, even if it has entries
+DOCUMENT_CATALOG_BUILT_KEY = "rag_document_catalog_built"
+
+def register_document(
+    document_id: str,
+    document_name: str,
+    upload_timestamp: str,
+    chunk_count: int,
+    organisation_id: str = None,
+    source: str = None,
+) -> bool:
+    """Add or replace a document in the catalog"""
+    entry = {
+        "document_id": document_id,
+        "document_name": document_name,
+        "upload_timestamp": upload_timestamp,
+        "chunk_count": chunk_count,
+        "organisation_id": organisation_id,
+        "source": source,
+    }
+    try:
+        redis_client.hset(DOCUMENT_CATALOG_KEY, document_id, json.dumps(entry))
+        return True
+    except Exception as e:
+        logging.error(f"Error registering document {document_id} in catalog: {e}")
+        return False
+
+def unregister_document(document_id: str) -> bool:
+    """Remove a document from the catalog"""
+    try:
+        redis_client.hdel(DOCUMENT_CATALOG_KEY, document_id)
+        return True
+    except Exception as e:
+        logging.error(f"Error removing document {document_id} from catalog: {e}")
+        return False
+
+def rebuild_document_catalog(page_size: int = 1000) -> int:
+    """
+    Rebuild the catalog from the collection, e.g. for data ingested before the
+    catalog existed. Pages through the collection with a projected payload, so
+    chunk content is never transferred. Returns the number of documents found.
+    """
+    client = _get_client()
+    documents = {}
+    known = set(redis_client.hkeys(DOCUMENT_CATALOG_KEY))
+    offset = None
+    while True:
+        records, offset = client.scroll(
+            collection_name=COLLECTION_NAME,
+            limit=page_size,
+            offset=offset,
+            with_payload=["document_id", "document_name", "upload_timestamp", "organisation_id", "source", "bloom_level"],
+            with_vectors=False,
+        )
+        for record in records:
+            payload = record.payload or {}
+            doc_id = payload.get("document_id")
+            if not doc_id:
+                continue
+            if doc_id not in documents:
+                documents[doc_id] = {
+                    "document_id": doc_id,
+                    "document_name": payload.get("document_name"),
+                    "upload_timestamp": payload.get("upload_timestamp"),
+                    "chunk_count": 0,
+                    "organisation_id": payload.get("organisation_id"),
+                    "source": payload.get("source"),
+                }
+            # Legacy per-level storage has one point per Bloom level; count each chunk once
+            if payload.get("bloom_level") in (None, BloomLevel.REMEMBER.value):
+                documents[doc_id]["chunk_count"] += 1
+        if offset is None:
+            break
+
+    # Documents registered while the collection was being scanned are kept as registered
+    for doc_id, entry in redis_client.hgetall(DOCUMENT_CATALOG_KEY).items():
+        if doc_id not in known:
+            documents[doc_id] = json.loads(entry)
+
+    pipe = redis_client.pipeline()
+    pipe.delete(DOCUMENT_CATALOG_KEY)
+    if documents:
+        pipe.hset(DOCUMENT_CATALOG_KEY, mapping={doc_id: json.dumps(doc) for doc_id, doc in documents.items()})
+    pipe.set(DOCUMENT_CATALOG_BUILT_KEY, datetime.utcnow().isoformat())
+    pipe.execute()
+    logging.info(f"Rebuilt document catalog with {len(documents)} documents")
+    return len(documents)
+
 def delete_document_by_id(document_id: str) -> dict:
     """Delete all chunks belonging to a specific document ID"""
     client = _get_client()
     try:
-        search_result = client.scroll(
+        document_filter = _document_filter(document_id)
+        chunks_deleted = client.count(
             collection_name=COLLECTION_NAME,
-            scroll_filter=rest.Filter(
-                must=[
-                    rest.FieldCondition(
-                        key="document_id",
-                        match=rest.MatchValue(value=document_id)
-                    )
-                ]
-            ),
-            limit=10000
-        )
-        point_ids = [point.id for point in search_result[0]]
-        if point_ids:
+            count_filter=document_filter,
+            exact=True,
+        ).count
+        if chunks_deleted:
+            # Server-side delete by filter: no point IDs are fetched, so there is no size limit
             client.delete(
                 collection_name=COLLECTION_NAME,
-                points_selector=rest.PointIdsList(points=point_ids)
+                points_selector=rest.FilterSelector(filter=document_filter),
+                wait=True,
             )
+            unregister_document(document_id)
             return {
                 "status": "success",
                 "document_id": document_id,
-                "chunks_deleted": len(point_ids),
-                "message": f"Deleted {len(point_ids)} chunks for document ID: {document_id}"
+                "chunks_deleted": chunks_deleted,
+                "message": f"Deleted {chunks_deleted} chunks for document ID: {document_id}"
             }
         else:
+            unregister_document(document_id)
             return {
                 "status": "not_found",
                 "document_id": document_id,
@@ -539,62 +790,113 @@ def delete_document_by_id(document_id: str) -> dict:
             "message": f"Error deleting document: {e}"
         }
 
-def get_document_chunks_by_id(document_id: str) -> list:
-    """Get all chunks for a specific document ID"""
-    client = _get_client()
-    try:
-        search_result = client.scroll(
+CHUNK_FIELDS = ["chunk_index", "content", "document_name", "section", "source", "page", "sheet"]
+# Set once this process has made sure the chunk_index index that order_by needs exists
+_chunk_index_ready = False
+
+def _scroll_chunks_unordered(client: QdrantClient, document_filter: rest.Filter, limit: int, cursor: Optional[int], with_payload) -> list:
+    """Chunks from `cursor` on, sorted here; used when Qdrant cannot order_by chunk_index"""
+    if cursor is not None:
+        document_filter.must.append(rest.FieldCondition(key="chunk_index", range=rest.Range(gte=cursor)))
+    records, offset = [], None
+    while True:
+        page, offset = client.scroll(
             collection_name=COLLECTION_NAME,
-            scroll_filter=rest.Filter(
-                must=[
-                    rest.FieldCondition(
-                        key="document_id",
-                        match=rest.MatchValue(value=document_id)
-                    )
-                ]
-            ),
-            limit=10000
+            scroll_filter=document_filter,
+            limit=1000,
+            offset=offset,
+            with_payload=with_payload,
+            with_vectors=False,
         )
-        chunks = []
-        for point in search_result[0]:
-            chunks.append({
-                "point_id": point.id,
-                "chunk_index": point.payload.get("chunk_index"),
-                "content": point.payload.get("content"),
-                "metadata": point.payload
-            })
-        chunks.sort(key=lambda x: x.get("chunk_index", 0))
-        return chunks
-    except Exception as e:
-        return []
+        records.extend(page)
+        if offset is None:
+            break
+    records.sort(key=lambda point: (point.payload or {}).get("chunk_index", 0))
+    return records[:limit]
 
-def list_all_documents() -> list:
-    """List all documents in the collection"""
+def get_document_chunks_page(
+    document_id: str,
+    limit: int = 256,
+    cursor: Optional[int] = None,
+    fields: Optional[List[str]] = None,
+) -> dict:
+    """
+    Get one page of a document's chunks ordered by chunk_index.
+
+    Pass the returned `next_cursor` back as `cursor` to fetch the following
+    page; it is None once the last page has been returned. Only the payload
+    `fields` are fetched (defaults to CHUNK_FIELDS); pass ["*"] for the full payload.
+    Raises if Qdrant cannot return the page.
+    """
+    global _chunk_index_ready
     client = _get_client()
+    if not _chunk_index_ready:
+        # order_by needs the chunk_index index, which only ensure_collection creates
+        ensure_payload_indexes(client)
+        _chunk_index_ready = True
+    document_filter = _document_filter(document_id)
+    # Legacy per-level storage repeats each chunk for every Bloom level; return one copy
+    document_filter.should = [
+        rest.IsEmptyCondition(is_empty=rest.PayloadField(key="bloom_level")),
+        rest.FieldCondition(key="bloom_level", match=rest.MatchValue(value=BloomLevel.REMEMBER.value)),
+    ]
+    fields = fields or CHUNK_FIELDS
+    with_payload = True if fields == ["*"] else fields
     try:
-        search_result = client.scroll(
+        records, _ = client.scroll(
             collection_name=COLLECTION_NAME,
-            limit=10000
+            scroll_filter=document_filter,
+            limit=limit,
+            order_by=rest.OrderBy(key="chunk_index", start_from=cursor),
+            with_payload=with_payload,
+            with_vectors=False,
         )
-        documents = {}
-        for point in search_result[0]:
-            doc_id = point.payload.get("document_id")
-            doc_name = point.payload.get("document_name")
-            upload_timestamp = point.payload.get("upload_timestamp")
-            if doc_id and doc_id not in documents:
-                documents[doc_id] = {
-                    "document_id": doc_id,
-                    "document_name": doc_name,
-                    "upload_timestamp": upload_timestamp,
-                    "chunk_count": 0
-                }
-            if doc_id:
-                documents[doc_id]["chunk_count"] += 1
-        return list(documents.values())
     except Exception as e:
+        logging.warning(f"Ordered chunk scroll failed for document {document_id}, sorting unordered scroll instead: {e}")
+        records = _scroll_chunks_unordered(client, document_filter, limit, cursor, with_payload)
+
+    chunks = []
+    for point in records:
+        payload = point.payload or {}
+        chunks.append({
+            "point_id": point.id,
+            "chunk_index": payload.get("chunk_index"),
+            "content": payload.get("content"),
+            "metadata": payload
+        })
+    next_cursor = chunks[-1]["chunk_index"] + 1 if len(chunks) == limit else None
+    return {"chunks": chunks, "next_cursor": next_cursor}
+
+def get_document_chunks_by_id(document_id: str, fields: Optional[List[str]] = None) -> list:
+    """Get all chunks for a specific document ID"""
+    chunks = []
+    cursor = None
+    while True:
+        page = get_document_chunks_page(document_id, cursor=cursor, fields=fields or ["*"])
+        chunks.extend(page["chunks"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return chunks
+
+def list_all_documents(organisation_id: Optional[str] = None) -> list:
+    """List all documents (optionally for one organisation) from the document catalog"""
+    try:
+        if not redis_client.exists(DOCUMENT_CATALOG_BUILT_KEY):
+            rebuild_document_catalog()
+        documents = [json.loads(entry) for entry in redis_client.hvals(DOCUMENT_CATALOG_KEY)]
+        if organisation_id:
+            documents = [
+                doc for doc in documents
+                if doc.get("organisation_id") == organisation_id
+                or (settings.RAG_MATCH_UNSTAMPED and not doc.get("organisation_id"))
+            ]
+        documents.sort(key=lambda doc: doc.get("upload_timestamp") or "")
+        return documents
+    except Exception as e:
+        logging.error(f"Error listing documents: {e}")
         return []
 
-def store_documents_with_id(text: str, source: str, document_name: str, document_id: str = None):
+def store_documents_with_id(text: str, source: str, document_name: str, document_id: str = None, organisation_id: str = None, chunker: str = None):
     """
     Store documents with a specific document ID for tracking and management.
     
@@ -603,6 +905,8 @@ def store_documents_with_id(text: str, source: str, document_name: str, document
         source: Source identifier
         document_name: Human-readable name for the document
         document_id: Unique identifier for the document (auto-generated if None)
+        organisation_id: Tenant stamped onto every stored point (optional)
+        chunker: Chunker name from rag.chunking.CHUNKERS (defaults to Settings.RAG_CHUNKER)
     
     Returns:
         dict: Result with status, document_id, document_name, total_chunks, and message
@@ -621,7 +925,7 @@ def store_documents_with_id(text: str, source: str, document_name: str, document
     ensure_collection(client)
 
     embedding = _get_embedding()
-    chunks = build_chunks(text, source)
+    chunks = build_chunks(text, source, chunker=chunker, embedding=embedding)
     points = []
     
     upload_timestamp = datetime.now().isoformat()
@@ -631,8 +935,8 @@ def store_documents_with_id(text: str, source: str, document_name: str, document
             # Create unique point ID
             pt_id = abs(hash(doc["content"] + source + document_id + str(i)))
             
-            # Generate embedding
-            vec = embedding.embed_documents([doc["content"]])[0]
+            # Generate embedding (semantic chunks already carry one)
+            vec = doc.get("embedding") or embedding.embed_documents([doc["content"]])[0]
             
             # Prepare payload with document metadata
             payload = doc["metadata"].copy()
@@ -642,6 +946,8 @@ def store_documents_with_id(text: str, source: str, document_name: str, document
             payload["upload_timestamp"] = upload_timestamp
             payload["chunk_index"] = i
             payload["total_chunks"] = len(chunks)
+            if organisation_id:
+                payload["organisation_id"] = organisation_id
             
             points.append(
                 PointStruct(id=pt_id, vector=vec, payload=payload)
@@ -669,6 +975,7 @@ def store_documents_with_id(text: str, source: str, document_name: str, document
             wait=True,
         )
         
+        register_document(document_id, document_name, upload_timestamp, len(points), organisation_id, source)
         elapsed_time = time.time() - start_time
         logging.info(f"Successfully stored document '{document_name}' with {len(points)} chunks in {elapsed_time:.2f} seconds.")
         
@@ -690,7 +997,7 @@ def store_documents_with_id(text: str, source: str, document_name: str, document
             "message": f"Error storing document: {str(e)}"
         }
 
-def store_document_bloom_parallel(text: str, source: str, document_name: str, document_id: str = None):
+def store_document_bloom_parallel(text: str, source: str, document_name: str, document_id: str = None, organisation_id: str = None, chunker: str = None):
     """
     Store the document for all Bloom taxonomy levels using parallel processing with batching.
     This prevents timeout issues by processing data in smaller batches.
@@ -704,18 +1011,19 @@ def store_document_bloom_parallel(text: str, source: str, document_name: str, do
     client = _get_client()
     ensure_collection(client)
     embedding = _get_embedding()
-    chunks = build_chunks(text, source)
+    chunks = build_chunks(text, source, chunker=chunker, embedding=embedding)
     upload_timestamp = datetime.now().isoformat()
     redis_key = f"document_{document_id}"
 
-    def process_bloom_level(level):
-        """Process a single Bloom level - this runs in parallel"""
-        level_points = []
+    embed_batch_size = 64  # chunks per embeddings request
+
+    def process_chunk_batch(start):
+        """Embed a batch of chunks once and build their Bloom points - this runs in parallel"""
+        batch_points = []
         try:
-            for i, doc in enumerate(chunks):
-                pt_id = abs(hash(doc["content"] + source + document_id + level.value + str(i)))
-                vec = embedding.embed_documents([doc["content"]])[0]
-                
+            batch = chunks[start:start + embed_batch_size]
+            vectors = _embed_chunks(embedding, batch)
+            for i, (doc, vec) in enumerate(zip(batch, vectors), start=start):
                 payload = doc["metadata"].copy()
                 payload["content"] = doc["content"]
                 payload["document_id"] = document_id
@@ -723,34 +1031,31 @@ def store_document_bloom_parallel(text: str, source: str, document_name: str, do
                 payload["upload_timestamp"] = upload_timestamp
                 payload["chunk_index"] = i
                 payload["total_chunks"] = len(chunks)
-                payload["bloom_level"] = level.value
+                if organisation_id:
+                    payload["organisation_id"] = organisation_id
                 
-                level_points.append(
-                    PointStruct(id=pt_id, vector=vec, payload=payload)
-                )
+                batch_points.extend(_build_bloom_points(vec, payload, doc["content"] + source + document_id + str(i)))
             
-            logging.info(f"Processed {len(level_points)} chunks for Bloom level: {level.value}")
-            return level_points
+            logging.info(f"Processed chunks {start}-{start + len(batch) - 1} ({len(batch_points)} points)")
+            return batch_points
             
         except Exception as e:
-            logging.error(f"Error processing Bloom level {level.value}: {str(e)}")
+            logging.error(f"Error processing chunk batch starting at {start}: {str(e)}")
             return []
 
-    # Process all Bloom levels in parallel
-    logging.info(f"Starting parallel processing for {len(BloomLevel)} Bloom levels")
+    # Embed chunk batches in parallel; each chunk is embedded once for all Bloom levels
+    logging.info(f"Starting parallel processing for {len(chunks)} chunks ({BLOOM_STORAGE_MODE} Bloom storage)")
     start_time = time.time()
     
     with ThreadPoolExecutor(max_workers=6) as executor:
-        future_to_level = {executor.submit(process_bloom_level, level): level for level in BloomLevel}
+        future_to_start = {executor.submit(process_chunk_batch, start): start for start in range(0, len(chunks), embed_batch_size)}
         
         all_points = []
-        for future in future_to_level:
+        for future in future_to_start:
             try:
-                level_points = future.result()
-                all_points.extend(level_points)
+                all_points.extend(future.result())
             except Exception as e:
-                level = future_to_level[future]
-                logging.error(f"Failed to process Bloom level {level.value}: {str(e)}")
+                logging.error(f"Failed to process chunk batch starting at {future_to_start[future]}: {str(e)}")
 
     processing_time = time.time() - start_time
     logging.info(f"Parallel processing completed in {processing_time:.2f} seconds")
@@ -801,6 +1106,8 @@ def store_document_bloom_parallel(text: str, source: str, document_name: str, do
         
         storage_time = time.time() - storage_start_time
         total_time = time.time() - start_time
+        if successful_batches:
+            register_document(document_id, document_name, upload_timestamp, len(chunks), organisation_id, source)
         
         if successful_batches == total_batches:
             logging.info(f"Successfully stored all {total_batches} batches")
@@ -1,57 +1,191 @@
+import asyncio
 import logging
+import time
+import weakref
+from typing import List, Optional, Tuple, Union
 from dotenv import load_dotenv
 import os
-from qdrant_client import QdrantClient
-from rag.qdrant import _get_embedding
-from dotenv import load_dotenv
-from openai import OpenAI
+from qdrant_client import AsyncQdrantClient
+from openai import AsyncOpenAI
+from core.config import get_settings
+from core.background_loop import run_sync
+from rag.qdrant import build_search_filter
+from rag.collection_profiles import build_search_params
 load_dotenv()
 
-client_openai = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+settings = get_settings()
+
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+QDRANT_HOST = settings.QDRANT_HOST
+QDRANT_PORT = settings.QDRANT_PORT
+COLLECTION_NAME = settings.QDRANT_COLLECTION_NAME
+EMBEDDING_MODEL = settings.OPENAI_EMBEDDING_MODEL
+EMBED_TIMEOUT = settings.RAG_EMBED_TIMEOUT
+SEARCH_TIMEOUT = settings.RAG_SEARCH_TIMEOUT
+
+# Async clients are bound to the event loop they were created on, so keep one
+# pair per loop (the app loop and the background loop used by sync callers).
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Tuple[AsyncQdrantClient, AsyncOpenAI]]" = (
+    weakref.WeakKeyDictionary()
+)
+
 
-QDRANT_HOST = os.getenv("QDRANT_HOST", "localhost")
-try:
-    qdrant_client = QdrantClient(
-        url=f"http://{QDRANT_HOST}:6333"
+def _get_async_clients() -> Tuple[AsyncQdrantClient, AsyncOpenAI]:
+    """Get the async Qdrant and OpenAI clients for the running event loop"""
+    loop = asyncio.get_running_loop()
+    clients = _async_clients.get(loop)
+    if clients is None:
+        logging.info(f"Initializing async RAG clients - Qdrant: {QDRANT_HOST}:{QDRANT_PORT}")
+        clients = (
+            AsyncQdrantClient(
+                host=QDRANT_HOST,
+                port=QDRANT_PORT,
+                timeout=int(SEARCH_TIMEOUT) + 1,
+                check_compatibility=False,
+            ),
+            AsyncOpenAI(api_key=OPENAI_API_KEY),
+        )
+        _async_clients[loop] = clients
+    return clients
+
+
+async def aembed_queries(queries: List[str]) -> List[List[float]]:
+    """Embed all queries with a single OpenAI request."""
+    _, openai_client = _get_async_clients()
+    response = await asyncio.wait_for(
+        openai_client.embeddings.create(model=EMBEDDING_MODEL, input=queries),
+        timeout=EMBED_TIMEOUT,
     )
-    COLLECTION_NAME = "salesagent_collection"
-    qdrant_client.get_collection(collection_name=COLLECTION_NAME)
-    print("Successfully connected to Qdrant collection:", COLLECTION_NAME)
-except Exception as e:
-    print(f"Error connecting to Qdrant: {e}")
-    qdrant_client = None
-embedding = _get_embedding()
+    return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
 
 
-def rag_search_impl(query: str, top_k: int = 3, score_threshold: float = 0.5) -> dict:
+async def _asearch(query_vector: List[float], top_k: int, score_threshold: float, query_filter=None, search_params=None):
+    qdrant, _ = _get_async_clients()
+    response = await asyncio.wait_for(
+        qdrant.query_points(
+            collection_name=COLLECTION_NAME,
+            query=query_vector,
+            query_filter=query_filter,
+            search_params=search_params,
+            limit=top_k,
+            score_threshold=score_threshold,
+            with_payload=True,
+        ),
+        timeout=SEARCH_TIMEOUT,
+    )
+    return response.points
+
+
+def _build_context(points) -> dict:
+    chunks = []
+    for p in points:
+        payload = p.payload or {}
+        text = (payload.get("content") or "").strip()
+        if text:
+            chunks.append(text)
+    return {"context": "\n---\n".join(chunks)}
+
+
+async def rag_search_async(
+    query: str,
+    top_k: int = 3,
+    score_threshold: float = 0.5,
+    organisation_id: Optional[str] = None,
+    bloom_level: Optional[Union[str, List[str]]] = None,
+    hnsw_ef: Optional[int] = None,
+    oversampling: Optional[float] = None,
+) -> dict:
     """
-    Very simple RAG:
+    Async RAG search:
       1) Embeds the (English) query with OpenAI.
-      2) Searches Qdrant.
-      3) Returns JSON { hits: [...], context: "..." }
+      2) Searches Qdrant, scoped to the tenant / Bloom level(s) when given;
+         `hnsw_ef` / `oversampling` override the configured search params.
+      3) Returns JSON { context: "..." }
+    Each stage has its own timeout; on timeout or error an empty context is returned.
     """
     if not query or not isinstance(query, str):
-        return { "context": "" }
-    query_vector = embedding.embed_query(query)
-
-    # 2) Search
-    results = qdrant_client.search(
-        collection_name=COLLECTION_NAME,
-        query_vector=query_vector,
-        limit=top_k,
-        score_threshold=score_threshold,
-    )
-    logging.info(f"Qdrant search results: {len(results)} found")
+        return {"context": ""}
+    query_filter = build_search_filter(organisation_id, bloom_level)
+    search_params = build_search_params(hnsw_ef, oversampling)
 
-    # 3) Collect
-    hits, chunks = [], []
-    for p in results:
-        payload = p.payload or {}
-        text = (payload.get("content") or "").strip()
-        print(text)
-        if not text:
+    start_time = time.time()
+    try:
+        [query_vector] = await aembed_queries([query])
+        results = await _asearch(query_vector, top_k, score_threshold, query_filter, search_params)
+    except asyncio.TimeoutError:
+        logging.warning(f"RAG search timed out for query: '{query}'")
+        return {"context": ""}
+    except Exception as e:
+        logging.error(f"RAG search failed for query '{query}': {e}")
+        return {"context": ""}
+
+    logging.info(f"Qdrant search results: {len(results)} found in {time.time() - start_time:.2f} seconds")
+    return _build_context(results)
+
+
+async def rag_search_many_async(
+    queries: List[str],
+    top_k: int = 3,
+    score_threshold: float = 0.5,
+    organisation_id: Optional[str] = None,
+    bloom_level: Optional[Union[str, List[str]]] = None,
+    hnsw_ef: Optional[int] = None,
+    oversampling: Optional[float] = None,
+) -> List[dict]:
+    """
+    Run several RAG searches concurrently. All queries are embedded in one
+    request and the Qdrant searches are fanned out in parallel. Results are
+    returned in the same order as `queries`.
+    """
+    results = [{"context": ""} for _ in queries]
+    valid = [(i, q) for i, q in enumerate(queries) if q and isinstance(q, str)]
+    if not valid:
+        return results
+    query_filter = build_search_filter(organisation_id, bloom_level)
+    search_params = build_search_params(hnsw_ef, oversampling)
+
+    try:
+        vectors = await aembed_queries([q for _, q in valid])
+    except asyncio.TimeoutError:
+        logging.warning(f"RAG embedding timed out for {len(valid)} queries")
+        return results
+    except Exception as e:
+        logging.error(f"RAG embedding failed for {len(valid)} queries: {e}")
+        return results
+
+    searches = await asyncio.gather(
+        *(_asearch(vector, top_k, score_threshold, query_filter, search_params) for vector in vectors),
+        return_exceptions=True,
+    )
+    for (i, query), points in zip(valid, searches):
+        if isinstance(points, BaseException):
+            logging.warning(f"RAG search error for query '{query}': {points!r}")
             continue
-        hits.append({"id": str(p.id), "score": float(p.score), "text": text})
-        chunks.append(text)
+        results[i] = _build_context(points)
+    return results
 
-    return {"context": "\n---\n".join(chunks)}
+
+def rag_search_impl(
+    query: str,
+    top_k: int = 3,
+    score_threshold: float = 0.5,
+    organisation_id: Optional[str] = None,
+    bloom_level: Optional[Union[str, List[str]]] = None,
+    hnsw_ef: Optional[int] = None,
+    oversampling: Optional[float] = None,
+) -> dict:
+    """
+    Sync adapter around `rag_search_async` for callers running outside the
+    event loop (e.g. threadpool-iterated generators).
+    """
+    return run_sync(
+        rag_search_async(
+            query,
+            top_k=top_k,
+            score_threshold=score_threshold,
+            organisation_id=organisation_id,
+            bloom_level=bloom_level,
+            hnsw_ef=hnsw_ef,
+            oversampling=oversampling,
+        )
+    )
@@ -1,3 +1,4 @@
+import io
 import logging
 import os
 import uuid
@@ -6,14 +7,18 @@ from urllib.parse import urlparse
 from bson import ObjectId
 from fastapi import File, Form, HTTPException, Query, UploadFile
 from pydantic import BaseModel
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime
 from fastapi import APIRouter
 import boto3
 from dotenv import load_dotenv
-from services.org_service import estimate_text_chars, extract_text_from_file
-from services.prompt_builder import build_universal_sales_system_message
+from services.org_service import estimate_text_chars, extract_text_from_file, parse_document
+from services.prompt_builder import build_universal_sales_system_message, get_cached_stages, render_system_prompt
+from services.content_cache import content_sha256, get_cached, set_cached, text_cache_name
 from services.plivo_number import get_available_countries, get_rented_numbers
+from services.config_jobs import create_job, get_job, submit_job, update_job
+from services.prompt_assembler import assemble_prompt
+from core.admission import upload_admission, estimate_cost_mb, upload_size
 load_dotenv()
 from call.plivo import orgcalls_collection,calls_collection
 router = APIRouter()
@@ -44,105 +49,59 @@ class AllyroidConfig(BaseModel):
     uploaded_resources: List[FileResource] = []
 
 MAX_TOTAL_CHARS = 40000 # Limit to 40k characters (~10k tokens)
-@router.post("/api/allyroid/config")
-async def upsert_config(
-    user_id: str = Form(...),
-    user_name: str = Form(None),
-    organisation_id: str = Form(...),
-    organisation_name: str = Form(None),
-    welcome_message: str = Form(None),
-    country_code: str = Form(None),
-    phone_number: str = Form(None),
-    file: UploadFile = File(None),
-):
-    """
-    Create or update configuration for an organisation and user.
-    - If config exists: Updates it (optionally with new file)
-    - If config doesn't exist: Creates new config
-    
-    Extract text from uploaded file, build system prompt,
-    upload file to S3, and save/update all config data in MongoDB.
-    """
 
-    # Check for existing configuration
+
+def _prompt_tokens(uploaded_resources: list) -> int:
+    """Tokens of the instructions a call gets from these resources (see call.plivo.outbound_call)"""
+    return assemble_prompt([resource.get("file_data") for resource in uploaded_resources])[1]
+
+
+def _extract_text_cached(content_bytes: bytes, filename: str, content_hash: str) -> str:
+    """Extracted text of an upload; identical files are only extracted (and OCR'd) once"""
+    extracted_text = get_cached(content_hash, text_cache_name())
+    if extracted_text is not None:
+        print(f"♻️ Reusing extracted text of {filename} ({content_hash[:12]})")
+        return extracted_text
+    extracted_text = extract_text_from_file(content_bytes, filename, content_hash)
+    # Extraction failures return "", and pages whose OCR failed are retried next time
+    if extracted_text and parse_document(content_bytes, filename, content_hash).ocr_complete:
+        set_cached(content_hash, text_cache_name(), extracted_text)
+    return extracted_text
+
+
+def _upload_to_s3(organisation_id: str, content_bytes: bytes, filename: str, content_type: Optional[str]) -> Tuple[str, str]:
+    """Store an upload in S3; returns (s3_key, file_url)"""
+    file_ext = os.path.splitext(filename)[1]
+    s3_key = f"allyroid_uploads/{organisation_id}/{uuid.uuid4()}{file_ext}"
+    s3_client.upload_fileobj(
+        Fileobj=io.BytesIO(content_bytes),
+        Bucket=S3_BUCKET_NAME,
+        Key=s3_key,
+        ExtraArgs={"ContentType": content_type} if content_type else None
+    )
+    return s3_key, f"https://{S3_BUCKET_NAME}.s3.{AWS_REGION}.amazonaws.com/{s3_key}"
+
+
+def _save_upserted_config(fields: dict, new_resource: Optional[dict]) -> dict:
+    """Create or update the config document; returns the upsert response"""
+    organisation_id, user_id = fields["organisation_id"], fields["user_id"]
+    # Re-read: a job may finish long after the request that queued it
     existing = orgcalls_collection.find_one({
         "organisation_id": organisation_id,
         "user_id": user_id
     })
-    
     is_update = existing is not None
     uploaded_resources = existing.get("uploaded_resources", []) if is_update else []
 
-    # ---- Process the uploaded file (if provided) ----
-    if file:
-        content_bytes = await file.read()
-        estimated_len = estimate_text_chars(content_bytes, file.filename)
-        if estimated_len > MAX_TOTAL_CHARS:
-            raise HTTPException(
-                status_code=400,
-                detail=f"File text exceeds {MAX_TOTAL_CHARS} characters (estimated)."
-            )
-
-        extracted_text = extract_text_from_file(content_bytes, file.filename)
-
-        # Enforce character limit
-        if len(extracted_text) > MAX_TOTAL_CHARS:
-            raise HTTPException(
-                status_code=400,
-                detail=f"File text exceeds {MAX_TOTAL_CHARS} characters."
-            )
-
-        # ✅ Convert extracted text into a system prompt
-        try:
-            system_prompt = build_universal_sales_system_message(extracted_text, welcome_message=welcome_message)
-        except Exception as e:
-            logging.error(f"Error creating system message: {e}")
-            raise HTTPException(
-                status_code=500,
-                detail=f"Error generating system message: {e}"
-            )
-
-        # Reset stream before upload
-        await file.seek(0)
-
-        # Upload to S3
-        file_ext = os.path.splitext(file.filename)[1]
-        s3_key = f"allyroid_uploads/{organisation_id}/{uuid.uuid4()}{file_ext}"
-
-        try:
-            s3_client.upload_fileobj(
-                Fileobj=file.file,
-                Bucket=S3_BUCKET_NAME,
-                Key=s3_key,
-                ExtraArgs={"ContentType": file.content_type}
-            )
-        except Exception as e:
-            logging.error(f"S3 upload failed: {e}")
-            raise HTTPException(status_code=500, detail=f"File upload failed: {e}")
-
-        file_url = f"https://{S3_BUCKET_NAME}.s3.{AWS_REGION}.amazonaws.com/{s3_key}"
-
-        # Add new resource to the list
-        new_resource = {
-            "file_name": file.filename,
-            "file_url": file_url,
-            "file_data": system_prompt,  # ✅ Save system prompt here
-            "uploaded_at": datetime.utcnow()
-        }
-        
-        # For updates: append new file, for creates: start fresh list
+    # For updates: append new file, for creates: start fresh list
+    if new_resource:
         uploaded_resources.append(new_resource)
 
     # ---- Prepare data for MongoDB ----
     data = {
-        "user_id": user_id,
-        "user_name": user_name,
-        "organisation_id": organisation_id,
-        "organisation_name": organisation_name,
-        "welcome_message": welcome_message,
-        "country_code": country_code,
-        "phone_number": phone_number,
+        **fields,
         "uploaded_resources": uploaded_resources,
+        "prompt_tokens": _prompt_tokens(uploaded_resources),
         "updated_at": datetime.utcnow()
     }
 
@@ -159,7 +118,8 @@ async def upsert_config(
                 "message": "Configuration updated successfully",
                 "id": str(existing["_id"]),
                 "action": "updated",
-                "file_uploaded": file is not None
+                "file_uploaded": new_resource is not None,
+                "prompt_tokens": data["prompt_tokens"]
             }
         else:
             raise HTTPException(status_code=500, detail="Update failed")
@@ -172,10 +132,132 @@ async def upsert_config(
             "message": "Configuration created successfully",
             "id": str(result.inserted_id),
             "action": "created",
-            "file_uploaded": file is not None,
-            "file prompt": system_prompt if file else None
+            "file_uploaded": new_resource is not None,
+            "file prompt": new_resource["file_data"] if new_resource else None,
+            "prompt_tokens": data["prompt_tokens"]
         }
 
+
+def _run_upsert_job(job_id: str, fields: dict, content_bytes: bytes, filename: str, content_type: Optional[str]) -> dict:
+    """Worker-pool side of upsert_config: extract, build the prompt, store the file, save"""
+    welcome_message = fields.get("welcome_message")
+    content_hash = content_sha256(content_bytes)
+
+    update_job(job_id, stage="extracting")
+    # Parsed once: the extraction below reuses this parse
+    estimated_len = estimate_text_chars(content_bytes, filename, content_hash)
+    if estimated_len > MAX_TOTAL_CHARS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"File text exceeds {MAX_TOTAL_CHARS} characters (estimated)."
+        )
+
+    extracted_text = _extract_text_cached(content_bytes, filename, content_hash)
+
+    # Enforce character limit
+    if len(extracted_text) > MAX_TOTAL_CHARS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"File text exceeds {MAX_TOTAL_CHARS} characters."
+        )
+
+    # ✅ Convert extracted text into a system prompt
+    update_job(job_id, stage="generating_prompt")
+    try:
+        system_prompt = build_universal_sales_system_message(
+            extracted_text,
+            welcome_message=welcome_message,
+            content_hash=content_hash
+        )
+    except Exception as e:
+        logging.error(f"Error creating system message: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error generating system message: {e}"
+        )
+
+    # Upload to S3
+    update_job(job_id, stage="uploading")
+    try:
+        s3_key, file_url = _upload_to_s3(fields["organisation_id"], content_bytes, filename, content_type)
+    except Exception as e:
+        logging.error(f"S3 upload failed: {e}")
+        raise HTTPException(status_code=500, detail=f"File upload failed: {e}")
+
+    # Add new resource to the list
+    new_resource = {
+        "file_name": filename,
+        "file_url": file_url,
+        "file_data": system_prompt,  # ✅ Save system prompt here
+        "content_sha256": content_hash,
+        "s3_key": s3_key,
+        "uploaded_at": datetime.utcnow()
+    }
+
+    update_job(job_id, stage="saving")
+    return _save_upserted_config(fields, new_resource)
+
+
+@router.post("/api/allyroid/config")
+async def upsert_config(
+    user_id: str = Form(...),
+    user_name: str = Form(None),
+    organisation_id: str = Form(...),
+    organisation_name: str = Form(None),
+    welcome_message: str = Form(None),
+    country_code: str = Form(None),
+    phone_number: str = Form(None),
+    file: UploadFile = File(None),
+):
+    """
+    Create or update configuration for an organisation and user.
+    - If config exists: Updates it (optionally with new file)
+    - If config doesn't exist: Creates new config
+    
+    With a file, extraction, system prompt generation, the S3 upload and the
+    MongoDB write run as a background job: the response carries a `job_id`
+    to poll at /api/allyroid/config_job_status/{job_id}. Without a file the
+    config is saved immediately.
+    """
+    fields = {
+        "user_id": user_id,
+        "user_name": user_name,
+        "organisation_id": organisation_id,
+        "organisation_name": organisation_name,
+        "welcome_message": welcome_message,
+        "country_code": country_code,
+        "phone_number": phone_number,
+    }
+
+    if not file:
+        return _save_upserted_config(fields, None)
+
+    # ---- Process the uploaded file in the background ----
+    # The extraction slot is held until the job finishes; a full queue is a 429 now
+    ticket = await upload_admission.acquire(estimate_cost_mb(upload_size(file), file.filename))
+    try:
+        content_bytes = await file.read()
+        job = create_job(
+            "upsert",
+            organisation_id=organisation_id,
+            user_id=user_id,
+            file_name=file.filename
+        )
+        submit_job(
+            job["job_id"], _run_upsert_job, fields, content_bytes, file.filename, file.content_type,
+            ticket=ticket
+        )
+    except Exception:
+        ticket.release()
+        raise
+
+    return {
+        "message": "File received. Configuration will be saved once processing completes.",
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "file_uploaded": True
+    }
+
 @router.get("/api/allyroid/config/{user_id}/{organisation_id}")
 async def get_config(user_id: str,organisation_id: str):
     """
@@ -207,12 +289,15 @@ async def delete_config(user_id: str, organisation_id: str):
         raise HTTPException(status_code=404, detail="Configuration not found for this organisation.")
 
     # --- (Optional) Delete S3 files ---
-    for res in config.get("uploaded_resources", []):
-        try:
-            s3_key = "/".join(res["file_url"].split(".com/")[1:])
-            s3_client.delete_object(Bucket=S3_BUCKET_NAME, Key=s3_key)
-        except Exception:
-            pass  # ignore file deletion errors for safety
+    def _delete_files():
+        for res in config.get("uploaded_resources", []):
+            try:
+                s3_key = "/".join(res["file_url"].split(".com/")[1:])
+                s3_client.delete_object(Bucket=S3_BUCKET_NAME, Key=s3_key)
+            except Exception:
+                pass  # ignore file deletion errors for safety
+
+    await run_in_threadpool(_delete_files)
 
     orgcalls_collection.delete_one({"organisation_id": organisation_id})
     return {"message": f"Configuration for organisation_id '{organisation_id}' deleted successfully."}
@@ -240,113 +325,162 @@ def _s3_key_from_file_url(file_url: str) -> str:
         raise ValueError(f"Could not parse S3 key from file_url: {file_url}")
     return key
 
-async def _download_s3_bytes(bucket: str, key: str) -> bytes:
-    """
-    Download object bytes from S3 without blocking the event loop too long.
-    """
-    def _get():
-        obj = s3_client.get_object(Bucket=bucket, Key=key)
-        return obj["Body"].read()
+def _download_s3_bytes(bucket: str, key: str) -> bytes:
+    obj = s3_client.get_object(Bucket=bucket, Key=key)
+    return obj["Body"].read()
 
-    return await run_in_threadpool(_get)
 
-@router.post("/api/allyroid/config/{organisation_id}")
-async def update_config(
+def _regenerate_from_stored_file(last_resource: dict, welcome_message: Optional[str]) -> dict:
+    """Rebuild the system prompt of the last stored file for a new welcome message"""
+    file_url = last_resource.get("file_url")
+    file_name = last_resource.get("file_name")
+
+    if not file_url or not file_name:
+        raise HTTPException(
+            status_code=500,
+            detail="Stored uploaded resource missing file_url/file_name; cannot fetch from S3."
+        )
+
+    try:
+        content_hash = last_resource.get("content_sha256")
+        extracted_text = get_cached(content_hash, text_cache_name()) if content_hash else None
+
+        if extracted_text is None:
+            # Prefer stored s3_key if present
+            s3_key = last_resource.get("s3_key") or _s3_key_from_file_url(file_url)
+
+            content_bytes = _download_s3_bytes(S3_BUCKET_NAME, s3_key)
+            if not content_bytes:
+                raise HTTPException(
+                    status_code=500,
+                    detail=f"Downloaded empty object from S3 for key={s3_key}"
+                )
+
+            content_hash = content_sha256(content_bytes)
+            extracted_text = _extract_text_cached(content_bytes, file_name, content_hash)
+        extracted_chars = len(extracted_text)
+
+        if extracted_chars > MAX_TOTAL_CHARS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"{file_name}: exceeds {MAX_TOTAL_CHARS} characters ({extracted_chars} extracted)."
+            )
+
+        system_prompt = build_universal_sales_system_message(
+            extracted_text,
+            welcome_message=welcome_message,
+            content_hash=content_hash
+        )
+
+        # Update the same “task output” as before (file_data etc.)
+        last_resource["file_data"] = system_prompt
+        last_resource["extracted_chars"] = extracted_chars
+        last_resource["content_sha256"] = content_hash
+        last_resource["regenerated_at"] = datetime.utcnow()
+        return last_resource
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Failed to regenerate system prompt from S3 for {file_name}: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to regenerate system prompt from stored file: {str(e)}"
+        )
+
+
+def _save_updated_config(organisation_id: str, user_id: str, update_fields: dict) -> dict:
+    if "uploaded_resources" in update_fields:
+        update_fields["prompt_tokens"] = _prompt_tokens(update_fields["uploaded_resources"])
+    # Always bump updated_at
+    update_fields["updated_at"] = datetime.utcnow()
+
+    orgcalls_collection.update_one(
+        {"organisation_id": organisation_id, "user_id": user_id},
+        {"$set": update_fields}
+    )
+
+    updated_doc = orgcalls_collection.find_one({
+        "organisation_id": organisation_id,
+        "user_id": user_id
+    })
+    updated_doc = convert_objectid(updated_doc)
+
+    return {"message": "Configuration updated successfully", "data": updated_doc}
+
+
+def _run_update_job(
+    job_id: str,
     organisation_id: str,
     user_id: str,
-    user_name: Optional[str] = Form(None),
-    welcome_message: Optional[str] = Form(None),
-    country_code: Optional[str] = Form(None),
-    phone_number: Optional[str] = Form(None),
-    file: Optional[UploadFile] = File(None),
-):
+    update_fields: dict,
+    welcome_message: Optional[str],
+    cached_stages: Optional[dict],
+    content_bytes: Optional[bytes],
+    filename: Optional[str],
+    content_type: Optional[str],
+) -> dict:
+    """Worker-pool side of update_config: a new file, or a prompt regeneration for a new welcome message"""
+    # Re-read: resources may have changed since the request was queued
     existing = orgcalls_collection.find_one({
         "organisation_id": organisation_id,
         "user_id": user_id
     })
     if not existing:
         raise HTTPException(status_code=404, detail="Configuration not found for this organisation.")
-
-    update_fields = {}
-
-    if user_name is not None:
-        update_fields["user_name"] = user_name
-    if welcome_message is not None:
-        update_fields["welcome_message"] = welcome_message
-    if country_code is not None:
-        update_fields["country_code"] = country_code
-    if phone_number is not None:
-        update_fields["phone_number"] = phone_number
-
     uploaded_resources = existing.get("uploaded_resources", [])
 
-    # Detect welcome message change (only if caller sent welcome_message)
-    welcome_changed = (
-        welcome_message is not None
-        and welcome_message != existing.get("welcome_message")
-    )
-
     # CASE 1: New file uploaded (your existing behavior)
-    if file:
-        content_bytes = await file.read()
-        if not content_bytes:
-            raise HTTPException(status_code=400, detail=f"Empty file uploaded: {file.filename}")
+    if content_bytes is not None:
+        content_hash = content_sha256(content_bytes)
 
-        extracted_text = extract_text_from_file(content_bytes, file.filename)
+        update_job(job_id, stage="extracting")
+        extracted_text = _extract_text_cached(content_bytes, filename, content_hash)
         extracted_chars = len(extracted_text)
 
         if extracted_chars > MAX_TOTAL_CHARS:
             raise HTTPException(
                 status_code=400,
-                detail=f"{file.filename}: exceeds {MAX_TOTAL_CHARS} characters ({extracted_chars} extracted)."
+                detail=f"{filename}: exceeds {MAX_TOTAL_CHARS} characters ({extracted_chars} extracted)."
             )
 
+        update_job(job_id, stage="generating_prompt")
         try:
             system_prompt = build_universal_sales_system_message(
                 extracted_text,
-                welcome_message=welcome_message
+                welcome_message=welcome_message,
+                content_hash=content_hash
             )
         except Exception as e:
-            logging.error(f"Error creating system message for {file.filename}: {e}")
+            logging.error(f"Error creating system message for {filename}: {e}")
             raise HTTPException(
                 status_code=500,
-                detail=f"Error generating system message for {file.filename}: {e}"
+                detail=f"Error generating system message for {filename}: {e}"
             )
 
-        await file.seek(0)
-
-        file_ext = os.path.splitext(file.filename)[1]
-        s3_key = f"allyroid_uploads/{organisation_id}/{uuid.uuid4()}{file_ext}"
-
+        update_job(job_id, stage="uploading")
         try:
-            s3_client.upload_fileobj(
-                Fileobj=file.file,
-                Bucket=S3_BUCKET_NAME,
-                Key=s3_key,
-                ExtraArgs={"ContentType": file.content_type}
-            )
-            file_url = f"https://{S3_BUCKET_NAME}.s3.{AWS_REGION}.amazonaws.com/{s3_key}"
-
-            uploaded_resources.append({
-                "file_name": file.filename,
-                "file_url": file_url,
-                "file_data": system_prompt,
-                "uploaded_at": datetime.utcnow(),
-                "extracted_chars": extracted_chars,
-                # Optional (recommended): store key explicitly for future use
-                "s3_key": s3_key,
-            })
+            s3_key, file_url = _upload_to_s3(organisation_id, content_bytes, filename, content_type)
         except Exception as e:
-            logging.error(f"S3 upload failed for {file.filename}: {e}")
+            logging.error(f"S3 upload failed for {filename}: {e}")
             raise HTTPException(
                 status_code=500,
-                detail=f"Failed to upload {file.filename}: {str(e)}"
+                detail=f"Failed to upload {filename}: {str(e)}"
             )
 
-        update_fields["uploaded_resources"] = uploaded_resources
+        uploaded_resources.append({
+            "file_name": filename,
+            "file_url": file_url,
+            "file_data": system_prompt,
+            "uploaded_at": datetime.utcnow(),
+            "extracted_chars": extracted_chars,
+            "content_sha256": content_hash,
+            # Optional (recommended): store key explicitly for future use
+            "s3_key": s3_key,
+        })
 
     # CASE 2: No new file, but welcome message changed
-    elif welcome_changed:
+    else:
         if not uploaded_resources:
             raise HTTPException(
                 status_code=400,
@@ -356,72 +490,130 @@ async def update_config(
         # Use the most recent uploaded file (you can switch to regenerating all if desired)
         last_resource = uploaded_resources[-1]
 
-        file_url = last_resource.get("file_url")
-        file_name = last_resource.get("file_name")
+        update_job(job_id, stage="generating_prompt")
+        if cached_stages is not None:
+            # Stages already computed for this document: re-render only, no S3 download or LLM calls
+            last_resource["file_data"] = render_system_prompt(cached_stages, welcome_message=welcome_message)
+            last_resource["regenerated_at"] = datetime.utcnow()
+        else:
+            last_resource = _regenerate_from_stored_file(last_resource, welcome_message)
 
-        if not file_url or not file_name:
-            raise HTTPException(
-                status_code=500,
-                detail="Stored uploaded resource missing file_url/file_name; cannot fetch from S3."
-            )
+        uploaded_resources[-1] = last_resource
 
-        try:
-            # Prefer stored s3_key if present
-            s3_key = last_resource.get("s3_key") or _s3_key_from_file_url(file_url)
+    update_fields["uploaded_resources"] = uploaded_resources
+    update_job(job_id, stage="saving")
+    return _save_updated_config(organisation_id, user_id, update_fields)
 
-            content_bytes = await _download_s3_bytes(S3_BUCKET_NAME, s3_key)
-            if not content_bytes:
-                raise HTTPException(
-                    status_code=500,
-                    detail=f"Downloaded empty object from S3 for key={s3_key}"
-                )
 
-            extracted_text = extract_text_from_file(content_bytes, file_name)
-            extracted_chars = len(extracted_text)
+@router.post("/api/allyroid/config/{organisation_id}")
+async def update_config(
+    organisation_id: str,
+    user_id: str,
+    user_name: Optional[str] = Form(None),
+    welcome_message: Optional[str] = Form(None),
+    country_code: Optional[str] = Form(None),
+    phone_number: Optional[str] = Form(None),
+    file: Optional[UploadFile] = File(None),
+):
+    """
+    Update a configuration. A new file or a changed welcome message rebuilds
+    the system prompt in a background job (poll the returned `job_id` at
+    /api/allyroid/config_job_status/{job_id}); other fields are saved at once.
+    """
+    existing = orgcalls_collection.find_one({
+        "organisation_id": organisation_id,
+        "user_id": user_id
+    })
+    if not existing:
+        raise HTTPException(status_code=404, detail="Configuration not found for this organisation.")
 
-            if extracted_chars > MAX_TOTAL_CHARS:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"{file_name}: exceeds {MAX_TOTAL_CHARS} characters ({extracted_chars} extracted)."
-                )
+    update_fields = {}
 
-            system_prompt = build_universal_sales_system_message(
-                extracted_text,
-                welcome_message=welcome_message
-            )
+    if user_name is not None:
+        update_fields["user_name"] = user_name
+    if welcome_message is not None:
+        update_fields["welcome_message"] = welcome_message
+    if country_code is not None:
+        update_fields["country_code"] = country_code
+    if phone_number is not None:
+        update_fields["phone_number"] = phone_number
 
-            # Update the same “task output” as before (file_data etc.)
-            last_resource["file_data"] = system_prompt
-            last_resource["extracted_chars"] = extracted_chars
-            last_resource["regenerated_at"] = datetime.utcnow()
+    uploaded_resources = existing.get("uploaded_resources", [])
+
+    # Detect welcome message change (only if caller sent welcome_message)
+    welcome_changed = (
+        welcome_message is not None
+        and welcome_message != existing.get("welcome_message")
+    )
 
-            uploaded_resources[-1] = last_resource
-            update_fields["uploaded_resources"] = uploaded_resources
+    if not file and not welcome_changed:
+        return _save_updated_config(organisation_id, user_id, update_fields)
 
-        except HTTPException:
-            raise
-        except Exception as e:
-            logging.error(f"Failed to regenerate system prompt from S3 for {file_name}: {e}")
-            raise HTTPException(
-                status_code=500,
-                detail=f"Failed to regenerate system prompt from stored file: {str(e)}"
-            )
+    if not file and not uploaded_resources:
+        raise HTTPException(
+            status_code=400,
+            detail="Welcome message changed but no previously uploaded file exists to regenerate prompts."
+        )
 
-    # Always bump updated_at
-    update_fields["updated_at"] = datetime.utcnow()
+    # The document stages of the stored file are cached by its hash: a welcome
+    # message change then only re-renders the prompt template
+    cached_stages = None
+    if not file:
+        stored_hash = uploaded_resources[-1].get("content_sha256")
+        if stored_hash:
+            cached_stages = get_cached_stages(stored_hash)
 
-    orgcalls_collection.update_one(
-        {"organisation_id": organisation_id, "user_id": user_id},
-        {"$set": update_fields}
-    )
+    # A new file and a prompt regeneration both extract a document, so both need a slot
+    ticket = None
+    if file:
+        ticket = await upload_admission.acquire(estimate_cost_mb(upload_size(file), file.filename))
+    elif cached_stages is None:
+        ticket = await upload_admission.acquire(estimate_cost_mb(0, uploaded_resources[-1].get("file_name") or ""))
 
-    updated_doc = orgcalls_collection.find_one({
-        "organisation_id": organisation_id,
-        "user_id": user_id
-    })
-    updated_doc = convert_objectid(updated_doc)
+    try:
+        content_bytes = None
+        if file:
+            content_bytes = await file.read()
+            if not content_bytes:
+                raise HTTPException(status_code=400, detail=f"Empty file uploaded: {file.filename}")
+
+        job = create_job(
+            "update",
+            organisation_id=organisation_id,
+            user_id=user_id,
+            file_name=file.filename if file else uploaded_resources[-1].get("file_name")
+        )
+        submit_job(
+            job["job_id"], _run_update_job,
+            organisation_id, user_id, update_fields, welcome_message, cached_stages,
+            content_bytes, file.filename if file else None, file.content_type if file else None,
+            ticket=ticket
+        )
+    except BaseException:
+        if ticket:
+            ticket.release()
+        raise
+
+    return {
+        "message": "Update accepted. The system prompt is being regenerated.",
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "file_uploaded": file is not None
+    }
+
+
+@router.get("/api/allyroid/config_job_status/{job_id}")
+async def get_config_job_status(job_id: str):
+    """
+    Status of a config upload / prompt regeneration job: queued, processing
+    (with its current stage), completed (with the endpoint's `result`) or
+    failed (with `error` and the HTTP `status_code` it corresponds to).
+    """
+    job = get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Config job '{job_id}' not found")
+    return job
 
-    return {"message": "Configuration updated successfully", "data": updated_doc}
 @router.get("/countries")
 def list_countries():
     """
@@ -521,6 +713,7 @@ async def delete_file_from_config(
         {
             "$set": {
                 "uploaded_resources": [],
+                "prompt_tokens": 0,
                 "updated_at": datetime.utcnow()
             }
         }
@@ -543,7 +736,7 @@ async def delete_file_from_config(
 async def validate_uploaded_file(file: UploadFile = File(...)) -> Dict:
     """
     Validate uploaded file:
-    - Estimates text length (cheap)
+    - Parses the file and counts its native text (OCR is left to the upload)
     - Checks character limit
     - Returns validation summary only (no DB or S3)
     """
@@ -556,13 +749,12 @@ async def validate_uploaded_file(file: UploadFile = File(...)) -> Dict:
     if not content_bytes:
         raise HTTPException(status_code=400, detail="Empty file uploaded.")
 
-    # Step 2: Estimate chars (returns int)
+    # Step 2: Parse once (kept briefly, so the upload that follows reuses it) and count chars
     try:
-        estimated_chars = estimate_text_chars(content_bytes, filename)
-    except HTTPException as e:
-        raise e
+        document = await run_in_threadpool(parse_document, content_bytes, filename)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to process file: {str(e)}")
+    estimated_chars = document.char_count
 
     # Step 3: Enforce character limit (NO len() here)
     if estimated_chars > MAX_TOTAL_CHARS:
@@ -576,6 +768,7 @@ async def validate_uploaded_file(file: UploadFile = File(...)) -> Dict:
         "filename": filename,
         "file_size_bytes": len(content_bytes),
         "extracted_chars": estimated_chars,  # already an int
+        "page_count": document.page_count,
         "status": "valid",
         "message": "File validated successfully",
         "file_type": file_ext,
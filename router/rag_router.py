@@ -3,16 +3,22 @@ from pydantic import BaseModel, Field
 from typing import Optional, Dict, Any, List
 from core.config import set_redis_json, get_redis_json
 import json
+import os
+import shutil
+import tempfile
 import uuid
 import logging
 import time
+from fastapi.concurrency import run_in_threadpool
 
-from rag.loader import extract_text
+from rag.loader import extract_text, SUPPORTED_EXTENSIONS
+from rag.pipeline import SPOOL_PREFIX, ingest_file, resume_ingestion, get_checkpoint, is_ingestion_running
+from rag.chunking import CHUNKERS
+from core.admission import upload_admission, estimate_cost_mb, upload_size
 from rag.qdrant import (
     store_documents, 
     reset_index, 
-    get_collection_info, 
-    store_document_bloom_parallel
+    get_collection_info
 )
 from qdrant_client import QdrantClient
 from core.config import get_settings
@@ -77,20 +83,28 @@ class KnowledgeInjectionBloomRequest(BaseModel):
 async def upload(
     file: UploadFile = File(...),
     document_name: str = Form(None),
-    document_id: str = Form(None)
+    document_id: str = Form(None),
+    organisation_id: str = Form(None),
+    chunker: str = Form(None)
 ):
-    try:
-        text = extract_text(file.file, file.filename)
-        logging.info(f"Extracted text from {file.filename} with chunks {text} of size {len(text)}")
-        store_documents(
-            text,
-            source=file.filename,
-            document_name=document_name or file.filename,
-            document_id=document_id
-        )
-        return {"status": "injected", "file": file.filename, "document_name": document_name or file.filename}
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
+    if chunker and chunker not in CHUNKERS:
+        raise HTTPException(status_code=400, detail=f"Unknown chunker '{chunker}'. Expected one of {CHUNKERS}")
+    async with upload_admission.admitted(estimate_cost_mb(upload_size(file), file.filename)):
+        try:
+            text = await run_in_threadpool(extract_text, file.file, file.filename)
+            logging.info(f"Extracted {len(text)} characters from {file.filename}")
+            await run_in_threadpool(
+                store_documents,
+                text,
+                source=file.filename,
+                document_name=document_name or file.filename,
+                document_id=document_id,
+                organisation_id=organisation_id,
+                chunker=chunker
+            )
+            return {"status": "injected", "file": file.filename, "document_name": document_name or file.filename}
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=str(e))
 
 class LoadDocsRequest(BaseModel):
     text: str = Field(..., example="AI stands for Artificial Intelligence...")
@@ -145,34 +159,72 @@ async def get_collection_stats():
 #         raise HTTPException(status_code=500, detail=str(e))
 
 
-def process_bloom_upload(text, source, document_name, document_id):
-    store_document_bloom_parallel(
-        text=text,
-        source=source,
-        document_name=document_name,
-        document_id=document_id
-    )
+def _spool_upload(file: UploadFile) -> str:
+    """
+    Copy an upload to the spool directory; the upload itself is closed once the
+    response is sent. The copy is kept with the ingestion checkpoint so it can be resumed.
+    """
+    suffix = os.path.splitext(file.filename)[1]
+    if settings.RAG_UPLOAD_SPOOL_DIR:
+        os.makedirs(settings.RAG_UPLOAD_SPOOL_DIR, exist_ok=True)
+    with tempfile.NamedTemporaryFile(delete=False, prefix=SPOOL_PREFIX, suffix=suffix, dir=settings.RAG_UPLOAD_SPOOL_DIR) as spool:
+        file.file.seek(0)
+        shutil.copyfileobj(file.file, spool, length=1024 * 1024)
+        return spool.name
+
+def process_bloom_upload(file_path, source, document_name, document_id, organisation_id=None, chunker=None, ticket=None):
+    """Stream the spooled upload through the ingestion pipeline, then free its admission slot"""
+    try:
+        ingest_file(
+            file_path,
+            source=source,
+            document_name=document_name,
+            document_id=document_id,
+            organisation_id=organisation_id,
+            chunker=chunker
+        )
+    finally:
+        if ticket:
+            ticket.release()
+
+def process_resume(document_id, ticket):
+    try:
+        resume_ingestion(document_id)
+    finally:
+        ticket.release()
 
 @router.post("/knowledge_injection_bloom")
 async def knowledge_injection_bloom(
     background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     document_name: str = Form(None),
-    document_id: str = Form(None)
+    document_id: str = Form(None),
+    organisation_id: str = Form(None),
+    chunker: str = Form(None)
 ):
+    if chunker and chunker not in CHUNKERS:
+        raise HTTPException(status_code=400, detail=f"Unknown chunker '{chunker}'. Expected one of {CHUNKERS}")
+    ext = file.filename.split(".")[-1].lower()
+    if ext not in SUPPORTED_EXTENSIONS:
+        raise HTTPException(status_code=400, detail=f"Unsupported file type: {ext}")
+    # Held until the background ingestion finishes, not just for this request
+    ticket = await upload_admission.acquire(estimate_cost_mb(upload_size(file), file.filename))
     try:
         start_time = time.time()
         if not document_id:
             document_id = str(uuid.uuid4())
 
-        text = extract_text(file.file, file.filename)
-        logging.info(f"Extracted text from {file.filename} with chunks {text} of size {len(text)}")
+        # Extraction happens in the background pipeline; only spool the upload here
+        file_path = await run_in_threadpool(_spool_upload, file)
         background_tasks.add_task(
             process_bloom_upload,
-            text=text,
+            file_path=file_path,
             source=file.filename,
             document_name=document_name or file.filename,
-            document_id=document_id
+            document_id=document_id,
+            organisation_id=organisation_id,
+            chunker=chunker,
+            ticket=ticket
         )
         
         total_time = time.time() - start_time
@@ -181,6 +233,8 @@ async def knowledge_injection_bloom(
             "status": "processing",
             "document_name": document_name,
             "document_id": document_id,
+            "organisation_id": organisation_id,
+            "chunker": chunker or settings.RAG_CHUNKER,
             "message": "Document uploaded successfully. Processing started in background.",
             "total_time": total_time
         }
@@ -189,6 +243,7 @@ async def knowledge_injection_bloom(
         return payload
         
     except Exception as e:
+        ticket.release()
         logging.error(f"Error in knowledge_injection_bloom: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -225,10 +280,51 @@ async def get_document_status(document_id: str):
             "message": document_data.get("message", ""),
             "upload_timestamp": document_data.get("upload_timestamp", ""),
             "bloom_levels": document_data.get("bloom_levels", []),
-            "chunks_per_level": document_data.get("chunks_per_level", 0)
+            "chunks_per_level": document_data.get("chunks_per_level", 0),
+            "pages_extracted": document_data.get("pages_extracted", 0),
+            "total_pages": document_data.get("total_pages"),
+            "chunks_embedded": document_data.get("chunks_embedded", 0),
+            "points_upserted": document_data.get("points_upserted", 0),
+            "eta_seconds": document_data.get("eta_seconds"),
+            "stages": document_data.get("stages", {}),
+            "resumable": get_checkpoint(document_id) is not None and not is_ingestion_running(document_id)
         }
         
     except HTTPException:
         raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error retrieving document status: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Error retrieving document status: {str(e)}")
+
+@router.post(
+    "/document_resume/{document_id}",
+    summary="Resume document ingestion",
+    description="Resume an interrupted or failed ingestion from its last checkpoint."
+)
+async def resume_document(document_id: str, background_tasks: BackgroundTasks):
+    checkpoint = get_checkpoint(document_id)
+    if not checkpoint:
+        raise HTTPException(status_code=404, detail=f"No ingestion checkpoint for document '{document_id}'")
+    if is_ingestion_running(document_id):
+        raise HTTPException(status_code=409, detail=f"Document '{document_id}' is already being ingested")
+    if not checkpoint.get("file_path") or not os.path.exists(checkpoint["file_path"]):
+        raise HTTPException(status_code=410, detail=f"Spooled upload for document '{document_id}' is no longer available")
+
+    cost_mb = estimate_cost_mb(os.path.getsize(checkpoint["file_path"]), checkpoint["file_path"])
+    ticket = await upload_admission.acquire(cost_mb)
+    background_tasks.add_task(process_resume, document_id, ticket)
+    return {
+        "status": "resuming",
+        "document_id": document_id,
+        "document_name": checkpoint.get("document_name"),
+        "resume_segment": checkpoint.get("resume_segment", 0),
+        "resume_chunk_index": checkpoint.get("resume_chunk_index", 0),
+        "message": "Ingestion resumed from the last checkpoint in background."
+    }
+
+@router.get(
+    "/admission/stats",
+    summary="Upload admission queue",
+    description="Running and queued extractions, reserved memory and rejection counts."
+)
+async def get_admission_stats():
+    return upload_admission.stats()
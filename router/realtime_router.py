@@ -23,15 +23,15 @@ async def ask_neurocaller_endpoint(
     try:
         # Only upload if a real file was provided
         if file and file.filename:
-            uploaded_file_part = upload_file_for_gemini(
+            uploaded_file_part = await upload_file_for_gemini(
                 file=file.file,
                 mime_type=file.content_type
             )
 
-        # Stream the Gemini response (works even if uploaded_file_part is None)
+        # Stream the Gemini response as NDJSON (works even if uploaded_file_part is None)
         return StreamingResponse(
-            generate_response(extended_query, background_tasks, uploaded_file_part),
-            media_type="application/json",
+            generate_response(extended_query, background_tasks, uploaded_file_part, organisation_id, search_query=query),
+            media_type="application/x-ndjson",
         )
     except Exception as e:
         logging.error(f"Error occurred while processing multimodal request: {e}")
@@ -0,0 +1,84 @@
+import logging
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Optional
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+
+from core.config import get_settings, get_redis_json, set_redis_json
+
+settings = get_settings()
+
+# Extraction, OCR, prompt generation and S3 writes of org-config uploads run
+# here instead of on the event loop; the admission controller still decides
+# how many of them may extract at once.
+_executor = ThreadPoolExecutor(max_workers=settings.ORG_CONFIG_JOB_WORKERS, thread_name_prefix="config-job")
+
+
+def _job_key(job_id: str) -> str:
+    return f"config_job_{job_id}"
+
+
+def create_job(kind: str, **fields) -> dict:
+    """Record a queued job in Redis and return it"""
+    now = datetime.utcnow().isoformat()
+    job = {
+        "job_id": str(uuid.uuid4()),
+        "kind": kind,
+        "status": "queued",
+        "stage": None,
+        "created_at": now,
+        "updated_at": now,
+        **fields,
+    }
+    set_redis_json(_job_key(job["job_id"]), job, expire=settings.ORG_CONFIG_JOB_TTL)
+    return job
+
+
+def update_job(job_id: str, **fields):
+    job = get_redis_json(_job_key(job_id)) or {"job_id": job_id}
+    job.update(fields)
+    job["updated_at"] = datetime.utcnow().isoformat()
+    set_redis_json(_job_key(job_id), jsonable_encoder(job), expire=settings.ORG_CONFIG_JOB_TTL)
+
+
+def get_job(job_id: str) -> Optional[dict]:
+    return get_redis_json(_job_key(job_id))
+
+
+def submit_job(job_id: str, fn: Callable[..., Any], *args, ticket=None):
+    """
+    Run `fn(job_id, *args)` on the worker pool. Its return value becomes the
+    job's `result`; an HTTPException it raises becomes `error`/`status_code`.
+    The admission ticket, if any, is released when the job ends.
+    """
+    try:
+        _executor.submit(_run_job, job_id, fn, args, ticket)
+    except Exception:
+        if ticket:
+            ticket.release()
+        raise
+
+
+def _run_job(job_id: str, fn: Callable[..., Any], args: tuple, ticket):
+    started = time.perf_counter()
+    update_job(job_id, status="processing")
+    try:
+        result = fn(job_id, *args)
+    except HTTPException as e:
+        logging.warning(f"Config job {job_id} failed ({e.status_code}): {e.detail}")
+        update_job(job_id, status="failed", error=e.detail, status_code=e.status_code,
+                   seconds=round(time.perf_counter() - started, 2))
+    except Exception as e:
+        logging.exception(f"Config job {job_id} failed")
+        update_job(job_id, status="failed", error=str(e), status_code=500,
+                   seconds=round(time.perf_counter() - started, 2))
+    else:
+        update_job(job_id, status="completed", stage=None, result=result,
+                   seconds=round(time.perf_counter() - started, 2))
+    finally:
+        if ticket:
+            ticket.release()
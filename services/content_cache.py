@@ -0,0 +1,39 @@
+import hashlib
+from typing import Any, Optional
+
+from core.config import get_settings, get_redis_json, set_redis_json
+
+settings = get_settings()
+
+# Bump when extraction or a prompt stage changes, so stale entries stop matching
+EXTRACTION_VERSION = "1"
+PROMPT_STAGES_VERSION = "1"
+
+
+def content_sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _key(content_hash: str, name: str) -> str:
+    return f"content_cache_{content_hash}_{name}"
+
+
+def get_cached(content_hash: str, name: str) -> Optional[Any]:
+    """Value stored under (content hash, name), or None"""
+    if not content_hash:
+        return None
+    entry = get_redis_json(_key(content_hash, name))
+    return entry["value"] if entry else None
+
+
+def set_cached(content_hash: str, name: str, value: Any):
+    if content_hash:
+        set_redis_json(_key(content_hash, name), {"value": value}, expire=settings.ORG_CONTENT_CACHE_TTL)
+
+
+def text_cache_name() -> str:
+    return f"text_v{EXTRACTION_VERSION}"
+
+
+def stage_cache_name(stage: str, model: str) -> str:
+    return f"{stage}_v{PROMPT_STAGES_VERSION}_{model}"
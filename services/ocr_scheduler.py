@@ -0,0 +1,352 @@
+import asyncio
+import base64
+import logging
+import math
+import os
+import random
+import statistics
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+import fitz
+import openai
+from openai import AsyncOpenAI
+
+from core.background_loop import run_sync
+from core.config import get_settings
+
+settings = get_settings()
+
+OCR_JPEG_QUALITY = 85
+OCR_PROMPT = (
+    "Transcribe this page into Markdown. "
+    "Preserve all tables, headers, and layout structures exactly. "
+    "If there is a table, output it as a Markdown table. "
+    "Do not summarize."
+)
+PROMPT_TOKENS = 100  # text part of the request, rounded up
+LATENCY_WINDOW = 500  # recent pages kept for latency percentiles
+
+
+def render_page_jpeg(doc, page_number: int, dpi: int) -> Tuple[bytes, int, int]:
+    """JPEG bytes and pixel size of a page; the bitmap is dropped once encoded"""
+    pix = doc[page_number].get_pixmap(dpi=dpi, alpha=False)
+    try:
+        return pix.tobytes("jpeg", jpg_quality=OCR_JPEG_QUALITY), pix.width, pix.height
+    finally:
+        del pix
+
+
+def image_tokens(width: int, height: int) -> int:
+    """OpenAI's token cost of a high-detail image of this size"""
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    return 85 + 170 * math.ceil(width / 512) * math.ceil(height / 512)
+
+
+class _RateLimiter:
+    """
+    Token buckets for requests/minute and tokens/minute. Requests reserve their
+    worst case (input + max output tokens, as the provider counts it) and give
+    back what they did not use. `pause` stops everyone after a 429.
+    """
+
+    def __init__(self, rpm: int, tpm: int):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.requests = float(rpm)
+        self.tokens = float(tpm)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()  # FIFO: earlier pages are not starved by later ones
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self.updated
+        self.updated = now
+        self.requests = min(self.rpm, self.requests + elapsed * self.rpm / 60)
+        self.tokens = min(self.tpm, self.tokens + elapsed * self.tpm / 60)
+
+    async def acquire(self, tokens: int):
+        tokens = min(tokens, self.tpm)
+        async with self._lock:
+            while True:
+                self._refill()
+                wait = self.paused_until - time.monotonic()
+                if wait <= 0:
+                    if self.requests >= 1 and self.tokens >= tokens:
+                        self.requests -= 1
+                        self.tokens -= tokens
+                        return
+                    wait = max(
+                        (1 - self.requests) * 60 / self.rpm,
+                        (tokens - self.tokens) * 60 / self.tpm,
+                    )
+                await asyncio.sleep(wait)
+
+    def refund(self, tokens: int):
+        self._refill()
+        self.tokens = min(self.tpm, self.tokens + max(tokens, 0))
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class _AdaptiveLimit:
+    """
+    Concurrency limit that halves on rate limiting and grows back by one after
+    a limit's worth of consecutive successes (AIMD).
+    """
+
+    def __init__(self, maximum: int):
+        self.maximum = maximum
+        self.limit = maximum
+        self.in_flight = 0
+        self._successes = 0
+        self._condition = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+
+    async def __aexit__(self, *exc):
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def throttled(self):
+        self.limit = max(1, self.limit // 2)
+        self._successes = 0
+
+    async def succeeded(self):
+        self._successes += 1
+        if self._successes >= self.limit and self.limit < self.maximum:
+            self.limit += 1
+            self._successes = 0
+            async with self._condition:
+                self._condition.notify_all()
+
+
+class OcrScheduler:
+    """
+    Process-wide vision OCR scheduler. Every page of every request is its own
+    task; a shared concurrency limit and rate limiter decide when it may be
+    rendered and sent, so a slow page never holds back the pages after it.
+    Lives on the background event loop (see `transcribe_pages`).
+    """
+
+    def __init__(self):
+        self.client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0)
+        self.model = settings.OCR_MODEL
+        self.max_output_tokens = settings.OCR_MAX_OUTPUT_TOKENS
+        self.retries = settings.OCR_PAGE_RETRIES
+        self.timeout = settings.OCR_PAGE_TIMEOUT
+        self.concurrency = _AdaptiveLimit(settings.OCR_MAX_CONCURRENCY)
+        self.rate_limiter = _RateLimiter(settings.OCR_RPM_LIMIT, settings.OCR_TPM_LIMIT)
+        self.queued = 0
+        self.pages_done = 0
+        self.rate_limited = 0
+        self.latencies: deque = deque(maxlen=LATENCY_WINDOW)
+
+    async def transcribe(self, file_content: bytes, pages: List[Tuple[int, int]], filename: str, partial: bool = False) -> Dict[int, str]:
+        """
+        Transcribe (0-based page number, render DPI) pages of a PDF to
+        Markdown. Returns {page_number: markdown}; raises if any page fails,
+        unless `partial` is set: then failed pages are logged and left out.
+        """
+        started = time.perf_counter()
+        doc = fitz.open(stream=file_content, filetype="pdf")
+        # A PyMuPDF document must not be used from several threads at once, and
+        # must not be closed under a render thread a cancelled task left behind
+        render_lock = threading.Lock()
+
+        def render(idx: int, dpi: int):
+            with render_lock:
+                if doc.is_closed:
+                    raise RuntimeError(f"{filename} was closed before page {idx + 1} was rendered")
+                return render_page_jpeg(doc, idx, dpi)
+
+        def close():
+            with render_lock:
+                doc.close()
+
+        tasks = [
+            asyncio.create_task(self._transcribe_page(render, idx, dpi, filename))
+            for idx, dpi in pages
+        ]
+        try:
+            results = await asyncio.gather(*tasks, return_exceptions=partial)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        finally:
+            await asyncio.to_thread(close)
+
+        failed = [(idx, result) for (idx, _), result in zip(pages, results) if isinstance(result, BaseException)]
+        for idx, error in failed:
+            logging.error(f"OCR {filename} page {idx + 1} failed: {error}")
+        results = [result for result in results if not isinstance(result, BaseException)]
+        if not results:
+            return {}
+
+        elapsed = time.perf_counter() - started
+        api_seconds = [page["api_seconds"] for page in results]
+        logging.info(
+            f"OCR {filename}: {len(results)} pages in {elapsed:.1f}s "
+            f"({len(results) / elapsed * 60:.0f} pages/min), api p50={statistics.median(api_seconds):.1f}s "
+            f"max={max(api_seconds):.1f}s, concurrency limit {self.concurrency.limit}"
+        )
+        return {page["page"]: page["text"] for page in results}
+
+    async def _transcribe_page(self, render, idx: int, dpi: int, filename: str) -> dict:
+        queued_at = time.perf_counter()
+        self.queued += 1
+        admitted = False
+        try:
+            async with self.concurrency:
+                self.queued -= 1
+                admitted = True
+                started = time.perf_counter()
+                jpeg, width, height = await asyncio.to_thread(render, idx, dpi)
+                base64_image = base64.b64encode(jpeg).decode("utf-8")
+                del jpeg
+                rendered = time.perf_counter()
+
+                text, attempts, api_seconds = await self._call(base64_image, width, height, idx, filename)
+        finally:
+            if not admitted:
+                self.queued -= 1
+
+        stats = {
+            "page": idx,
+            "text": text,
+            "queued_seconds": started - queued_at,
+            "render_seconds": rendered - started,
+            "api_seconds": api_seconds,
+            "attempts": attempts,
+        }
+        self.pages_done += 1
+        self.latencies.append(api_seconds)
+        logging.info(
+            f"OCR {filename} page {idx + 1}: queued {stats['queued_seconds']:.2f}s, "
+            f"render {stats['render_seconds']:.2f}s ({width}x{height}@{dpi}dpi), "
+            f"api {api_seconds:.2f}s, attempts {attempts}"
+        )
+        return stats
+
+    async def _call(self, base64_image: str, width: int, height: int, idx: int, filename: str):
+        reserved = PROMPT_TOKENS + image_tokens(width, height) + self.max_output_tokens
+        api_seconds = 0.0
+        for attempt in range(1, self.retries + 1):
+            await self.rate_limiter.acquire(reserved)
+            started = time.perf_counter()
+            try:
+                response = await self.client.chat.completions.create(
+                    model=self.model,
+                    messages=[
+                        {
+                            "role": "user",
+                            "content": [
+                                {"type": "text", "text": OCR_PROMPT},
+                                {
+                                    "type": "image_url",
+                                    "image_url": {
+                                        "url": f"data:image/jpeg;base64,{base64_image}",
+                                        "detail": "high"
+                                    },
+                                },
+                            ],
+                        }
+                    ],
+                    max_tokens=self.max_output_tokens,
+                    timeout=self.timeout,
+                )
+            except openai.RateLimitError as e:
+                api_seconds += time.perf_counter() - started
+                self.rate_limited += 1
+                self.rate_limiter.refund(reserved)
+                wait = _retry_after(e) or _backoff(attempt)
+                self.rate_limiter.pause(wait)
+                self.concurrency.throttled()
+                logging.warning(
+                    f"OCR {filename} page {idx + 1} rate limited; pausing all OCR for {wait:.1f}s, "
+                    f"concurrency limit now {self.concurrency.limit}"
+                )
+                if attempt == self.retries:
+                    raise
+                continue
+            except (openai.APITimeoutError, openai.APIConnectionError, openai.InternalServerError) as e:
+                api_seconds += time.perf_counter() - started
+                self.rate_limiter.refund(reserved)
+                if attempt == self.retries:
+                    raise
+                wait = _backoff(attempt)
+                logging.warning(f"Retrying OCR of {filename} page {idx + 1} after error: {e}. Waiting {wait:.1f}s")
+                await asyncio.sleep(wait)
+                continue
+
+            api_seconds += time.perf_counter() - started
+            if response.usage:
+                self.rate_limiter.refund(reserved - response.usage.total_tokens)
+            await self.concurrency.succeeded()
+
+            choice = response.choices[0]
+            if choice.finish_reason == "length":
+                logging.warning(f"⚠️ Page {idx+1} may be truncated (token limit hit).")
+            return choice.message.content, attempt, api_seconds
+
+    def stats(self) -> dict:
+        latencies = sorted(self.latencies)
+        return {
+            "queued_pages": self.queued,
+            "in_flight": self.concurrency.in_flight,
+            "concurrency_limit": self.concurrency.limit,
+            "pages_done": self.pages_done,
+            "rate_limited": self.rate_limited,
+            "api_p50_seconds": latencies[len(latencies) // 2] if latencies else None,
+            "api_p95_seconds": latencies[int(len(latencies) * 0.95)] if latencies else None,
+        }
+
+
+def _retry_after(error: openai.APIStatusError) -> Optional[float]:
+    try:
+        return float(error.response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def _backoff(attempt: int) -> float:
+    # Exponential with jitter, so throttled pages do not retry in lockstep
+    return min(60.0, 2 ** attempt) * (0.5 + random.random() / 2)
+
+
+_scheduler: Optional[OcrScheduler] = None
+
+
+def get_ocr_scheduler() -> OcrScheduler:
+    """The shared scheduler; must be called on the background event loop"""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = OcrScheduler()
+    return _scheduler
+
+
+async def _transcribe(file_content: bytes, pages: List[Tuple[int, int]], filename: str, partial: bool) -> Dict[int, str]:
+    return await get_ocr_scheduler().transcribe(file_content, pages, filename, partial=partial)
+
+
+def transcribe_pages(file_content: bytes, pages: List[Tuple[int, int]], filename: str, partial: bool = False) -> Dict[int, str]:
+    """
+    Sync entry point: OCR (page number, DPI) pages of a PDF on the shared
+    scheduler. Concurrent callers share its concurrency and rate limits.
+    With `partial`, pages that fail are missing from the result instead of
+    failing the call.
+    """
+    return run_sync(_transcribe(file_content, pages, filename, partial))
@@ -1,347 +1,368 @@
-import concurrent
-import PyPDF2
-import docx
-from io import BytesIO
-import logging
-import os
-import tempfile
-import base64
-from pdf2image import convert_from_path
-from openai import OpenAI
-from reportlab.lib.pagesizes import letter
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet
-import pandas as pd
-from docx import Document
-import io
-
-
-def estimate_text_chars(file_content: bytes, filename: str) -> int:
-    file_ext = os.path.splitext(filename)[1].lower()
-
-    try:
-        if file_ext == ".pdf":
-            pdf_reader = PyPDF2.PdfReader(BytesIO(file_content))
-            pages = [(p.extract_text() or "") for p in pdf_reader.pages]
-            return len("\n".join(pages).strip())
-
-        elif file_ext in [".docx", ".doc"]:
-            try:
-                d = docx.Document(BytesIO(file_content))
-                text = "\n".join(p.text for p in d.paragraphs)
-                return len(text.strip())
-            except Exception:
-                return len(file_content.decode("utf-8", errors="ignore"))
-
-        elif file_ext in [".xlsx", ".xls"]:
-            # read all sheets, convert to string, count chars
-            xl = pd.ExcelFile(BytesIO(file_content))
-            all_text = []
-            for sheet in xl.sheet_names:
-                df = xl.parse(sheet)
-                all_text.append(df.to_csv(index=False))
-            return len("\n".join(all_text))
-        elif file_ext in [".csv"]:
-            df = pd.read_csv(BytesIO(file_content))
-            return len(df.to_csv(index=False))
-        else:
-            return len(file_content.decode("utf-8", errors="ignore"))
-
-    except Exception:
-        return 0
-
- 
-def convert_docx_to_pdf(docx_bytes: bytes) -> bytes:
-    """
-    Convert DOCX bytes to PDF bytes.
-    Extracts text from DOCX and writes it to a simple PDF.
-    """
-    try:
-        doc = Document(io.BytesIO(docx_bytes))
-        
-        pdf_buffer = io.BytesIO()
-        pdf = SimpleDocTemplate(pdf_buffer, pagesize=letter)
-        styles = getSampleStyleSheet()
-        story = []
- 
-        for para in doc.paragraphs:
-            if para.text.strip():
-                # Handling some basic styling (very simplified)
-                story.append(Paragraph(para.text, styles['Normal']))
-                story.append(Spacer(1, 6))
-        
-        # Handle tables in docx (basic text extraction)
-        for table in doc.tables:
-            data = []
-            for row in table.rows:
-                row_data = [cell.text for cell in row.cells]
-                data.append(row_data)
-            
-            if data:
-                t = Table(data)
-                t.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                    ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ]))
-                story.append(t)
-                story.append(Spacer(1, 12))
- 
-        pdf.build(story)
-        pdf_buffer.seek(0)
-        return pdf_buffer.read()
- 
-    except Exception as e:
-        print(f"Error converting DOCX to PDF: {e}")
-        # Fallback: Just return empty bytes or handle error appropriately
-        return b""
- 
-def convert_excel_to_pdf(excel_bytes: bytes) -> bytes:
-    """
-    Convert Excel (XLSX/XLS) bytes to PDF bytes.
-    Converts each sheet to a table in PDF.
-    """
-    try:
-        # Read all sheets
-        xls = pd.ExcelFile(io.BytesIO(excel_bytes))
-        
-        pdf_buffer = io.BytesIO()
-        pdf = SimpleDocTemplate(pdf_buffer, pagesize=letter)
-        styles = getSampleStyleSheet()
-        story = []
- 
-        for sheet_name in xls.sheet_names:
-            df = pd.read_excel(xls, sheet_name=sheet_name)
-            
-            # Add Sheet Title
-            story.append(Paragraph(f"Sheet: {sheet_name}", styles['Heading2']))
-            story.append(Spacer(1, 12))
-            
-            # Convert DataFrame to list of lists for Table
-            # Handle NaN values
-            df = df.fillna('')
-            data = [df.columns.values.tolist()] + df.values.tolist()
-            
-            # Create Table
-            # Note: Large tables might break layout, this is a basic implementation
-            t = Table(data)
-            t.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, -1), 8), # Smaller font for data
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
-            ]))
-            story.append(t)
-            story.append(Spacer(1, 20))
- 
-        pdf.build(story)
-        pdf_buffer.seek(0)
-        return pdf_buffer.read()
- 
-    except Exception as e:
-        print(f"Error converting Excel to PDF: {e}")
-        return b""
- 
-def convert_csv_to_pdf(csv_bytes: bytes) -> bytes:
-    """
-    Convert CSV bytes to PDF bytes.
-    """
-    try:
-        df = pd.read_csv(io.BytesIO(csv_bytes))
-        
-        pdf_buffer = io.BytesIO()
-        pdf = SimpleDocTemplate(pdf_buffer, pagesize=letter)
-        styles = getSampleStyleSheet()
-        story = []
- 
-        # Add Title
-        story.append(Paragraph("CSV Data Export", styles['Heading1']))
-        story.append(Spacer(1, 12))
- 
-        # Handle NaN values
-        df = df.fillna('')
-        data = [df.columns.values.tolist()] + df.values.tolist()
- 
-        t = Table(data)
-        t.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 8),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
-        ]))
-        story.append(t)
-        
-        pdf.build(story)
-        pdf_buffer.seek(0)
-        return pdf_buffer.read()
- 
-    except Exception as e:
-        print(f"Error converting CSV to PDF: {e}")
-        return b""
-
-def encode_image(image_path):
-    with open(image_path, "rb") as image_file:
-        return base64.b64encode(image_file.read()).decode('utf-8')
-    
-def extract_text_from_file(file_content: bytes, filename: str) -> str:
-    """
-    Extract text using GPT-4o Vision for maximum accuracy on tables and layouts.
-    Converts PDF -> Images -> Vision API -> Markdown.
-    Processes ALL pages dynamically (any PDF size) with safe batching + retries.
-    """
-    import os, tempfile, logging, base64, time, concurrent.futures
-    from io import BytesIO
-    from openai import OpenAI
-    from pdf2image import convert_from_path
-
-    file_ext = os.path.splitext(filename)[1].lower()
-    api_key = os.getenv('OPENAI_API_KEY')
-    if not api_key:
-        raise ValueError("OPENAI_API_KEY not found.")
-
-    client = OpenAI(api_key=api_key)
-
-    try:
-        # Pre-process: Convert other formats to PDF first
-        if file_ext in [".docx", ".doc"]:
-            print(f"🔄 Converting {filename} to PDF...")
-            file_content = convert_docx_to_pdf(file_content)
-            file_ext = ".pdf"
-            filename = os.path.splitext(filename)[0] + ".pdf"
-
-        elif file_ext in [".xlsx", ".xls"]:
-            print(f"🔄 Converting {filename} to PDF...")
-            file_content = convert_excel_to_pdf(file_content)
-            file_ext = ".pdf"
-            filename = os.path.splitext(filename)[0] + ".pdf"
-
-        elif file_ext in [".csv"]:
-            print(f"🔄 Converting {filename} to PDF...")
-            file_content = convert_csv_to_pdf(file_content)
-            file_ext = ".pdf"
-            filename = os.path.splitext(filename)[0] + ".pdf"
-
-        # Use GPT-4o Vision for PDFs
-        if file_ext == ".pdf":
-            print(f"👁️ Processing {filename} with GPT-4o Vision (all pages, parallel workers=5)...")
-
-            tmp_path = None
-            try:
-                with tempfile.NamedTemporaryFile(suffix=file_ext, delete=False) as tmp_file:
-                    tmp_file.write(file_content)
-                    tmp_path = tmp_file.name
-
-                # 1) Convert PDF to images (ALL pages)
-                images = convert_from_path(tmp_path)
-                markdown_pages = [None] * len(images)
-
-                print(f"📄 Converted PDF to {len(images)} images.")
-
-                # Controls for big PDFs
-                BATCH_SIZE = 10     # pages per batch (still processes ALL pages)
-                MAX_WORKERS = 5     # parallel calls
-                RETRIES = 3         # retry per page on transient failures
-                MAX_TOKENS = 8000   # safer for dense tables
-
-                def process_page(idx_img):
-                    idx, img = idx_img
-
-                    buf = BytesIO()
-                    img.save(buf, format="JPEG")
-                    base64_image = base64.b64encode(buf.getvalue()).decode("utf-8")
-                    buf.close()
-
-                    for attempt in range(RETRIES):
-                        try:
-                            response = client.chat.completions.create(
-                                model="gpt-4o",
-                                messages=[
-                                    {
-                                        "role": "user",
-                                        "content": [
-                                            {
-                                                "type": "text",
-                                                "text": (
-                                                    "Transcribe this page into Markdown. "
-                                                    "Preserve all tables, headers, and layout structures exactly. "
-                                                    "If there is a table, output it as a Markdown table. "
-                                                    "Do not summarize."
-                                                ),
-                                            },
-                                            {
-                                                "type": "image_url",
-                                                "image_url": {
-                                                    "url": f"data:image/jpeg;base64,{base64_image}",
-                                                    "detail": "high"
-                                                },
-                                            },
-                                        ],
-                                    }
-                                ],
-                                max_tokens=MAX_TOKENS,
-                                timeout=300
-                            )
-
-                            choice = response.choices[0]
-                            if choice.finish_reason == "length":
-                                logging.warning(f"⚠️ Page {idx+1} may be truncated (token limit hit).")
-
-                            page_text = choice.message.content
-                            print(f"✅ Processed page {idx+1}/{len(images)}")
-                            return idx, page_text
-
-                        except Exception as e:
-                            if attempt == RETRIES - 1:
-                                raise
-                            wait = 2 ** attempt
-                            logging.warning(
-                                f"Retrying page {idx+1} after error: {e}. Waiting {wait}s"
-                            )
-                            time.sleep(wait)
-
-                # 2) Run in batches to avoid rate limits / memory spikes
-                for start in range(0, len(images), BATCH_SIZE):
-                    batch_imgs = images[start:start + BATCH_SIZE]
-                    batch = list(enumerate(batch_imgs, start=start))
-
-                    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-                        futures = [executor.submit(process_page, item) for item in batch]
-                        for future in concurrent.futures.as_completed(futures):
-                            idx, text = future.result()
-                            markdown_pages[idx] = text
-
-                full_text = "\n\n".join(markdown_pages)
-
-                # Clean log (don’t dump full KB)
-                logging.info(
-                    f"✅ Completed Vision extraction for {full_text} "
-                    f"(pages={len(images)}, chars={len(full_text)})"
-                )
-
-                return full_text
-
-            except Exception as e:
-                logging.error(f"Vision extraction failed for {filename}: {e}")
-                raise
-
-            finally:
-                if tmp_path and os.path.exists(tmp_path):
-                    os.remove(tmp_path)
-
-        else:
-            # Fallback for non-PDF types
-            return file_content.decode("utf-8", errors="ignore")
-
-    except Exception as e:
-        print(f"Error extracting text from {filename}: {str(e)}")
-        return ""
+import logging
+import os
+import re
+import threading
+import time
+import base64
+import unicodedata
+from collections import OrderedDict
+import fitz  # PyMuPDF: native text layer and tables
+import pandas as pd
+from docx import Document
+from docx.table import Table as DocxTable
+from docx.text.paragraph import Paragraph as DocxParagraph
+import io
+from core.config import get_settings
+from services.content_cache import content_sha256
+from services.ocr_scheduler import transcribe_pages
+
+settings = get_settings()
+
+
+# A PDF page is sent to vision OCR only when its text layer is missing or unusable:
+MIN_PAGE_CHARS = 40             # fewer non-whitespace characters than this ...
+IMAGE_COVERAGE_FOR_OCR = 0.5    # ... on a page mostly covered by images (a scan)
+MAX_GARBAGE_RATIO = 0.3         # or this share of characters are unmapped glyphs / control chars
+CID_PATTERN = re.compile(r"\(cid:\d+\)")
+
+# Rendering resolution for vision OCR. GPT-4o "high" detail fits images into
+# 2048x2048 and then scales the short side to 768 px, so pixels beyond that
+# are only paid for in memory and upload size.
+OCR_SHORT_SIDE_PX = 768
+OCR_LONG_SIDE_PX = 2048
+OCR_MIN_DPI = 72
+OCR_MAX_DPI = 300
+DENSE_CHARS_PER_SQ_INCH = 20    # garbled text layers this dense get the long-side budget
+
+
+def _markdown_cell(value) -> str:
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return ""
+    return str(value).replace("|", "\\|").replace("\n", " ").strip()
+
+
+def _markdown_table(rows) -> str:
+    """Render a header row plus data rows as a Markdown table"""
+    rows = [[_markdown_cell(cell) for cell in row] for row in rows]
+    if not rows:
+        return ""
+    width = max(len(row) for row in rows)
+    rows = [row + [""] * (width - len(row)) for row in rows]
+    lines = ["| " + " | ".join(rows[0]) + " |", "|" + " --- |" * width]
+    lines.extend("| " + " | ".join(row) + " |" for row in rows[1:])
+    return "\n".join(lines)
+
+
+def _dataframe_markdown(df: pd.DataFrame) -> str:
+    return _markdown_table([list(df.columns)] + df.values.tolist())
+
+
+def _garbage_ratio(text: str) -> float:
+    """Share of characters that a broken font mapping typically produces"""
+    chars = [c for c in text if not c.isspace()]
+    if not chars:
+        return 0.0
+    bad = sum(
+        1 for c in chars
+        if c == "\ufffd" or unicodedata.category(c) in ("Co", "Cn", "Cc", "Cs")
+    )
+    bad += sum(len(match) for match in CID_PATTERN.findall(text))
+    return min(1.0, bad / len(chars))
+
+
+def _image_coverage(page) -> float:
+    page_area = abs(page.rect) or 1.0
+    covered = 0.0
+    for image in page.get_image_info():
+        covered += abs(fitz.Rect(image["bbox"]) & page.rect)
+    return min(1.0, covered / page_area)
+
+
+def _page_needs_ocr(page, text: str) -> bool:
+    chars = len("".join(text.split()))
+    if chars == 0:
+        # Blank pages have nothing to transcribe; outlined text is drawn as paths
+        return _image_coverage(page) > 0 or bool(page.get_drawings())
+    if _garbage_ratio(text) > MAX_GARBAGE_RATIO:
+        return True
+    return chars < MIN_PAGE_CHARS and _image_coverage(page) >= IMAGE_COVERAGE_FOR_OCR
+
+
+def _ocr_dpi(page, text: str) -> int:
+    """
+    Rendering DPI for a page: enough for the short side to reach the model's
+    working resolution, the full long-side budget for dense pages, never more
+    than the resolution of the scan embedded in the page.
+    """
+    width_in, height_in = page.rect.width / 72, page.rect.height / 72
+    short_in, long_in = sorted((width_in, height_in))
+    dpi = OCR_SHORT_SIDE_PX / short_in
+    chars = len("".join(text.split()))
+    if chars / (width_in * height_in) >= DENSE_CHARS_PER_SQ_INCH:
+        dpi = max(dpi, OCR_LONG_SIDE_PX / long_in)
+
+    # Upsampling a scan adds no detail
+    scan_dpi = 0.0
+    for image in page.get_image_info():
+        bbox = fitz.Rect(image["bbox"])
+        if bbox.width > 0:
+            scan_dpi = max(scan_dpi, image["width"] / (bbox.width / 72))
+    if scan_dpi:
+        dpi = min(dpi, scan_dpi)
+    return int(min(max(dpi, OCR_MIN_DPI), OCR_MAX_DPI))
+
+
+def _pdf_page_markdown(page) -> str:
+    """Native text of a page, with detected tables rendered as Markdown tables"""
+    tables = []
+    try:
+        tables = page.find_tables().tables
+    except Exception as e:  # table detection is best effort
+        logging.warning(f"Table detection failed on page {page.number + 1}: {e}")
+
+    if not tables:
+        return page.get_text("text").strip()
+
+    # Text outside the tables, then each table once (instead of flattened cell text)
+    parts = []
+    table_rects = [fitz.Rect(table.bbox) for table in tables]
+    for block in page.get_text("blocks", sort=True):
+        rect = fitz.Rect(block[:4])
+        if block[6] == 0 and not any(rect.intersects(t) for t in table_rects):
+            parts.append(block[4].strip())
+    for table in tables:
+        markdown = _markdown_table(table.extract())
+        if markdown:
+            parts.append(markdown)
+    return "\n\n".join(part for part in parts if part)
+
+
+def _docx_markdown(file_content: bytes) -> str:
+    """Paragraphs (headings as Markdown headings) and tables in document order"""
+    document = Document(io.BytesIO(file_content))
+    parts = []
+    for child in document.element.body.iterchildren():
+        tag = child.tag.rsplit("}", 1)[-1]
+        if tag == "p":
+            paragraph = DocxParagraph(child, document)
+            text = paragraph.text.strip()
+            if not text:
+                continue
+            style = paragraph.style.name if paragraph.style is not None else ""
+            if style.startswith("Heading") and style[-1:].isdigit():
+                text = "#" * int(style[-1]) + " " + text
+            elif style == "Title":
+                text = "# " + text
+            parts.append(text)
+        elif tag == "tbl":
+            table = DocxTable(child, document)
+            markdown = _markdown_table([cell.text for cell in row.cells] for row in table.rows)
+            if markdown:
+                parts.append(markdown)
+    return "\n\n".join(parts)
+
+
+def _excel_markdown(file_content: bytes) -> list:
+    """One Markdown section per sheet"""
+    xls = pd.ExcelFile(io.BytesIO(file_content))
+    parts = []
+    for sheet_name in xls.sheet_names:
+        df = pd.read_excel(xls, sheet_name=sheet_name)
+        parts.append(f"## Sheet: {sheet_name}\n\n{_dataframe_markdown(df)}")
+    return parts
+
+
+def _csv_markdown(file_content: bytes) -> str:
+    return _dataframe_markdown(pd.read_csv(io.BytesIO(file_content)))
+
+
+def encode_image(image_path):
+    with open(image_path, "rb") as image_file:
+        return base64.b64encode(image_file.read()).decode('utf-8')
+
+
+def _vision_ocr_pages(file_content: bytes, pages: list, filename: str) -> dict:
+    """
+    Transcribe PDF pages to Markdown with GPT-4o vision. `pages` holds
+    (0-based page number, render DPI) pairs. Returns {page_number: markdown};
+    pages that could not be transcribed are missing.
+    """
+    if not os.getenv('OPENAI_API_KEY'):
+        raise ValueError("OPENAI_API_KEY not found.")
+    # Shared across uploads: one concurrency cap and one rate limit for all OCR
+    return transcribe_pages(file_content, pages, filename, partial=True)
+
+
+def _pdf_pages(file_content: bytes, filename: str):
+    """
+    Native text layer first: pages whose text layer is missing (scans) or
+    garbled (broken font mappings) are the only ones marked for vision OCR.
+    Returns (page texts, [(page number, OCR DPI)]).
+    """
+    with fitz.open(stream=file_content, filetype="pdf") as doc:
+        pages = []
+        ocr_pages = []
+        for page in doc:
+            text = _pdf_page_markdown(page)
+            if _page_needs_ocr(page, text):
+                ocr_pages.append((page.number, _ocr_dpi(page, text)))
+            pages.append(text)
+
+    print(f"📄 {filename}: {len(pages)} pages, {len(pages) - len(ocr_pages)} with a usable text layer, "
+          f"{len(ocr_pages)} sent to vision OCR")
+    return pages, ocr_pages
+
+
+def _join_pages(pages) -> str:
+    return "\n\n".join(page for page in pages if page)
+
+
+class ParsedDocument:
+    """
+    An upload parsed once. `pages` holds the native Markdown of each PDF page
+    or spreadsheet sheet (one entry for other files); `char_count` is the
+    cheap pre-OCR estimate used for validation. `text()` adds the pages that
+    need vision OCR, which runs at most once per page: a page that fails (on
+    its own or with the whole OCR call) keeps its native text and is retried
+    by the next `text()`, until `ocr_complete`.
+    """
+
+    def __init__(self, filename: str, content_hash: str, pages: list, ocr_pages: list = None, file_content: bytes = None):
+        self.filename = filename
+        self.content_hash = content_hash
+        self.pages = pages
+        self.ocr_pages = ocr_pages or []
+        self.native_text = _join_pages(pages)
+        # Only kept while OCR is pending
+        self._file_content = file_content if self.ocr_pages else None
+        self._ocr_text = {}
+        self._text = None if self.ocr_pages else self.native_text
+        self._lock = threading.Lock()
+
+    @property
+    def page_count(self) -> int:
+        return len(self.pages)
+
+    @property
+    def char_count(self) -> int:
+        return len(self._text if self._text is not None else self.native_text)
+
+    @property
+    def ocr_complete(self) -> bool:
+        return self._text is not None
+
+    def text(self) -> str:
+        with self._lock:
+            if self._text is not None:
+                return self._text
+            pending = [page for page in self.ocr_pages if page[0] not in self._ocr_text]
+            try:
+                self._ocr_text.update(_vision_ocr_pages(self._file_content, pending, self.filename))
+            except Exception as e:
+                # Missing key, unreadable PDF, no background loop: every pending page failed
+                logging.error(f"{self.filename}: OCR of {len(pending)} pages failed: {e}")
+            pages = list(self.pages)
+            for idx, text in self._ocr_text.items():
+                pages[idx] = text or ""
+            failed = [idx + 1 for idx, _ in self.ocr_pages if idx not in self._ocr_text]
+            if failed:
+                logging.warning(f"{self.filename}: OCR failed for pages {failed}; using their native text")
+                return _join_pages(pages)
+            self._text = _join_pages(pages)
+            self._file_content = None
+            return self._text
+
+
+class _ParsedDocumentCache:
+    """Small in-process TTL cache, so validate/estimate/extract of one upload share a parse"""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, document = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return document
+
+    def put(self, key, document: ParsedDocument):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, document)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+_parsed_documents = _ParsedDocumentCache(settings.ORG_PARSE_CACHE_SIZE, settings.ORG_PARSE_CACHE_TTL)
+
+
+def _parse(file_content: bytes, filename: str, content_hash: str) -> ParsedDocument:
+    file_ext = os.path.splitext(filename)[1].lower()
+    if file_ext == ".pdf":
+        pages, ocr_pages = _pdf_pages(file_content, filename)
+        return ParsedDocument(filename, content_hash, pages, ocr_pages, file_content)
+    if file_ext in [".docx", ".doc"]:
+        pages = [_docx_markdown(file_content)]
+    elif file_ext in [".xlsx", ".xls"]:
+        pages = _excel_markdown(file_content)
+    elif file_ext in [".csv"]:
+        pages = [_csv_markdown(file_content)]
+    else:
+        # Fallback for plain-text types
+        pages = [file_content.decode("utf-8", errors="ignore")]
+    return ParsedDocument(filename, content_hash, pages)
+
+
+def parse_document(file_content: bytes, filename: str, content_hash: str = None) -> ParsedDocument:
+    """
+    Parse an uploaded org file, or return the parse of the same bytes from the
+    last few minutes. Raises on unreadable files; OCR is deferred to `text()`.
+    """
+    content_hash = content_hash or content_sha256(file_content)
+    key = (content_hash, os.path.splitext(filename)[1].lower())
+    document = _parsed_documents.get(key)
+    if document is None:
+        document = _parse(file_content, filename, content_hash)
+        _parsed_documents.put(key, document)
+    return document
+
+
+def estimate_text_chars(file_content: bytes, filename: str, content_hash: str = None) -> int:
+    """Characters of the native text (before OCR), from the shared parse"""
+    try:
+        return parse_document(file_content, filename, content_hash).char_count
+    except Exception:
+        return 0
+
+
+def extract_text_from_file(file_content: bytes, filename: str, content_hash: str = None) -> str:
+    """
+    Extract Markdown text from an uploaded org file.
+
+    DOCX, XLSX/XLS and CSV are read natively (paragraphs, headings and tables
+    as Markdown). PDFs use PyMuPDF's text layer and table detection, and only
+    pages without a usable text layer go through GPT-4o vision.
+    """
+    start = time.perf_counter()
+
+    try:
+        full_text = parse_document(file_content, filename, content_hash).text()
+
+        logging.info(
+            f"✅ Extracted {filename} (chars={len(full_text)}, "
+            f"seconds={time.perf_counter() - start:.2f})"
+        )
+        return full_text
+
+    except Exception as e:
+        print(f"Error extracting text from {filename}: {str(e)}")
+        return ""
@@ -0,0 +1,145 @@
+"""
+Token-budgeted assembly of org system prompts.
+
+A rendered prompt (see prompt_builder.render_system_prompt) is split into the
+shared boilerplate before the document (role, guardrails), the agent identity
+(name, gender, who/why answers), the document block (company details, data
+summary), its FAQ knowledge base and the shared boilerplate after it (response
+guidelines, call rules). Several resources are merged with each boilerplate
+section kept once and the newest identity, and FAQ entries are dropped whole,
+lowest priority first, until the prompt fits the token budget.
+"""
+import logging
+import re
+from typing import List, Optional, Tuple
+
+from core.config import get_settings
+from rag.chunking import count_tokens
+
+settings = get_settings()
+
+IDENTITY_HEADER = "AGENT IDENTITY:"
+DOCUMENT_HEADER = "COMPANY DETAILS:"
+KNOWLEDGE_BASE_HEADER = "KNOWLEDGE BASE (FAQs - Use these to answer customer queries)\n"
+SUFFIX_PATTERN = re.compile(r"^═{20,}\nRESPONSE GUIDELINES", re.MULTILINE)
+# Each FAQ pass starts with one of these lines (see `faq_sets`); the model's own
+# "---" separators inside a pass are not block boundaries
+FAQ_SET_PRIMARY = "[FAQ SET: PRIMARY]"
+FAQ_SET_SUPPLEMENTARY = "[FAQ SET: SUPPLEMENTARY]"
+FAQ_SET_PATTERN = re.compile(r"^\[FAQ SET: (?:PRIMARY|SUPPLEMENTARY)\][ \t]*$", re.MULTILINE)
+FAQ_ENTRY_PATTERN = re.compile(
+    r"^[ \t]*(?:\*\*)?(?:Q(?:uestion)?[ \t]*\d*[ \t]*[:.)]|\d+[.)][ \t])",
+    re.MULTILINE | re.IGNORECASE,
+)
+
+
+def faq_sets(passes: List[str]) -> str:
+    """FAQ passes under their set markers: the first is primary, later ones supplementary"""
+    passes = [faqs.strip() for faqs in passes if faqs and faqs.strip()]
+    return "\n\n".join(
+        f"{FAQ_SET_PRIMARY if i == 0 else FAQ_SET_SUPPLEMENTARY}\n{faqs}" for i, faqs in enumerate(passes)
+    )
+
+
+class _ParsedPrompt:
+    def __init__(self, prompt: str):
+        doc_start = prompt.find(DOCUMENT_HEADER)
+        kb_start = prompt.find(KNOWLEDGE_BASE_HEADER, max(doc_start, 0))
+        suffix = SUFFIX_PATTERN.search(prompt, kb_start) if kb_start >= 0 else None
+        if doc_start < 0 or suffix is None:
+            # Not a rendered org prompt: kept whole, never trimmed
+            self.prefix, self.identity, self.document, self.suffix = "", "", prompt.strip() + "\n\n", ""
+            self.blocks: List[List[str]] = []
+            return
+        # Prompts rendered before the identity section have it inside the prefix
+        identity_start = prompt.rfind(IDENTITY_HEADER, 0, doc_start)
+        prefix_end = identity_start if identity_start >= 0 else doc_start
+        faqs_start = kb_start + len(KNOWLEDGE_BASE_HEADER)
+        self.prefix = prompt[:prefix_end]
+        self.identity = prompt[prefix_end:doc_start]
+        self.document = prompt[doc_start:faqs_start] + "\n"
+        self.suffix = prompt[suffix.start():]
+        # Without set markers (older prompts) the whole knowledge base is one block
+        self.blocks = [_faq_entries(block) for block in FAQ_SET_PATTERN.split(prompt[faqs_start:suffix.start()])]
+        self.blocks = [block for block in self.blocks if block]
+
+
+def _faq_entries(block: str) -> List[str]:
+    """Q/A entries of a FAQ block, each with its original text; a preamble is its own entry"""
+    starts = [match.start() for match in FAQ_ENTRY_PATTERN.finditer(block)]
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+    entries = [block[start:end].strip() for start, end in zip(starts, starts[1:] + [len(block)])]
+    return [entry for entry in entries if entry]
+
+
+def _render(prefixes: List[str], identity: str, documents: List[Tuple[str, List[List[str]]]], suffixes: List[str]) -> str:
+    parts = list(prefixes) + [identity]
+    for document, blocks in documents:
+        faqs = faq_sets(["\n\n".join(entries) for entries in blocks if entries])
+        parts.append(f"{document}{faqs}\n\n" if faqs else document)
+    parts.extend(suffixes)
+    return "".join(parts)
+
+
+def assemble_prompt(prompts: List[str], max_tokens: Optional[int] = None) -> Tuple[str, int]:
+    """
+    Merge rendered prompts into one system prompt within `max_tokens`
+    (default ORG_PROMPT_MAX_TOKENS). Returns (prompt, token count).
+
+    Boilerplate identical across prompts is kept once, and only the identity
+    of the last (newest) prompt that has one. FAQ entries are dropped
+    whole in a fixed order: supplementary blocks before primary ones, older
+    resources before newer ones, last entry first. A single prompt that
+    already fits is returned unchanged.
+    """
+    max_tokens = max_tokens or settings.ORG_PROMPT_MAX_TOKENS
+    prompts = [prompt for prompt in prompts if prompt]
+    if not prompts:
+        return "", 0
+    if len(prompts) == 1:
+        tokens = count_tokens(prompts[0])
+        if tokens <= max_tokens:
+            return prompts[0], tokens
+
+    parsed = [_ParsedPrompt(prompt) for prompt in prompts]
+    prefixes = list(dict.fromkeys(p.prefix for p in parsed if p.prefix))
+    suffixes = list(dict.fromkeys(p.suffix for p in parsed if p.suffix))
+    identities = [p.identity for p in parsed if p.identity]
+    identity = identities[-1] if identities else ""
+    documents = [(p.document, [list(entries) for entries in p.blocks]) for p in parsed]
+
+    prompt = _render(prefixes, identity, documents, suffixes)
+    tokens = count_tokens(prompt)
+    if tokens <= max_tokens:
+        return prompt, tokens
+
+    # (resource, block, entry) in drop order
+    candidates = sorted(
+        (
+            (resource, block, entry)
+            for resource, (_, blocks) in enumerate(documents)
+            for block, entries in enumerate(blocks)
+            for entry in range(len(entries))
+        ),
+        key=lambda c: (-c[1], c[0], -c[2]),
+    )
+    # Entry token counts are (nearly) additive: drop down to the estimate, then verify
+    dropped = 0
+    excess = tokens - max_tokens
+    while tokens > max_tokens and dropped < len(candidates):
+        while excess > 0 and dropped < len(candidates):
+            resource, block, entry = candidates[dropped]
+            excess -= count_tokens(documents[resource][1][block][entry]) + 1
+            documents[resource][1][block][entry] = None
+            dropped += 1
+        pruned = [(document, [[e for e in entries if e is not None] for entries in blocks]) for document, blocks in documents]
+        prompt = _render(prefixes, identity, pruned, suffixes)
+        tokens = count_tokens(prompt)
+        excess = tokens - max_tokens
+
+    if tokens > max_tokens:
+        logging.warning(f"System prompt is {tokens} tokens after dropping every FAQ entry (budget {max_tokens})")
+    else:
+        logging.info(f"System prompt trimmed to {tokens} tokens: dropped {dropped} of {len(candidates)} FAQ entries")
+    return prompt, tokens
@@ -1,13 +1,30 @@
 from __future__ import annotations
-import json, re
-from typing import Any, Dict, List, Tuple
-from openai import OpenAI
+import asyncio, json, logging, time
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+from openai import AsyncOpenAI
+from core.background_loop import run_sync
+from services.content_cache import content_sha256, get_cached, set_cached, stage_cache_name
+from services.prompt_assembler import assemble_prompt, faq_sets
 from dotenv import load_dotenv
 import os
 
 # Load environment variables
 load_dotenv()
 
+# Document-only LLM stages; their outputs are cached per document and rendered
+# into the system prompt together with the per-config welcome message / agent name
+PROMPT_STAGES = ("analysis", "faqs", "summary")
+
+# First message of every stage request. The document leads and is identical
+# across stages, so after the first call the provider's prompt cache serves it
+# (OpenAI caches shared prefixes of 1024+ tokens automatically).
+MAX_DOCUMENT_CHARS = 40000
+DOCUMENT_PREFIX = """You turn one business document into knowledge for a voice sales agent. \
+Each request about the document below asks for one part of that work.
+
+DOCUMENT:
+{document}"""
+
 # ────────────────────────────────────────────────────────────────────────────────
 # Public API
 # ────────────────────────────────────────────────────────────────────────────────
@@ -18,7 +35,8 @@ def build_universal_sales_system_message(
     welcome_message: str | None = "",
     model: str = "gpt-4o",
     agent_name: str | None = "SalesMate",
-    agent_gender: str | None = "male"
+    agent_gender: str | None = "male",
+    content_hash: str | None = None
 ) -> str:
     """
     Analyze extracted document content and generate intelligent FAQs for a voice agent.
@@ -30,23 +48,384 @@ def build_universal_sales_system_message(
     3. Generates intelligent FAQs from the data
     4. Creates a clean, queryable knowledge base
     
+    The LLM stages depend only on the document and are cached by `content_hash`
+    (sha256 of the uploaded file; defaults to the hash of the text), so only the
+    stages missing from the cache are run. The welcome message, agent name and
+    gender only enter `render_system_prompt`.
+    
     Returns the fully rendered system prompt.
     """
-
-    api_key = os.getenv('OPENAI_API_KEY')
-    if not api_key:
-        raise ValueError("OPENAI_API_KEY environment variable is not set.")
     print("welcome_message:", welcome_message)
+    stages = build_prompt_stages(combined_text, model=model, content_hash=content_hash)
+    return render_system_prompt(
+        stages,
+        welcome_message=welcome_message,
+        agent_name=agent_name,
+        agent_gender=agent_gender
+    )
+
+
+def build_prompt_stages(
+    combined_text: str,
+    *,
+    model: str = "gpt-4o",
+    content_hash: str | None = None
+) -> Dict[str, Any]:
+    """
+    Run (or load from cache) the document stages: analysis JSON, FAQ block and
+    data summary. Sync wrapper around `build_prompt_stages_async`.
+    """
+    content_hash = content_hash or content_sha256(combined_text.encode("utf-8"))
+    stages = get_cached_stages(content_hash, model=model)
+    if stages is not None:
+        print(f"♻️ Reusing cached prompt stages for {content_hash[:12]}")
+        return stages
+    return run_sync(build_prompt_stages_async(combined_text, model=model, content_hash=content_hash))
+
+
+async def build_prompt_stages_async(
+    combined_text: str,
+    *,
+    model: str = "gpt-4o",
+    content_hash: str | None = None
+) -> Dict[str, Any]:
+    """
+    The stage DAG: analysis first, then the FAQs and the summary concurrently
+    (the FAQ generation passes also run concurrently). Every node is
+    checkpointed as it completes, so after a failure only unfinished nodes
+    are re-run. Must run on the background loop (see `build_prompt_stages`).
+    """
+    content_hash = content_hash or content_sha256(combined_text.encode("utf-8"))
+    llm = _StageRunner(_get_client(), combined_text, model, content_hash)
+    started = time.perf_counter()
+    try:
+        analysis = await llm.stage("analysis", lambda: _analyze_document(llm))
+        faqs, summary = await _gather_stages(
+            llm.stage("faqs", lambda: _generate_faqs(llm, analysis)),
+            llm.stage("summary", lambda: _generate_summary(llm, analysis)),
+        )
+    finally:
+        logging.info(
+            f"Prompt stages for {content_hash[:12]} in {time.perf_counter() - started:.1f}s: "
+            + ", ".join(f"{name} {timing}" for name, timing in llm.timings.items())
+            + f"; prompt tokens {llm.prompt_tokens} ({llm.cached_tokens} from prompt cache)"
+        )
+    return {"analysis": analysis, "faqs": faqs, "summary": summary}
+
+
+def get_cached_stages(content_hash: str, *, model: str = "gpt-4o", partial: bool = False) -> Dict[str, Any] | None:
+    """
+    Cached stage outputs for a document. Returns None unless every stage is
+    cached, or whatever is cached when `partial` is set.
+    """
+    stages = {}
+    for stage in PROMPT_STAGES:
+        value = get_cached(content_hash, stage_cache_name(stage, model))
+        if value is not None:
+            stages[stage] = value
+    if partial or len(stages) == len(PROMPT_STAGES):
+        return stages
+    return None
+
+
+def render_system_prompt(
+    stages: Dict[str, Any],
+    *,
+    welcome_message: str | None = "",
+    agent_name: str | None = "SalesMate",
+    agent_gender: str | None = "male"
+) -> str:
+    """Fill the system prompt template from stage outputs; only the agent name may need a (cached) model call"""
+    analysis = stages["analysis"]
+    # One entry per FAQ pass; cached before passes were kept apart, a single string
+    faq_passes = stages["faqs"] if isinstance(stages["faqs"], list) else [stages["faqs"]]
+    generated_faqs = faq_sets(faq_passes)
+    data_summary = stages["summary"]
+
+    # ═══════════════════════════════════════════════════════════════════════════
+    # STEP 4: Build Final System Prompt
+    # ═══════════════════════════════════════════════════════════════════════════
+    print("📝 Step 4: Building final system prompt...")
+    # Welcome message first (it is what the caller hears), then the document, then the default
+    final_agent_name = agent_name_from_welcome(welcome_message) or analysis.get('agent_name') or agent_name
+    
+    # Handle company name - only use if actually found
+    company_name = analysis.get("company_name")
+    company_known = company_name is not None and company_name not in ["Unknown", ""]
     
-    client = OpenAI(api_key=api_key)
+    industry = analysis.get('industry', 'general_sales')
+    industry_display = industry.replace('_', ' ').title()
+    
+    # Prepare identity responses based on whether company is known
+    if company_known:
+        identity_who = f"Main {final_agent_name} hoon, {company_name} ki taraf se aapki madad ke liye."
+        identity_why = f"Main {final_agent_name} hoon aur {company_name} ki taraf se aapko jaankari aur madad dene ke liye call kar raha hoon."
+    else:
+        identity_who = f"Main {final_agent_name} hoon, aapki madad ke liye yahan hoon."
+        identity_why = f"Main {final_agent_name} hoon aur aapko jaankari aur madad dene ke liye call kar raha hoon."
+    
+    # Build company details section - only include what was found
+    company_details = f"- Company: {company_name}\n- Industry: {industry_display}"
+    if analysis.get('company_address'):
+        company_details += f"\n- Address: {analysis['company_address']}"
+    if analysis.get('company_contact'):
+        company_details += f"\n- Contact: {analysis['company_contact']}"
+    if analysis.get('company_description'):
+        company_details += f"\n- About: {analysis['company_description']}"
+    
+    SYSTEM_PROMPT = f"""You are a professional, Hindi-speaking sales assistant for voice-based customer interactions.
+
+═══════════════════════════════════════════════════════════════════════════════
+CRITICAL GUARDRAILS (MUST FOLLOW)
+═══════════════════════════════════════════════════════════════════════════════
+- You can ONLY use information from the KNOWLEDGE BASE and DATA SUMMARY below.
+- NEVER invent, guess, or hallucinate ANY information (names, prices, features, etc.).
+- If you don't know something, say so politely. Do NOT make things up.
+- If company name is not specified, refer to it as "humare yahan" or "humare organization".
+
+SOURCE PRIORITY (Follow this order):
+1. FIRST: Check KNOWLEDGE BASE (FAQs) for exact or similar question → Use that answer
+2. SECOND: Check DATA SUMMARY for relevant information → Formulate answer from it
+3. THIRD: If not found in either → Say "Maaf kijiye, yeh jaankari mere paas nahi hai"
+   NEVER go to Step 4 (making things up). There is no Step 4.
+
+AGENT IDENTITY:
+- Your name is {final_agent_name}. You are a {agent_gender} representative assisting customers.
+- "Who are you?" / "Aap kaun ho?": "{identity_who}"
+- "Why did you call?" / "Call kyun kiya?": "{identity_why}"
+
+COMPANY DETAILS:
+{company_details}
+
+═══════════════════════════════════════════════════════════════════════════════
+DATA SUMMARY (Use this for quick reference)
+
+{data_summary}
+
+═══════════════════════════════════════════════════════════════════════════════
+KNOWLEDGE BASE (FAQs - Use these to answer customer queries)
+
+{generated_faqs}
+
+═══════════════════════════════════════════════════════════════════════════════
+RESPONSE GUIDELINES
+═══════════════════════════════════════════════════════════════════════════════
+
+1. LANGUAGE & TONE: Natural Hindi/Hinglish, friendly, conversational. Use respectful fillers (Ji, Sir/Ma'am). Avoid jargon unless asked. Adapt terminology to the industry (e.g., "policy" for insurance, "treatment" for healthcare, "course" for education).
+
+2. ANSWER STYLE: Keep answers concise (2-4 sentences). Address the question first, add specifics (prices/features/plans/eligibility). Offer 2-3 best options from the knowledge base, then ask if more detail is needed.
+
+   HOW TO FIND ANSWERS:
+   a) Search FAQs above for exact or similar question → Use that answer verbatim
+   b) If not in FAQs, check DATA SUMMARY → Formulate answer from it
+   c) If not in either → Politely say you don't have that information
+   d) NEVER combine general knowledge with document data
+
+3. STRICT KNOWLEDGE BOUNDARY (CRITICAL):
+   - ONLY answer from the provided KNOWLEDGE BASE and DATA SUMMARY above.
+   - If information is NOT in the knowledge base, say: "Maaf kijiye, yeh jaankari mere paas nahi hai. Kya main kisi aur cheez mein madad kar sakta hoon?"
+   - NEVER invent, assume, or hallucinate company names, product names, prices, features, or any other details.
+   - NEVER use general knowledge or external information.
+   - If asked about something not covered, politely redirect to what you DO know.
+
+4. BACKCHANNELS & INTERRUPTIONS: Treat "haan/hmm/acha/theek hai/ok" as backchannel only. If user interrupts with a new question, drop the old thread and answer the new one. If repeated interruptions, keep replies shorter and focused on the last ask.
+
+5. ABUSIVE LANGUAGE: Stay calm; give one polite warning, then a firmer warning; stop only if abuse continues.
+
+6. BACKGROUND NOISE (Semantic VAD): Ignore TV/other voices/short fillers unless it is a clear question. Focus on the primary caller; wait if uncertain.
+
+7. IDENTITY / COMPANY QUESTIONS:
+   - Answer "who are you" / "why did you call" as given under AGENT IDENTITY.
+   - If asked company details you don't know: "Maaf kijiye, yeh specific detail mere paas nahi hai."
+
+8. INDUSTRY-SPECIFIC COURTESY:
+   - Healthcare: Show empathy, use terms like "treatment", "consultation", "doctor"
+   - Insurance: Be clear about coverage, use terms like "policy", "premium", "claim"
+   - Banking: Be precise about numbers, use terms like "account", "loan", "interest rate"
+   - Education: Be encouraging, use terms like "course", "admission", "placement"
+   - Travel: Be enthusiastic, use terms like "package", "destination", "itinerary"
+   - Real Estate: Be informative, use terms like "property", "location", "BHK", "possession"
+   - Technology: Be helpful, use terms like "software", "features", "subscription", "support"
+   - Retail/E-commerce: Be friendly, use terms like "product", "offer", "delivery", "return"
+   - Fitness: Be motivating, use terms like "membership", "trainer", "workout", "health"
+   - Food: Be warm, use terms like "menu", "order", "delivery", "taste"
+   - General: Adapt to context, stay professional and helpful
+
+9. UNCERTAINTY HANDLING:
+   - If you're not 100% sure about an answer, say: "Iske baare mein main confirm karke batata hoon" instead of guessing.
+   - Never make up statistics, percentages, or specific numbers not in the knowledge base.
+   
+10. CRITICAL: OUTBOUND CALL CONTEXT:
+- **YOU are calling the customer** - this is an OUTBOUND sales call, NOT an inbound inquiry.
+- The customer did NOT call you - YOU initiated this call to present your products/services.
+- Act as a proactive sales agent who **showcases and presents**, NOT someone who asks "aapko kya chahiye?" or "kaise madad kar sakta hoon?"
+
+11. SALES APPROACH - Proactive Outbound Calling:
+   **YOUR ROLE:**
+   1. **Present/Showcase**: Proactively introduce products, services, and value propositions
+   2. **Assist with Doubts**: Address questions/concerns helpfully
+   3. **Guide Forward**: Lead the conversation toward the offer
+   
+   **DO THIS:**
+   - Lead with 1-2 key benefits + 1 clear offer
+   - Use showcase language:
+     * "Main aapko batana chahta hoon ki humare paas..." (I want to tell you about...)
+     * "Ek baat jo aapke liye helpful ho sakti hai..." (Something helpful for you...)
+     * "Hum aapko ye offer de rahe hain..." (We're offering you this...)
+   - Ask ONE specific question (budget/timeframe) instead of open-ended queries
+   - After answering doubts, immediately continue presenting value
+   
+   **DO NOT:**
+   - Ask generic questions: "Kya aapko koi help chahiye?" or "Aap kya janna chahte hain?"
+   - Wait for customer to express needs - YOU drive the conversation
+   - Act like support staff waiting for requests
+═══════════════════════════════════════════════════════════════════════════════
+CALL TERMINATION RULES
+
+You must not end a call unless intent is clear. Never hang up due to silence, background noise, or confusion.
+
+WHEN TO CONSIDER ENDING (detect intent):
+- Explicit goodbye/termination (e.g., "bye", "bas", "disconnect", "khatam", "nothing else").
+- A clear negative ("no / nahi / no thank you") that directly answers your closing-type question.
+
+MANDATORY CONFIRMATION (always before hangup):
+- Ask: "Theek hai. Kya main call abhi samaapt kar doon?" (or EN: "Would you like me to disconnect the call now?").
+- Terminate only if the next reply is clearly affirmative ("haan/yes/please disconnect/ji").
+
+NEVER terminate when:
+- "No / nahi" is about topic preference (not end intent).
+- There is silence, background noise, partial speech, or ambiguity.
+- Caller asks to repeat/clarify or seems engaged/undecided.
+
+DECISION RULE:
+- If uncertain at any step, do NOT terminate; continue helping.
+
+EXAMPLE — Correct:
+You: "Is there anything else I can help you with?"
+User: "No, that's all. Thank you."
+You: "Theek hai. Kya main call abhi samaapt kar doon?"
+User: "Haan, please."
+→ Then give a polite goodbye and end.
+
+EXAMPLE — Do NOT end:
+User: "No, I want premium plans." (topic preference) → Continue conversation.
+"""
+
+    # Enforce the token budget by dropping whole FAQ entries, supplementary ones first
+    SYSTEM_PROMPT, prompt_tokens = assemble_prompt([SYSTEM_PROMPT])
+
+    print(f"\n✅ Final system message length: {len(SYSTEM_PROMPT)} characters ({prompt_tokens} tokens)")
+    print(f"📌 Company: {company_name} {'(detected)' if company_known else '(fallback - not detected)'}")
+    print(f"📌 Industry: {industry_display}")
+    print(f"📌 Data Type: {analysis.get('data_type', 'unknown')}")
+    
+    return SYSTEM_PROMPT
+
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Stages
+# ────────────────────────────────────────────────────────────────────────────────
+
+_client: AsyncOpenAI | None = None
+
+
+def _get_client() -> AsyncOpenAI:
+    """Shared async client; lives on the background loop like the OCR scheduler's"""
+    global _client
+    if _client is None:
+        api_key = os.getenv('OPENAI_API_KEY')
+        if not api_key:
+            raise ValueError("OPENAI_API_KEY environment variable is not set.")
+        _client = AsyncOpenAI(api_key=api_key)
+    return _client
 
+
+class _Uncached:
+    """Stage result that must not be checkpointed (a fallback rather than a real answer)"""
+
+    def __init__(self, value: Any):
+        self.value = value
+
+
+class _StageRunner:
+    """
+    Runs the stage nodes for one document. `stage` checkpoints a node's output
+    in the content cache and records its latency; `complete` sends one request
+    behind the shared document prefix. Once a node returns `_Uncached`, nothing
+    after it is checkpointed either, as it was built on the fallback.
+    """
+
+    def __init__(self, client: AsyncOpenAI, document: str, model: str, content_hash: str):
+        self.client = client
+        self.document = document[:MAX_DOCUMENT_CHARS]
+        self.model = model
+        self.content_hash = content_hash
+        self.prefix = DOCUMENT_PREFIX.format(document=self.document)
+        self.timings: Dict[str, str] = {}
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.checkpointing = True
+
+    async def stage(self, name: str, run: Callable[[], Awaitable[Any]]) -> Any:
+        value = get_cached(self.content_hash, stage_cache_name(name, self.model))
+        if value is not None:
+            self.timings[name] = "cached"
+            return value
+        started = time.perf_counter()
+        try:
+            value = await run()
+        except Exception:
+            self.timings[name] = f"failed after {time.perf_counter() - started:.1f}s"
+            raise
+        self.timings[name] = f"{time.perf_counter() - started:.1f}s"
+        if isinstance(value, _Uncached):
+            value = value.value
+            self.checkpointing = False
+            self.timings[name] += " (fallback, not cached)"
+        if self.checkpointing:
+            set_cached(self.content_hash, stage_cache_name(name, self.model), value)
+        return value
+
+    async def complete(self, name: str, role: str, prompt: str, *, temperature: float, max_tokens: int) -> str:
+        response = await self.client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": self.prefix},
+                {"role": "system", "content": role},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=temperature,
+            max_tokens=max_tokens,
+            # Routes this document's requests to the same prompt cache
+            extra_body={"prompt_cache_key": f"org-doc-{self.content_hash[:32]}"}
+        )
+        usage = response.usage
+        if usage:
+            details = getattr(usage, "prompt_tokens_details", None)
+            cached = (getattr(details, "cached_tokens", 0) or 0) if details else 0
+            self.prompt_tokens += usage.prompt_tokens
+            self.cached_tokens += cached
+            logging.info(f"Prompt stage {name}: {usage.prompt_tokens} prompt tokens, {cached} cached")
+        return (response.choices[0].message.content or "").strip()
+
+
+async def _gather_stages(*stages: Awaitable[Any]) -> List[Any]:
+    """Run independent stages concurrently; all finish (and checkpoint) before the first error is raised"""
+    results = await asyncio.gather(*stages, return_exceptions=True)
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    return results
+
+
+async def _analyze_document(llm: _StageRunner) -> Dict[str, Any]:
     # ═══════════════════════════════════════════════════════════════════════════
     # STEP 1: Analyze Document Structure & Extract Company Info
     # ═══════════════════════════════════════════════════════════════════════════
     print("🔍 Step 1: Analyzing document structure and industry...")
     
-    analysis_prompt = f"""
-    You are an expert at analyzing business documents. Analyze the following document STRICTLY based on what is written.
+    analysis_prompt = """
+    You are an expert at analyzing business documents. Analyze the document above STRICTLY based on what is written.
 
     RULES:
     - ONLY extract information that is EXPLICITLY written in the document.
@@ -64,14 +443,8 @@ def build_universal_sales_system_message(
     
     4. HAS_EXPLICIT_FAQS: Set true ONLY if you see "FAQ", "Q:", "Q&A", "Frequently Asked", numbered questions with answers.
 
-    DOCUMENT:
-    {combined_text[:40000]}
-    
-    ADDITIONAL CONTEXT (if any):
-    {welcome_message if welcome_message else "None provided"}
-
     Return a JSON object with ONLY the fields you can confidently extract:
-    {{
+    {
         "industry": "detected industry or general_sales",
         "company_name": "only if found",
         "company_address": "only if found",
@@ -82,29 +455,22 @@ def build_universal_sales_system_message(
         "key_entities": ["list of main fields found"],
         "has_explicit_faqs": true/false,
         "data_summary": "brief summary",
-        "agent_name": "Priority: extracted from ADDITIONAL CONTEXT, if not found then from document then default to '{agent_name}' if not found"
-    }}
+        "agent_name": "only if the document names an agent/representative"
+    }
     IMPORTANT: 
     - Omit any field where you would have to guess. Only include what is clearly written.
-    - For "agent_name" field (ALWAYS include):
-      * FIRST: Check ADDITIONAL CONTEXT (welcome message) for agent/representative name
-      * SECOND: Check DOCUMENT for agent/representative name in signature, contact, or introduction
-      * THIRD: If none found, use default "{agent_name}"
-      
-    - The "agent_name" field must ALWAYS be included in the response with one of the above values.
+    - For "agent_name": check the DOCUMENT for an agent/representative name in a signature, contact, or introduction. Omit it if none is found.
     """
 
-    analysis_resp = client.chat.completions.create(
-        model=model,
-        messages=[
-            {"role": "system", "content": "You are a business document analysis expert. Return only valid JSON."},
-            {"role": "user", "content": analysis_prompt}
-        ],
+    analysis_resp = await llm.complete(
+        "analysis",
+        "You are a business document analysis expert. Return only valid JSON.",
+        analysis_prompt,
         temperature=0.1,
         max_tokens=1000
     )
     
-    analysis_json = _clean_json_response(analysis_resp.choices[0].message.content)
+    analysis_json = _clean_json_response(analysis_resp)
     try:
         analysis = json.loads(analysis_json)
         
@@ -125,16 +491,21 @@ def build_universal_sales_system_message(
         if industry == 'general_sales':
             print("ℹ️ INFO: Using general sales approach (industry not specifically detected).")
     except:
-        analysis = {
+        print("⚠️ Could not parse analysis, using defaults")
+        # Not cached, so the next build of this document analyzes it again
+        return _Uncached({
             "industry": "general_sales",
             "data_type": "unknown", 
             "business_type": "other",
             "key_entities": [], 
             "has_explicit_faqs": False,
             "data_summary": ""
-        }
-        print("⚠️ Could not parse analysis, using defaults")
+        })
+
+    return analysis
 
+
+async def _generate_faqs(llm: _StageRunner, analysis: Dict[str, Any]) -> List[str]:
     # ═══════════════════════════════════════════════════════════════════════════
     # STEP 2: Generate or Extract Intelligent FAQs (Industry-Adaptive)
     # ═══════════════════════════════════════════════════════════════════════════
@@ -146,9 +517,9 @@ def build_universal_sales_system_message(
         has_faqs = True
         
     if has_faqs:
-        print(f"   -> Explicit FAQs detected. Extracting as-is...")
-        faq_processing_prompt = f"""
-Extract ALL FAQ/Q&A content from the document below.
+        print("   -> Explicit FAQs detected. Extracting as-is...")
+        faq_processing_prompt = """
+Extract ALL FAQ/Q&A content from the document above.
 
 RULES:
 1. Copy the questions and answers EXACTLY as written in the document.
@@ -157,35 +528,26 @@ RULES:
 4. Include ALL FAQs found, don't skip any.
 5. If FAQs are in English, you may translate to Hindi/Hinglish but keep the meaning EXACT.
 
-DOCUMENT:
-{combined_text[:40000]}
-
 OUTPUT: Just paste all the FAQs as they appear. Preserve original formatting.
 """
-        faq_resp = client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": "Extract FAQ content exactly as written. Do not modify or embellish."},
-                {"role": "user", "content": faq_processing_prompt}
-            ],
+        generated_faqs = await llm.stage("faq_extract", lambda: llm.complete(
+            "faq_extract",
+            "Extract FAQ content exactly as written. Do not modify or embellish.",
+            faq_processing_prompt,
             temperature=0.0,
             max_tokens=8000
-        )
-        generated_faqs = faq_resp.choices[0].message.content.strip()
+        ))
         
         # If document has substantial additional data beyond FAQs, supplement with generated FAQs
         if has_faqs and analysis.get("data_type") in ["mixed", "brochure", "pricing_catalog", "other"]:
-            if len(combined_text) > 15000:
+            if len(llm.document) > 15000:
                 print("   -> Document has additional data. Generating supplementary FAQs...")
             supplement_prompt = f"""
-The document has existing FAQs (shown below). Generate ADDITIONAL FAQs from OTHER data in the document that is NOT covered by existing FAQs.
+The document above has existing FAQs (shown below). Generate ADDITIONAL FAQs from OTHER data in the document that is NOT covered by existing FAQs.
 
 EXISTING FAQs:
 {generated_faqs}
 
-FULL DOCUMENT:
-{combined_text[:35000]}
-
 RULES:
 1. Generate 40-60 NEW FAQs covering data NOT in existing FAQs.
 2. Use ONLY data explicitly present in the document.
@@ -194,17 +556,16 @@ RULES:
 
 ---
 """
-            supp_resp = client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": "Generate supplementary FAQs from document data not covered by existing FAQs."},
-                    {"role": "user", "content": supplement_prompt}
-                ],
+            supplementary = await llm.stage("faq_supplement", lambda: llm.complete(
+                "faq_supplement",
+                "Generate supplementary FAQs from document data not covered by existing FAQs.",
+                supplement_prompt,
                 temperature=0.1,
                 max_tokens=1000
-            )
-            supplementary = supp_resp.choices[0].message.content.strip()
-            generated_faqs = f"{generated_faqs}\n\n---\n\n{supplementary}"
+            ))
+            faq_passes = [generated_faqs, supplementary]
+        else:
+            faq_passes = [generated_faqs]
 
     else:
         print("   -> No explicit FAQs. Generating from document data...")
@@ -215,7 +576,7 @@ RULES:
         
         industry = analysis.get('industry', 'unknown')
         
-        # PASS 1: Core Offerings & Pricing
+        # PASS 1: Core Offerings & Pricing (independent of pass 2; both run concurrently)
         print(f"      -> Pass 1: {industry.title()} Offerings & Pricing...")
         
         # Industry-specific question templates
@@ -328,8 +689,7 @@ You are a sales expert creating FAQs from document data. Generate FAQs focusing
 
 INDUSTRY: {industry.upper()}
 
-DOCUMENT DATA:
-{combined_text[:40000]}
+DOCUMENT DATA: the document above.
 
 CRITICAL RULES:
 1. Generate 40-70 detailed FAQs covering all aspects of offerings and pricing.
@@ -351,16 +711,6 @@ A: [Answer in Hindi/Hinglish with EXACT data from document]
 
 OUTPUT: Only FAQs. No introductions. Generate as many as the document data supports (aim for 50-70).
 """
-        resp_1 = client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": f"You are a {industry} industry expert. Output only the FAQs."},
-                {"role": "user", "content": prompt_pass_1}
-            ],
-            temperature=0.1,
-            max_tokens=500
-        )
-        faqs_1 = resp_1.choices[0].message.content.strip()
 
         # PASS 2: Process, Features & Specifications
         print("      -> Pass 2: Process, Features & Terms...")
@@ -370,8 +720,7 @@ You are a sales expert creating FAQs from document data. Generate FAQs focusing
 
 INDUSTRY: {industry.upper()}
 
-DOCUMENT DATA:
-{combined_text[:40000]}
+DOCUMENT DATA: the document above.
 
 CRITICAL RULES:
 1. Generate 50-70 detailed FAQs covering processes, eligibility, and terms.
@@ -399,29 +748,28 @@ A: [Answer in Hindi/Hinglish with EXACT data from document]
 
 OUTPUT: Only FAQs. No introductions. Generate as many as the document data supports (aim for 50-70).
 """
-        resp_2 = client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": f"You are a {industry} industry expert. Output only the FAQs."},
-                {"role": "user", "content": prompt_pass_2}
-            ],
-            temperature=0.1,
-            max_tokens=500
+        expert = f"You are a {industry} industry expert. Output only the FAQs."
+        faqs_1, faqs_2 = await _gather_stages(
+            llm.stage("faq_pass1", lambda: llm.complete("faq_pass1", expert, prompt_pass_1, temperature=0.1, max_tokens=500)),
+            llm.stage("faq_pass2", lambda: llm.complete("faq_pass2", expert, prompt_pass_2, temperature=0.1, max_tokens=500)),
         )
-        faqs_2 = resp_2.choices[0].message.content.strip()
 
-        generated_faqs = f"{faqs_1}\n\n---\n\n{faqs_2}"
+        faq_passes = [faqs_1, faqs_2]
 
     
-    print(f"✅ Generated/Extracted FAQs ({len(generated_faqs)} chars)")
+    print(f"✅ Generated/Extracted FAQs ({sum(len(faqs) for faqs in faq_passes)} chars in {len(faq_passes)} passes)")
+
+    return faq_passes
 
+
+async def _generate_summary(llm: _StageRunner, analysis: Dict[str, Any]) -> str:
     # ═══════════════════════════════════════════════════════════════════════════
     # STEP 3: Generate Data Summary for Quick Reference
     # ═══════════════════════════════════════════════════════════════════════════
     print("📊 Step 3: Generating industry-adaptive data summary...")
     
     summary_prompt = f"""
-    Based on this {analysis.get('industry', 'business')} industry data, create a CONCISE summary that covers:
+    Based on the {analysis.get('industry', 'business')} industry data in the document above, create a CONCISE summary that covers:
 
     1. KEY OFFERINGS: Main products/services/plans/packages
     2. PRICE RANGE: Minimum to maximum prices (if applicable)
@@ -430,9 +778,6 @@ OUTPUT: Only FAQs. No introductions. Generate as many as the document data suppo
     5. PROCESS/TIMELINE: How to avail, application process, or delivery timelines
     6. KEY HIGHLIGHTS: 3-5 notable offers, benefits, or unique selling points
 
-    DATA:
-    {combined_text[:40000]}
-
     Format your response as a structured summary (NOT a table), like:
 
     **Key Offerings:** ...
@@ -446,198 +791,16 @@ OUTPUT: Only FAQs. No introductions. Generate as many as the document data suppo
     - [Unique selling point or benefit]
     """
 
-    summary_resp = client.chat.completions.create(
-        model=model,
-        messages=[
-            {"role": "system", "content": "You are a business data analyst. Create concise, structured summaries."},
-            {"role": "user", "content": summary_prompt}
-        ],
+    data_summary = await llm.complete(
+        "summary",
+        "You are a business data analyst. Create concise, structured summaries.",
+        summary_prompt,
         temperature=0.1,
         max_tokens=1500
     )
-    
-    data_summary = summary_resp.choices[0].message.content.strip()
     print(f"✅ Generated summary ({len(data_summary)} chars)")
 
-    # ═══════════════════════════════════════════════════════════════════════════
-    # STEP 4: Build Final System Prompt
-    # ═══════════════════════════════════════════════════════════════════════════
-    print("📝 Step 4: Building final system prompt...")
-    final_agent_name = analysis.get('agent_name', agent_name)
-    
-    # Handle company name - only use if actually found
-    company_name = analysis.get("company_name")
-    company_known = company_name is not None and company_name not in ["Unknown", ""]
-    
-    industry = analysis.get('industry', 'general_sales')
-    industry_display = industry.replace('_', ' ').title()
-    
-    # Prepare identity responses based on whether company is known
-    if company_known:
-        identity_who = f"Main {final_agent_name} hoon, {company_name} ki taraf se aapki madad ke liye."
-        identity_why = f"Main {final_agent_name} hoon aur {company_name} ki taraf se aapko jaankari aur madad dene ke liye call kar raha hoon."
-    else:
-        identity_who = f"Main {final_agent_name} hoon, aapki madad ke liye yahan hoon."
-        identity_why = f"Main {final_agent_name} hoon aur aapko jaankari aur madad dene ke liye call kar raha hoon."
-    
-    # Build company details section - only include what was found
-    company_details = f"- Company: {company_name}\n- Industry: {industry_display}"
-    if analysis.get('company_address'):
-        company_details += f"\n- Address: {analysis['company_address']}"
-    if analysis.get('company_contact'):
-        company_details += f"\n- Contact: {analysis['company_contact']}"
-    if analysis.get('company_description'):
-        company_details += f"\n- About: {analysis['company_description']}"
-    
-    SYSTEM_PROMPT = f"""You are a professional, Hindi-speaking sales assistant for voice-based customer interactions.
-Your name is {final_agent_name}. You are a {agent_gender} representative assisting customers.
-
-═══════════════════════════════════════════════════════════════════════════════
-CRITICAL GUARDRAILS (MUST FOLLOW)
-═══════════════════════════════════════════════════════════════════════════════
-- You can ONLY use information from the KNOWLEDGE BASE and DATA SUMMARY below.
-- NEVER invent, guess, or hallucinate ANY information (names, prices, features, etc.).
-- If you don't know something, say so politely. Do NOT make things up.
-- If company name is not specified, refer to it as "humare yahan" or "humare organization".
-
-SOURCE PRIORITY (Follow this order):
-1. FIRST: Check KNOWLEDGE BASE (FAQs) for exact or similar question → Use that answer
-2. SECOND: Check DATA SUMMARY for relevant information → Formulate answer from it
-3. THIRD: If not found in either → Say "Maaf kijiye, yeh jaankari mere paas nahi hai"
-   NEVER go to Step 4 (making things up). There is no Step 4.
-
-COMPANY DETAILS:
-{company_details}
-
-═══════════════════════════════════════════════════════════════════════════════
-DATA SUMMARY (Use this for quick reference)
-
-{data_summary}
-
-═══════════════════════════════════════════════════════════════════════════════
-KNOWLEDGE BASE (FAQs - Use these to answer customer queries)
-
-{generated_faqs}
-
-═══════════════════════════════════════════════════════════════════════════════
-RESPONSE GUIDELINES
-═══════════════════════════════════════════════════════════════════════════════
-
-1. LANGUAGE & TONE: Natural Hindi/Hinglish, friendly, conversational. Use respectful fillers (Ji, Sir/Ma'am). Avoid jargon unless asked. Adapt terminology to the industry (e.g., "policy" for insurance, "treatment" for healthcare, "course" for education).
-
-2. ANSWER STYLE: Keep answers concise (2-4 sentences). Address the question first, add specifics (prices/features/plans/eligibility). Offer 2-3 best options from the knowledge base, then ask if more detail is needed.
-
-   HOW TO FIND ANSWERS:
-   a) Search FAQs above for exact or similar question → Use that answer verbatim
-   b) If not in FAQs, check DATA SUMMARY → Formulate answer from it
-   c) If not in either → Politely say you don't have that information
-   d) NEVER combine general knowledge with document data
-
-3. STRICT KNOWLEDGE BOUNDARY (CRITICAL):
-   - ONLY answer from the provided KNOWLEDGE BASE and DATA SUMMARY above.
-   - If information is NOT in the knowledge base, say: "Maaf kijiye, yeh jaankari mere paas nahi hai. Kya main kisi aur cheez mein madad kar sakta hoon?"
-   - NEVER invent, assume, or hallucinate company names, product names, prices, features, or any other details.
-   - NEVER use general knowledge or external information.
-   - If asked about something not covered, politely redirect to what you DO know.
-
-4. BACKCHANNELS & INTERRUPTIONS: Treat "haan/hmm/acha/theek hai/ok" as backchannel only. If user interrupts with a new question, drop the old thread and answer the new one. If repeated interruptions, keep replies shorter and focused on the last ask.
-
-5. ABUSIVE LANGUAGE: Stay calm; give one polite warning, then a firmer warning; stop only if abuse continues.
-
-6. BACKGROUND NOISE (Semantic VAD): Ignore TV/other voices/short fillers unless it is a clear question. Focus on the primary caller; wait if uncertain.
-
-7. IDENTITY / COMPANY QUESTIONS:
-   - "Who are you?" / "Aap kaun ho?": "{identity_who}"
-   - "Why did you call?" / "Call kyun kiya?": "{identity_why}"
-   - If asked company details you don't know: "Maaf kijiye, yeh specific detail mere paas nahi hai."
-
-8. INDUSTRY-SPECIFIC COURTESY:
-   - Healthcare: Show empathy, use terms like "treatment", "consultation", "doctor"
-   - Insurance: Be clear about coverage, use terms like "policy", "premium", "claim"
-   - Banking: Be precise about numbers, use terms like "account", "loan", "interest rate"
-   - Education: Be encouraging, use terms like "course", "admission", "placement"
-   - Travel: Be enthusiastic, use terms like "package", "destination", "itinerary"
-   - Real Estate: Be informative, use terms like "property", "location", "BHK", "possession"
-   - Technology: Be helpful, use terms like "software", "features", "subscription", "support"
-   - Retail/E-commerce: Be friendly, use terms like "product", "offer", "delivery", "return"
-   - Fitness: Be motivating, use terms like "membership", "trainer", "workout", "health"
-   - Food: Be warm, use terms like "menu", "order", "delivery", "taste"
-   - General: Adapt to context, stay professional and helpful
-
-9. UNCERTAINTY HANDLING:
-   - If you're not 100% sure about an answer, say: "Iske baare mein main confirm karke batata hoon" instead of guessing.
-   - Never make up statistics, percentages, or specific numbers not in the knowledge base.
-   
-10. CRITICAL: OUTBOUND CALL CONTEXT:
-- **YOU are calling the customer** - this is an OUTBOUND sales call, NOT an inbound inquiry.
-- The customer did NOT call you - YOU initiated this call to present your products/services.
-- Act as a proactive sales agent who **showcases and presents**, NOT someone who asks "aapko kya chahiye?" or "kaise madad kar sakta hoon?"
-
-11. SALES APPROACH - Proactive Outbound Calling:
-   **YOUR ROLE:**
-   1. **Present/Showcase**: Proactively introduce products, services, and value propositions
-   2. **Assist with Doubts**: Address questions/concerns helpfully
-   3. **Guide Forward**: Lead the conversation toward the offer
-   
-   **DO THIS:**
-   - Lead with 1-2 key benefits + 1 clear offer
-   - Use showcase language:
-     * "Main aapko batana chahta hoon ki humare paas..." (I want to tell you about...)
-     * "Ek baat jo aapke liye helpful ho sakti hai..." (Something helpful for you...)
-     * "Hum aapko ye offer de rahe hain..." (We're offering you this...)
-   - Ask ONE specific question (budget/timeframe) instead of open-ended queries
-   - After answering doubts, immediately continue presenting value
-   
-   **DO NOT:**
-   - Ask generic questions: "Kya aapko koi help chahiye?" or "Aap kya janna chahte hain?"
-   - Wait for customer to express needs - YOU drive the conversation
-   - Act like support staff waiting for requests
-═══════════════════════════════════════════════════════════════════════════════
-CALL TERMINATION RULES
-
-You must not end a call unless intent is clear. Never hang up due to silence, background noise, or confusion.
-
-WHEN TO CONSIDER ENDING (detect intent):
-- Explicit goodbye/termination (e.g., "bye", "bas", "disconnect", "khatam", "nothing else").
-- A clear negative ("no / nahi / no thank you") that directly answers your closing-type question.
-
-MANDATORY CONFIRMATION (always before hangup):
-- Ask: "Theek hai. Kya main call abhi samaapt kar doon?" (or EN: "Would you like me to disconnect the call now?").
-- Terminate only if the next reply is clearly affirmative ("haan/yes/please disconnect/ji").
-
-NEVER terminate when:
-- "No / nahi" is about topic preference (not end intent).
-- There is silence, background noise, partial speech, or ambiguity.
-- Caller asks to repeat/clarify or seems engaged/undecided.
-
-DECISION RULE:
-- If uncertain at any step, do NOT terminate; continue helping.
-
-EXAMPLE — Correct:
-You: "Is there anything else I can help you with?"
-User: "No, that's all. Thank you."
-You: "Theek hai. Kya main call abhi samaapt kar doon?"
-User: "Haan, please."
-→ Then give a polite goodbye and end.
-
-EXAMPLE — Do NOT end:
-User: "No, I want premium plans." (topic preference) → Continue conversation.
-"""
-
-    # Enforce final prompt cap (~32k chars) by trimming FAQs first if needed
-    MAX_PROMPT_CHARS = 50000
-    if len(SYSTEM_PROMPT) > MAX_PROMPT_CHARS:
-        overflow = len(SYSTEM_PROMPT) - MAX_PROMPT_CHARS
-        if overflow > 0 and generated_faqs:
-            trimmed_faqs = generated_faqs[:-overflow] if overflow < len(generated_faqs) else ""
-            SYSTEM_PROMPT = SYSTEM_PROMPT.replace(generated_faqs, trimmed_faqs)
-
-    print(f"\n✅ Final system message length: {len(SYSTEM_PROMPT)} characters")
-    print(f"📌 Company: {company_name} {'(detected)' if company_known else '(fallback - not detected)'}")
-    print(f"📌 Industry: {industry_display}")
-    print(f"📌 Data Type: {analysis.get('data_type', 'unknown')}")
-    
-    return SYSTEM_PROMPT
+    return data_summary
 
 
 # ────────────────────────────────────────────────────────────────────────────────
@@ -653,4 +816,56 @@ def _clean_json_response(text: str) -> str:
         text = text[3:]
     if text.endswith("```"):
         text = text[:-3]
-    return text.strip()
\ No newline at end of file
+    return text.strip()
+
+
+AGENT_NAME_MODEL = "gpt-4o-mini"
+AGENT_NAME_PROMPT = """Below is the opening line a voice sales agent says when a call connects. \
+It may be in English, Hindi or Hinglish. If the agent introduces themselves by name, return that \
+name exactly as written. Words such as "regarding", "calling" or a company name are not names. \
+If no name is given, or it is unclear which word is the name, return null.
+
+Return only JSON: {{"agent_name": "name" or null}}
+
+OPENING LINE:
+{welcome_message}"""
+
+
+def agent_name_from_welcome(welcome_message: str | None) -> str | None:
+    """
+    Agent name introduced in the welcome message ("Main Rahul, XYZ se..."),
+    or None. Extracted by a small model call cached per message, so a
+    re-render costs nothing; failures are not cached.
+    """
+    if not welcome_message or not welcome_message.strip():
+        return None
+    message_hash = content_sha256(welcome_message.strip().encode("utf-8"))
+    cache_name = stage_cache_name("welcome_agent_name", AGENT_NAME_MODEL)
+    cached = get_cached(message_hash, cache_name)
+    if cached is not None:
+        return cached or None
+    try:
+        agent_name = run_sync(_extract_agent_name(welcome_message.strip()))
+    except Exception as e:
+        logging.warning(f"Could not extract the agent name from the welcome message: {e}")
+        return None
+    set_cached(message_hash, cache_name, agent_name or "")
+    return agent_name
+
+
+async def _extract_agent_name(welcome_message: str) -> str | None:
+    response = await _get_client().chat.completions.create(
+        model=AGENT_NAME_MODEL,
+        messages=[{"role": "user", "content": AGENT_NAME_PROMPT.format(welcome_message=welcome_message)}],
+        temperature=0,
+        max_tokens=30,
+        response_format={"type": "json_object"}
+    )
+    agent_name = json.loads(_clean_json_response(response.choices[0].message.content or "{}")).get("agent_name")
+    if not isinstance(agent_name, str):
+        return None
+    agent_name = agent_name.strip()
+    # Only a name actually spoken in the message; anything else is a guess
+    if not agent_name or len(agent_name.split()) > 3 or agent_name.lower() not in welcome_message.lower():
+        return None
+    return agent_name
@@ -1,14 +1,19 @@
+import asyncio
 import logging
 import os
+from typing import AsyncIterator, List, Optional, Tuple
 from fastapi import BackgroundTasks, APIRouter
 import json
 from dotenv import load_dotenv
 from google import genai
 from google.genai import types
 from call.plivo import outbound_call
-from rag.service import rag_search_impl
+from core.config import get_settings
+from rag.service import rag_search_async
 load_dotenv()
 
+settings = get_settings()
+
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 if not GOOGLE_API_KEY:
     raise ValueError("GOOGLE_API_KEY environment variable not set.")
@@ -19,14 +24,17 @@ client = genai.Client(api_key=GOOGLE_API_KEY)
 # Gemini model ID supporting multimodal input
 MODEL_NAME = "gemini-2.5-flash" 
 
+# Bounds concurrent model calls on this worker; further requests wait for a slot
+_model_slots = asyncio.Semaphore(settings.GEMINI_MAX_CONCURRENCY)
+
 # --- Helper Function for File Upload ---
 
-def upload_file_for_gemini(file, mime_type: str) -> types.File:
+async def upload_file_for_gemini(file, mime_type: str) -> types.File:
     """Uploads a local file to the Gemini File API."""
     try:
         logging.info(f"Uploading file: {file} with mime type: {mime_type}")
-        # The client.files.upload method handles the actual upload
-        uploaded_file = client.files.upload(
+        # The client.aio.files.upload method handles the actual upload
+        uploaded_file = await client.aio.files.upload(
             file=file,
             config=types.UploadFileConfig(mime_type=mime_type)
         )
@@ -78,11 +86,75 @@ rag_search_declaration = {
 }
 
 tools = types.Tool(function_declarations=[outbound_call_declaration, rag_search_declaration])
+# Model calls answering tool results before the model must reply without tools
+MAX_TOOL_ROUNDS = 3
+
+
+def _ndjson(payload: dict) -> str:
+    return json.dumps(payload) + "\n"
+
+
+def _chunk_parts(chunk: types.GenerateContentResponse) -> Tuple[str, List[types.FunctionCall], List[types.Part]]:
+    """Text, function calls and raw parts of one streamed chunk"""
+    text, calls, parts = [], [], []
+    if chunk.candidates and chunk.candidates[0].content and chunk.candidates[0].content.parts:
+        parts = chunk.candidates[0].content.parts
+        for part in parts:
+            if part.function_call:
+                calls.append(part.function_call)
+            elif part.text and not part.thought:
+                text.append(part.text)
+    return "".join(text), calls, parts
+
+
+async def _stream_model(contents, config: types.GenerateContentConfig) -> AsyncIterator[Tuple[str, List[types.FunctionCall], List[types.Part]]]:
+    """Stream one model call, holding a concurrency slot until it is fully read"""
+    async with _model_slots:
+        stream = await client.aio.models.generate_content_stream(model=MODEL_NAME, contents=contents, config=config)
+        async for chunk in stream:
+            yield _chunk_parts(chunk)
+
+
+def _normalize_query(query: str) -> str:
+    return " ".join("".join(c for c in query.casefold() if c.isalnum() or c.isspace()).split())
+
+
+class _SpeculativeSearch:
+    """
+    rag_search for the user's own query, started before the model asks for it.
+    The model's rag_search call takes its result when it searches the same
+    query; otherwise the search is cancelled.
+    """
+
+    def __init__(self, query: str, organisation_id: Optional[str]):
+        self.query = _normalize_query(query)
+        self.task = asyncio.create_task(rag_search_async(query, organisation_id=organisation_id))
+
+    def take(self, query: str) -> Optional[asyncio.Task]:
+        if self.task is None or _normalize_query(query) != self.query:
+            return None
+        task, self.task = self.task, None
+        return task
 
-def generate_response(query: str, background_tasks: BackgroundTasks, uploaded_file: types.File = None):
+    def cancel(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+
+async def generate_response(query: str, background_tasks: BackgroundTasks, uploaded_file: types.File = None, organisation_id: str = None, search_query: str = None):
     """
-    Generator function to stream a grounded response from Gemini 2.5 Flash, 
-    supporting multimodal input (file/audio).
+    Async generator streaming a grounded response from Gemini 2.5 Flash as
+    NDJSON, supporting multimodal input (file/audio). Text is sent as
+    {"delta": ...} lines as tokens arrive, and the complete answer as a final
+    {"message": ...} line. Knowledge lookups are scoped to `organisation_id`
+    when provided.
+
+    A rag_search result goes back to the model as a function response in the
+    same conversation, so it continues its turn instead of being asked again
+    from scratch. With GEMINI_SPECULATIVE_RAG, `search_query` (default
+    `query`) is searched while the first call runs, so a rag_search for it
+    does not wait for retrieval.
     """
     # --- PERFECTED SYSTEM INSTRUCTION INTEGRATION ---
     system_instruction = (
@@ -94,7 +166,8 @@ def generate_response(query: str, background_tasks: BackgroundTasks, uploaded_fi
         "1. When the user asks a question that clearly depends on **specific, internal, or domain knowledge** "
         "(e.g., company data, manuals, research, or structured knowledge bases), first call the `rag_search` tool "
         "with the extracted query text to access that information.\n"
-        "2. Use the retrieved context to ground your response — provide accurate, professional, and confident answers.\n"
+        "2. Use the retrieved context to ground your response — provide accurate, professional, and confident answers. "
+        "If it is empty or not relevant to the question, say that no relevant internal information was found.\n"
         "3. When the query is about general or conversational content, you may respond directly without calling the tool.\n\n"
         "If the user explicitly requests that you **call**, **reach**, or otherwise "
         "phone someone AND a PDF/CSV/JSON/XLSX file or any file type is provided that contains phone numbers:\n"
@@ -130,72 +203,81 @@ def generate_response(query: str, background_tasks: BackgroundTasks, uploaded_fi
 
     # 2. Add the uploaded file/audio (FILE/AUDIO INPUT)
     if uploaded_file:
-        # The uploaded_file object is directly added as a multimodal Part
-        parts.append(uploaded_file) 
+        parts.append(types.Part.from_uri(file_uri=uploaded_file.uri, mime_type=uploaded_file.mime_type))
         
     # 3. Add the user's query
-    parts.append(f"User Query: {query}")
-    
-    contents = parts
-    response = client.models.generate_content(
-        model=MODEL_NAME,
-        contents=contents,
-        config=types.GenerateContentConfig(
+    parts.append(types.Part.from_text(text=f"User Query: {query}"))
+
+    speculative = _SpeculativeSearch(search_query or query, organisation_id) if settings.GEMINI_SPECULATIVE_RAG else None
+    try:
+        contents = [types.Content(role="user", parts=parts)]
+        config = types.GenerateContentConfig(
             tools=[tools],
             system_instruction=system_instruction
         )
-    )
-    if (response.candidates and 
-        response.candidates[0].content.parts and 
-        response.candidates[0].content.parts[0].function_call):
-        
-        function_call = response.candidates[0].content.parts[0].function_call
-        
-        print(f"Function to call: {function_call.name}")
-        print(f"Arguments: {function_call.args}")
-        if function_call.name == "rag_search":
-            q = function_call.args.get("query", query)
-            results = rag_search_impl(q)
-            # Ask Gemini again to validate and refine using RAG result
-            refinement_parts = [
-                f"User Query: {query}",
-                f"RAG Result:\n{results}",
-                "Determine if this RAG result is relevant to the query. "
-                "If relevant, provide a refined and accurate response. "
-                "If NOT relevant, respond by using external information or state 'NOT_RELEVANT'."
-            ]
-
-            refinement_response = client.models.generate_content(
-                model=MODEL_NAME,
-                contents=refinement_parts,
-                config=types.GenerateContentConfig(system_instruction=system_instruction)
-            )
-
-            refined_text = refinement_response.text.strip()
-            if refined_text == "NOT_RELEVANT":
-                yield json.dumps({"message": "Sorry, no relevant internal information was found for your query."})
-            else:
-                yield json.dumps({"message": refined_text})
-            return
-
-        elif function_call.name == "outbound_call":
-            phone_numbers = function_call.args.get("phone_numbers", [])
-            org_id = function_call.args.get("organisation_id")  # optional
-            user_id = function_call.args.get("user_id")         # optional
-            if phone_numbers:
-                background_tasks.add_task(outbound_call, ",".join(phone_numbers),org_id, user_id)
-                yield json.dumps({
-                    "message": f"Contact extraction complete! Successfully processed **{len(phone_numbers)}** phone numbers."
-                                f"All {len(phone_numbers)} contacts have been queued for automated sales outreach.",
-                })
+        answer = []
+        for round_ in range(MAX_TOOL_ROUNDS + 1):
+            if round_ == MAX_TOOL_ROUNDS:
+                # Out of tool rounds: the model has to answer with what it has
+                config = types.GenerateContentConfig(system_instruction=system_instruction)
+            model_parts, function_calls = [], []
+            async for text, calls, chunk_parts in _stream_model(contents, config):
+                model_parts.extend(chunk_parts)
+                function_calls.extend(calls)
+                if text:
+                    answer.append(text)
+                    yield _ndjson({"delta": text})
+            if not function_calls:
+                break
+
+            for function_call in function_calls:
+                print(f"Function to call: {function_call.name}")
+                print(f"Arguments: {function_call.args}")
+
+            outbound = next((call for call in function_calls if call.name == "outbound_call"), None)
+            if outbound is not None:
+                args = outbound.args or {}
+                phone_numbers = args.get("phone_numbers", [])
+                org_id = args.get("organisation_id")  # optional
+                user_id = args.get("user_id")         # optional
+                if phone_numbers:
+                    background_tasks.add_task(outbound_call, ",".join(phone_numbers),org_id, user_id)
+                    yield _ndjson({
+                        "message": f"Contact extraction complete! Successfully processed **{len(phone_numbers)}** phone numbers."
+                                    f"All {len(phone_numbers)} contacts have been queued for automated sales outreach.",
+                    })
+                    return
+
+            if outbound is not None or any(call.name != "rag_search" for call in function_calls):
+                # If a function call was suggested but was not the expected format/tool
+                yield _ndjson({"message": "The model suggested a tool call, but the parameters or function name were unexpected. No calls were initiated."})
                 return
-        
-        # If a function call was suggested but was not the expected format/tool
-        yield "The model suggested a tool call, but the parameters or function name were unexpected. No calls were initiated."
 
-    else:
-        if response.text:
-            logging.info(f"Gemini 2.5 Flash response: {response.text}")
-            yield json.dumps({"message": response.text})
+            # The model's turn (with its call parts, as sent) and the results continue the conversation
+            searches = []
+            for call in function_calls:
+                call_query = (call.args or {}).get("query", search_query or query)
+                task = speculative.take(call_query) if speculative else None
+                searches.append(task or rag_search_async(call_query, organisation_id=organisation_id))
+            if speculative:
+                speculative.cancel()  # only the first call can ask for the user's own query
+            results = await asyncio.gather(*searches)
+            contents.append(types.Content(role="model", parts=model_parts))
+            contents.append(types.Content(role="user", parts=[
+                types.Part.from_function_response(name=call.name, response=result)
+                for call, result in zip(function_calls, results)
+            ]))
+
+        if answer:
+            logging.info(f"Gemini 2.5 Flash response: {''.join(answer)}")
+            yield _ndjson({"message": "".join(answer)})
         else:
-            yield json.dumps({"message": "The model did not return a function call or a text response."})
\ No newline at end of file
+            yield _ndjson({"message": "The model did not return a function call or a text response."})
+
+    except Exception as e:
+        # Headers are already sent: report the failure in the stream
+        logging.error(f"Error while streaming Gemini response: {e}")
+        yield _ndjson({"error": "An error occurred while generating the response."})
+    finally:
+        if speculative:
+            speculative.cancel()